@@ -1,6 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Sum
 from django.forms import inlineformset_factory
 from products.models import *
+from products.shipping import ship_orders
 from django.shortcuts import redirect
 
 # Register your models here.
@@ -16,36 +18,32 @@ class OderManagementAdmin(admin.ModelAdmin):
     list_editable = ['paid']
     list_filter = ['status','placed_date']
     inlines = (PlacedOderItemTabularAdmin,)
+    actions = ['ship_selected_orders']
 
-    
-    def save_model(self, request, obj, form, change):
+    @admin.action(description='Ship selected orders')
+    def ship_selected_orders(self, request, queryset):
+        # One transaction for the whole selection, see products/shipping.py.
+        shipped = ship_orders(queryset.values_list('id', flat=True))
+        self.message_user(request, f'{shipped} orders shipped.', messages.SUCCESS)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
 
         # deleted placed oder & placedOderItem and
-        # make nwe CompletedOder & completedOderItem on oder status Chnaged
-        if change and obj.status == 'Oder Shipped' :
-            completed_oder = CompletedOder(
-            user = obj.user,
-            shipping_address = obj.shipping_address,
-            sub_total_price =obj.sub_total_price,
-            paid = obj.paid,
-            status = 'Oder Shipped',
-            oder_number = obj.order_number
-            )
-            completed_oder.save()
-            placed_oder_items = PlacedeOderItem.objects.filter(placed_oder=obj)
-            for placed_oder_item in placed_oder_items:
-                completed_oder_items = CompletedOderItems(
-                    completed_oder  = completed_oder,
-                    product = placed_oder_item.product,
-                    quantity = placed_oder_item.quantity,
-                    total_price = placed_oder_item.total_price
-                )
-                completed_oder_items.save()
-                placed_oder_item.delete()
-            obj.delete()
-            return redirect('/custom-admin/products/placedoder/')
-            
+        # make nwe CompletedOder & completedOderItem on oder status Chnaged,
+        # once the inline items are saved
+        if change and form.instance.status == 'Oder Shipped':
+            ship_orders([form.instance.pk])
+            form.instance.shipped = True
 
+    def response_change(self, request, obj):
+        # The shipped order is gone, so there is no change page to return to.
+        if getattr(obj, 'shipped', False):
+            self.message_user(request, f'Order {obj.order_number} shipped.', messages.SUCCESS)
+            return redirect(f'{self.admin_site.name}:products_placedoder_changelist')
+        return super().response_change(request, obj)
+
+    def save_model(self, request, obj, form, change):
         obj.save()
         super().save_model(request, obj, form, change)
 
@@ -58,12 +56,10 @@ class OderManagementAdmin(admin.ModelAdmin):
                 formset.save()
 
             # Calculate Subtotal price on PlaceOder, after saving the placedOderItem     
-            if obj.order_items.exists():
-                sub_total_price = 0
-                for item in obj.order_items.all():
-                    sub_total_price += item.total_price
+            sub_total_price = obj.order_items.aggregate(total=Sum('total_price'))['total']
+            if sub_total_price is not None:
                 obj.sub_total_price = sub_total_price
-                obj.save()
+                obj.save(update_fields=['sub_total_price'])
 
         else:
             # Updating 'PlacedOderItem' instances without saving them immediately
@@ -74,10 +70,8 @@ class OderManagementAdmin(admin.ModelAdmin):
                 formset.save()
 
             # Calculate Subtotal price on PlaceOder, after Modifing the placedOderItem     
-            if obj.order_items.exists():
-                sub_total_price = 0
-                for item in obj.order_items.all():
-                    sub_total_price += item.total_price
+            sub_total_price = obj.order_items.aggregate(total=Sum('total_price'))['total']
+            if sub_total_price is not None:
                 obj.sub_total_price = sub_total_price
-                obj.save()
+                obj.save(update_fields=['sub_total_price'])
 
@@ -1,3 +1,35 @@
-from django.test import TestCase
+from django.contrib.auth.models import Permission
 
-# Create your tests here.
+from products.models import CompletedOder, PlacedeOderItem, PlacedOder
+from products.tests import StoreTestCase, make_address, make_category, make_product, make_user
+
+
+class ShipFromChangeFormTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        customer = make_user()
+        self.order = PlacedOder.objects.create(user=customer, shipping_address=make_address(customer),
+                                               sub_total_price=90)
+        self.item = PlacedeOderItem.objects.create(placed_oder=self.order, product=make_product(make_category()))
+        editor = make_user("editor@example.com", user_role="2", is_staff=True)
+        editor.user_permissions.set(Permission.objects.filter(
+            codename__in=["view_placedoder", "change_placedoder", "view_placedeoderitem", "add_placedeoderitem",
+                          "change_placedeoderitem", "delete_placedeoderitem"]))
+        self.client.force_login(editor)
+
+    def test_inline_edits_are_saved_before_the_order_ships(self):
+        url = f"/employee-dashboard/products/placedoder/{self.order.pk}/change/"
+        with self.assertLogs("products.shipping", "INFO"):
+            response = self.client.post(url, {
+                "user": self.order.user_id, "shipping_address": self.order.shipping_address_id,
+                "sub_total_price": 90, "status": "Oder Shipped", "order_number": self.order.order_number,
+                "order_items-TOTAL_FORMS": 1, "order_items-INITIAL_FORMS": 1,
+                "order_items-MIN_NUM_FORMS": 0, "order_items-MAX_NUM_FORMS": 1000,
+                "order_items-0-id": self.item.pk, "order_items-0-placed_oder": self.order.pk,
+                "order_items-0-product": self.item.product_id, "order_items-0-quantity": 3,
+            })
+        self.assertRedirects(response, "/employee-dashboard/products/placedoder/")
+        self.assertFalse(PlacedOder.objects.exists())
+        completed = CompletedOder.objects.get()
+        self.assertEqual(completed.oder_number, self.order.order_number)
+        self.assertEqual(list(completed.delivered_items.values_list("quantity", flat=True)), [3])
@@ -5,7 +5,6 @@ from products.models import (PlacedOder,
                              CompletedOder,
                              CompletedOderItems,
                              Cart)
-from accounts.models import CustomUser
 from . forms import PlacedOderForm
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -17,7 +16,7 @@ def dashboard(request):
     if not request.user.is_staff:
         messages.error(request, "You do not have permission to access the admin panel.")
         return redirect('home')
-    customer_with_product_in_cart = CustomUser.objects.filter(customer_with_product_in_cart__isnull=False).distinct()
+    customer_with_product_in_cart = Cart.objects.values("user_id").distinct().count()
     total_placed_oder = PlacedOder.objects.all().__len__()
     total_completed_oder = CompletedOder.objects.all().__len__
     last_30_days = datetime.now() - timedelta(days=30)
@@ -58,7 +57,7 @@ def show_placed_oder_item_list(request, id):
             placed_oder_form.save()
             messages.info(request, "Updated successfully")
     placed_oder_form = PlacedOderForm(instance=placed_oder)
-    oder_item_list = PlacedeOderItem.objects.filter(placed_oder=placed_oder)
+    oder_item_list = PlacedeOderItem.objects.filter(placed_oder=placed_oder).with_product_cards()
 
     if hasattr(placed_oder, 'redirect_adter_completion'):
         placed_oder.delete()
@@ -99,7 +98,7 @@ def show_completed_oder_item_list(request, id):
     #         placed_oder_form.save()
     #         messages.info(request, "Updated successfully")
     # placed_oder_form = PlacedOderForm(instance=completed_oder)
-    oder_item_list = CompletedOderItems.objects.filter(completed_oder=completed_oder)   
+    oder_item_list = CompletedOderItems.objects.filter(completed_oder=completed_oder).with_product_cards()
     context ={
         "oder_item_list":oder_item_list,
         'completed_oder':completed_oder,
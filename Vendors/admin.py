@@ -1,7 +1,11 @@
 from typing import Any
 from django.contrib import admin
-from .adminForms import ProductModelAdminForm
-from .models import VendorStore
+from django.template.response import TemplateResponse
+from django.core.exceptions import PermissionDenied
+from django.urls import path
+from .adminForms import ProductModelAdminForm, CatalogImportForm
+from .catalog_import import CatalogImportError, QUEUE_MIN_BYTES, detect_format, import_products, queue_import
+from .models import CatalogImportJob, VendorStore
 from products.models import Product, ProductImage, ProductAditionalInformation
 from django.contrib import messages
 from django.shortcuts import redirect
@@ -61,6 +65,7 @@ class ProductAditonalInformationTabular(admin.TabularInline):
 # Modle Admin For Product Model
 class ProductModelAdmin(admin.ModelAdmin):
     form = ProductModelAdminForm
+    change_list_template = 'admin/products/product/vendor_change_list.html'
 
     inlines = (ProductImageTabular,ProductAditonalInformationTabular)
 
@@ -126,6 +131,45 @@ class ProductModelAdmin(admin.ModelAdmin):
     
     formated_stoc.short_description = "Available in Stock"
 
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='products_product_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        # Bulk CSV/JSONL upload, see Vendors/catalog_import.py
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        report = None
+        form = CatalogImportForm(request.POST or None, request.FILES or None, user=request.user)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                fmt = detect_format(upload.name)
+                if upload.size >= QUEUE_MIN_BYTES:
+                    # Imported by `manage.py import_products --queued`, not in this request.
+                    queue_import(upload, fmt, form.cleaned_data['store'])
+                    messages.info(request, "The file is queued for import; its result shows up below.")
+                    return redirect(request.path)
+                report = import_products(upload, fmt, form.cleaned_data['store'], workers=1)
+            except CatalogImportError as exc:
+                form.add_error('file', str(exc))
+            else:
+                messages.info(request, f"Imported {report.created} products, {report.failed} rows rejected "
+                                       f"({report.rows_per_second:.0f} rows/s)")
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import products',
+            'form': form,
+            'report': report,
+            'shown_errors': report.errors[:200] if report else [],
+            'jobs': CatalogImportJob.objects.filter(store__user=request.user).select_related('store').order_by('-id')[:10],
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, 'admin/products/product/import.html', context)
+
     def save_model(self, request, obj, form, change):
         if request.user.user_role == '3':
             obj.save()
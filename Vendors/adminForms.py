@@ -11,9 +11,20 @@ class ProductModelAdminForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
             super(ProductModelAdminForm, self).__init__(*args, **kwargs)
             user = getattr(self, 'user', None)
+            if "vendor_stores" not in self.fields:
+                # The bulk importer scopes rows to a store itself.
+                return
             if user and user.is_authenticated:
                 self.fields["vendor_stores"].queryset = VendorStore.objects.filter(
                     user=user
                 )
             else:
-                self.fields["vendor_stores"].queryset = VendorStore.objects.none()
\ No newline at end of file
+                self.fields["vendor_stores"].queryset = VendorStore.objects.none()
+
+class CatalogImportForm(forms.Form):
+    store = forms.ModelChoiceField(queryset=VendorStore.objects.none())
+    file = forms.FileField(help_text="CSV or JSONL, one product per row.")
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["store"].queryset = VendorStore.objects.filter(user=user)
@@ -0,0 +1,381 @@
+"""
+Bulk catalog import for vendor stores.
+
+Rows are streamed from a CSV or JSONL file in chunks, validated with
+ProductImportForm (the seller dashboard form minus the fields the importer
+fills in itself) and written with bulk_create. The management command can validate in a
+process pool; only a bounded number of chunks are in flight at once, so
+memory stays flat however big the file is. The seller dashboard imports
+small uploads in the request, in one process, and queues larger ones as a
+CatalogImportJob for `python manage.py import_products --queued`.
+
+CSV columns: title, regular_price, discounted_parcent, stoc, out_of_stoc,
+modle, tag, category (id, slug or name), description, details_description,
+images ("|" separated urls) and specifications ("Name: value|Name: value").
+JSONL rows use the same keys; images may be a list and specifications a
+dict or a list of [name, value] pairs.
+"""
+import csv
+import io
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django import db, forms
+from django.db import transaction
+
+from django.utils import timezone
+
+from products import facets, images, search, similarity
+from products.models import Categories, Product, ProductImage, ProductAditionalInformation
+from products.slugs import fill_slugs
+from .adminForms import ProductModelAdminForm
+from .models import CatalogImportJob
+
+
+CHUNK_SIZE = 500
+# Dashboard uploads this large are queued instead of imported in the request.
+QUEUE_MIN_BYTES = 2 * 1024 * 1024
+# Errors kept for the report; rows past this are only counted.
+MAX_REPORTED_ERRORS = 1000
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MAX_LENGTH = ProductImage._meta.get_field("image").max_length
+SPEC_MAX_LENGTH = ProductAditionalInformation._meta.get_field("specification").max_length
+DETAILS_MAX_LENGTH = ProductAditionalInformation._meta.get_field("details").max_length
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+class ProductImportForm(ProductModelAdminForm):
+    """
+    Validates one imported row with the same field rules as the dashboard
+    form. The category comes in as an id, slug or name and is resolved
+    against a lookup loaded once per process, so validating a row never
+    touches the database.
+    """
+    category = forms.CharField(max_length=100)
+
+    class Meta(ProductModelAdminForm.Meta):
+        exclude = ["slug", "vendor_stores", "categories"]
+
+    def __init__(self, *args, categories=None, **kwargs):
+        self.categories = categories or {}
+        super().__init__(*args, **kwargs)
+
+    def clean_category(self):
+        value = self.cleaned_data["category"].strip()
+        category_id = self.categories.get(value) or self.categories.get(value.lower())
+        if category_id is None:
+            raise forms.ValidationError(f'Unknown category "{value}".')
+        self.instance.categories_id = category_id
+        return category_id
+
+    def validate_unique(self):
+        # Slugs are allocated in bulk when the chunk is written.
+        pass
+
+
+def category_lookup():
+    lookup = {}
+    for category_id, slug, name in Categories.objects.values_list("id", "slug", "name"):
+        lookup[str(category_id)] = category_id
+        lookup[slug] = category_id
+        lookup.setdefault(name.lower(), category_id)
+    return lookup
+
+
+def _split_images(value):
+    if isinstance(value, str):
+        value = value.split("|")
+    return [str(url).strip() for url in value or [] if str(url).strip()]
+
+
+def _split_specifications(value):
+    if isinstance(value, dict):
+        pairs = value.items()
+    elif isinstance(value, str):
+        pairs = [part.split(":", 1) for part in value.split("|") if part.strip()]
+    else:
+        pairs = value or []
+    result = []
+    for pair in pairs:
+        if len(pair) != 2:
+            raise ValueError(f'Specification "{":".join(pair)}" should look like "Name: value".')
+        result.append((str(pair[0]).strip(), str(pair[1]).strip()))
+    return result
+
+
+def validate_row(raw, categories):
+    """
+    Returns (cleaned, errors); cleaned is a dict of picklable values ready
+    for write_chunk, or None when the row is invalid.
+    """
+    form = ProductImportForm(data=raw, categories=categories)
+    errors = []
+    if not form.is_valid():
+        for field, messages in form.errors.items():
+            errors.extend(f"{field}: {message}" if field != "__all__" else message for message in messages)
+    try:
+        images = _split_images(raw.get("images"))
+        specifications = _split_specifications(raw.get("specifications"))
+    except ValueError as exc:
+        errors.append(f"specifications: {exc}")
+        images, specifications = [], []
+    if any(len(url) > IMAGE_MAX_LENGTH for url in images):
+        errors.append(f"images: urls are limited to {IMAGE_MAX_LENGTH} characters.")
+    for name, details in specifications:
+        if not name or len(name) > SPEC_MAX_LENGTH or len(details) > DETAILS_MAX_LENGTH:
+            errors.append(f'specifications: "{name[:20]}" is empty or too long.')
+    if errors:
+        return None, errors
+
+    cleaned = {name: value for name, value in form.cleaned_data.items() if name != "category"}
+    cleaned["categories_id"] = form.cleaned_data["category"]
+    cleaned["images"] = images
+    cleaned["specifications"] = specifications
+    return cleaned, []
+
+
+def validate_chunk(rows):
+    """
+    Worker entry point: [(line, raw)] -> [(line, cleaned, errors)].
+    """
+    categories = _worker_categories
+    return [(line, *validate_row(raw, categories)) for line, raw in rows]
+
+
+_worker_categories = {}
+
+
+def _init_worker(categories):
+    global _worker_categories
+    import django
+    django.setup()
+    _worker_categories = categories
+
+
+def read_rows(fileobj, fmt):
+    """
+    Yield (line_number, raw_row) from a binary or text file object. A file
+    that isn't UTF-8 text, or isn't CSV at all, raises CatalogImportError.
+    """
+    if fmt not in ("csv", "jsonl"):
+        raise CatalogImportError(f'Unsupported format "{fmt}", use csv or jsonl.')
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    line_number = 0
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(fileobj)
+            for row in reader:
+                line_number = reader.line_num
+                yield line_number, {key.strip(): (value or "").strip() for key, value in row.items() if key}
+        else:
+            for line_number, line in enumerate(fileobj, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    yield line_number, exc
+                    continue
+                yield line_number, row if isinstance(row, dict) else ValueError("expected a JSON object")
+    except UnicodeDecodeError:
+        # Usually a spreadsheet saved in its local encoding.
+        raise CatalogImportError(f"The file isn't UTF-8 text (near line {line_number + 1}). "
+                                 "Save it as \"CSV UTF-8\" and upload it again.") from None
+    except csv.Error as exc:
+        raise CatalogImportError(f"The file isn't valid CSV (near line {line_number + 1}): {exc}.") from None
+
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    raise CatalogImportError("Upload a .csv or .jsonl file.")
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_chunk(store, rows):
+    """
+    Create the products of one validated chunk with their images and
+    specifications. Returns the number of products created.
+    """
+    products = []
+    extras = []
+    for cleaned in rows:
+        cleaned = dict(cleaned)
+        extras.append((cleaned.pop("images"), cleaned.pop("specifications")))
+        products.append(Product(vendor_stores=store, **cleaned))
+    with transaction.atomic():
+        fill_slugs(products, "title")
+        Product.objects.bulk_create(products)
+        product_images = []
+        specifications = []
+        for product, (urls, specs) in zip(products, extras):
+            product_images.extend(ProductImage(product=product, image=url) for url in urls)
+            specifications.extend(
+                ProductAditionalInformation(product=product, specification=name, details=details)
+                for name, details in specs
+            )
+        ProductImage.objects.bulk_create(product_images, batch_size=1000)
+        ProductAditionalInformation.objects.bulk_create(specifications, batch_size=1000)
+        # bulk_create sends no post_save, so index the new rows and drop the
+        # cached facet counts here.
+        search.index_products(Product.objects.filter(pk__in=[product.pk for product in products]))
+        # Neighbour lists are refreshed by `rebuild_similar_products --pending`,
+        # not here: rebuilding a whole category doesn't belong in a request.
+        similarity.index_products([product.pk for product in products], pending=True)
+        images.mark_pending(ProductImage, [image.pk for image in product_images], "image")
+        facets.invalidate({product.categories_id for product in products})
+    return len(products)
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def processed(self):
+        return self.created + self.failed
+
+    @property
+    def rows_per_second(self):
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, messages):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, messages))
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+        return self
+
+
+def import_products(fileobj, fmt, store, workers=0, chunk_size=CHUNK_SIZE, on_chunk=None):
+    """
+    Import every row of fileobj into `store`. With workers > 1 validation is
+    spread over a process pool; writes always happen here, in file order.
+    Only use workers > 1 from a management command, never in a web process.
+    """
+    report = ImportReport()
+    categories = category_lookup()
+    chunks = _chunks(read_rows(fileobj, fmt), chunk_size)
+
+    def handle(results):
+        valid = []
+        for line, cleaned, errors in results:
+            if errors:
+                report.add_error(line, errors)
+            else:
+                valid.append(cleaned)
+        if valid:
+            report.created += write_chunk(store, valid)
+        if on_chunk:
+            report.elapsed = time.monotonic() - report.started
+            on_chunk(report)
+
+    def split(chunk):
+        # Rows that didn't even parse never reach the form.
+        parsed = []
+        for line, raw in chunk:
+            if isinstance(raw, Exception):
+                report.add_error(line, [f"invalid row: {raw}"])
+            else:
+                parsed.append((line, raw))
+        return parsed
+
+    try:
+        if workers <= 1:
+            global _worker_categories
+            _worker_categories = categories
+            for chunk in chunks:
+                handle(validate_chunk(split(chunk)))
+        else:
+            # Forked workers must not share the parent's database connections.
+            db.connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(categories,)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(validate_chunk, split(chunk)))
+                    if len(pending) >= workers * 2:
+                        handle(pending.popleft().result())
+                while pending:
+                    handle(pending.popleft().result())
+    except CatalogImportError as exc:
+        if report.created:
+            # Chunks are committed as they go.
+            raise CatalogImportError(f"{exc} The {report.created} products before it were imported.") from None
+        raise
+    return report.finish()
+
+
+def queue_import(upload, fmt, store):
+    return CatalogImportJob.objects.create(store=store, file=upload, format=fmt)
+
+
+def claim_job():
+    """
+    The oldest pending job, marked running, or None. Several runners can
+    share the queue.
+    """
+    with transaction.atomic():
+        job = (CatalogImportJob.objects.select_for_update(skip_locked=True)
+               .filter(status=CatalogImportJob.PENDING).order_by("id").first())
+        if job is not None:
+            job.status = CatalogImportJob.RUNNING
+            job.save(update_fields=["status"])
+    return job
+
+
+def run_job(job, workers=1, on_chunk=None):
+    """
+    Import a claimed job and record the outcome. The job always ends DONE
+    or FAILED and its file is deleted, whatever goes wrong.
+    """
+    try:
+        with job.file.open("rb") as fileobj:
+            report = import_products(fileobj, job.format, job.store, workers=workers, on_chunk=on_chunk)
+    except (OSError, CatalogImportError) as exc:
+        job.status, job.message = CatalogImportJob.FAILED, str(exc)
+    except Exception:
+        logger.exception("Catalog import job %s failed", job.pk)
+        job.status, job.message = CatalogImportJob.FAILED, "The import failed unexpectedly. Please try again."
+    else:
+        job.status = CatalogImportJob.DONE
+        job.created, job.failed, job.errors = report.created, report.failed, report.errors
+        job.message = f"{report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s)"
+    finally:
+        if job.status == CatalogImportJob.RUNNING:
+            # Interrupted, e.g. the runner was stopped.
+            job.status, job.message = CatalogImportJob.FAILED, "The import was interrupted."
+        job.finished_at = timezone.now()
+        try:
+            job.file.delete(save=False)
+        except OSError:
+            logger.exception("Could not delete the file of catalog import job %s", job.pk)
+        job.save(update_fields=["file", "status", "created", "failed", "errors", "message", "finished_at"])
+    return job
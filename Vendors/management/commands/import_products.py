@@ -0,0 +1,67 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from Vendors.catalog_import import CHUNK_SIZE, CatalogImportError, claim_job, detect_format, import_products, run_job
+from Vendors.models import VendorStore
+
+
+class Command(BaseCommand):
+    help = ('Bulk import products for a vendor store from a CSV or JSONL file, or with --queued '
+            'the large uploads queued from the seller dashboard (run that from cron every minute)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?')
+        parser.add_argument('--store', help='Vendor store id or slug')
+        parser.add_argument('--queued', action='store_true', help='Import the queued dashboard uploads')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Validation processes, 1 validates in this process')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['queued']:
+            return self.handle_queued(options['workers'])
+        if not options['path'] or not options['store']:
+            raise CommandError('Give a file and --store (or --queued).')
+        store_key = options['store']
+        lookup = Q(slug=store_key) | Q(id=store_key) if store_key.isdigit() else Q(slug=store_key)
+        store = VendorStore.objects.filter(lookup).first()
+        if store is None:
+            raise CommandError(f'No vendor store "{store_key}"')
+
+        try:
+            fmt = options['format'] or detect_format(options['path'])
+            with open(options['path'], 'rb') as fileobj:
+                report = import_products(
+                    fileobj, fmt, store,
+                    workers=options['workers'],
+                    chunk_size=max(options['chunk_size'], 1),
+                    on_chunk=self.progress,
+                )
+        except (OSError, CatalogImportError) as exc:
+            raise CommandError(exc)
+
+        for line, messages in report.errors:
+            self.stderr.write(f'line {line}: {"; ".join(messages)}')
+        if report.failed > len(report.errors):
+            self.stderr.write(f'... {report.failed - len(report.errors)} more rows with errors')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.created} products into "{store.name}", {report.failed} rows rejected, '
+            f'{report.elapsed:.1f}s ({report.rows_per_second:.0f} rows/s)'
+        ))
+
+    def handle_queued(self, workers):
+        count = 0
+        while True:
+            job = claim_job()
+            if job is None:
+                break
+            run_job(job, workers=workers, on_chunk=self.progress)
+            count += 1
+            self.stdout.write(f'Job {job.id} for "{job.store}": {job.status}, {job.created} created, '
+                              f'{job.failed} rejected {job.message}')
+        self.stdout.write(self.style.SUCCESS(f'{count} queued imports run'))
+
+    def progress(self, report):
+        self.stdout.write(f'  {report.processed} rows, {report.created} created, {report.rows_per_second:.0f} rows/s')
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Vendors', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vendorstore',
+            name='cover_photo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vendorstore',
+            name='logo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
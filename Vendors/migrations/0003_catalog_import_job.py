@@ -0,0 +1,31 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:42
+
+import Vendors.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Vendors', '0002_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(storage=Vendors.models.catalog_import_storage, upload_to='%Y/%m/')),
+                ('format', models.CharField(max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('created', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('message', models.TextField(blank=True)),
+                ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='Vendors.vendorstore')),
+            ],
+        ),
+    ]
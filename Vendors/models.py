@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.utils.text import slugify
 from accounts.models import CustomUser
@@ -9,6 +11,9 @@ class VendorStore(models.Model):
     slug = models.CharField(max_length=115,unique=True, blank=True)
     logo = models.ImageField( upload_to='media/vendoreStore/logo/', height_field=None, width_field=None, max_length=None,blank=True,null=True)
     cover_photo = models.ImageField( upload_to='media/vendoreStore/coverPhoto/', height_field=None, width_field=None, max_length=None,blank=True,null=True)
+    # Size and resized copies, filled in by products/images.py
+    logo_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    cover_photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -19,5 +24,35 @@ class VendorStore(models.Model):
     
     def __str__(self):
         return self.name
-    
 
+
+def catalog_import_storage():
+    # Outside MEDIA_ROOT: uploaded catalogs are never served.
+    return FileSystemStorage(location=settings.CATALOG_IMPORT_ROOT)
+
+
+class CatalogImportJob(models.Model):
+    """
+    An uploaded catalog too large to import during the request, waiting for
+    `python manage.py import_products --queued` (see Vendors/catalog_import.py).
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS = [(PENDING, "Pending"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    store = models.ForeignKey(VendorStore, on_delete=models.CASCADE, related_name="import_jobs")
+    file = models.FileField(upload_to="%Y/%m/", storage=catalog_import_storage)
+    format = models.CharField(max_length=10)
+    status = models.CharField(max_length=10, choices=STATUS, default=PENDING, db_index=True)
+    created = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # [[line, [messages]], ...], the first rejected rows only.
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.store} {self.file.name} ({self.status})"
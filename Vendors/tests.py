@@ -1,3 +1,120 @@
-from django.test import TestCase
+import io
+import re
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from products.models import Product, ProductContentVector, ProductRecommendation
+from products.tests import StoreTestCase, make_category, make_store, make_user
+
+from .catalog_import import CatalogImportError, claim_job, import_products, queue_import, run_job
+from .models import CatalogImportJob
+
+HEADER = "title,regular_price,discounted_parcent,stoc,modle,tag,category,description,details_description,images\n"
+
+
+def csv_row(title="Café phone", category="phones"):
+    images = "https://example.com/1.jpg|https://example.com/2.jpg"
+    return f"{title},100,10,5,X1,phone,{category},Fast,Very fast,{images}\n"
+
+
+class CatalogImportTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        make_category("Phones")
+        self.store = make_store()
+
+    def test_rows_are_imported_and_bad_rows_reported(self):
+        data = HEADER + csv_row() + csv_row(category="nope")
+        report = import_products(io.BytesIO(data.encode()), "csv", self.store)
+        self.assertEqual((report.created, report.failed), (1, 1))
+        self.assertEqual(report.errors, [(3, ['category: Unknown category "nope".'])])
+        product = Product.objects.get()
+        self.assertEqual((product.title, product.vendor_stores), ("Café phone", self.store))
+        self.assertEqual(product.productimage_set.count(), 2)
+
+    def test_similar_products_are_left_to_the_pending_refresh(self):
+        data = HEADER + csv_row() * 3
+        with self.captureOnCommitCallbacks(execute=True):
+            import_products(io.BytesIO(data.encode()), "csv", self.store)
+        self.assertEqual(ProductContentVector.objects.filter(pending=True).count(), 3)
+        self.assertFalse(ProductRecommendation.objects.exists())
+
+    def test_file_that_isnt_utf8_is_refused(self):
+        data = (HEADER + csv_row()).encode("latin-1")
+        with self.assertRaisesMessage(CatalogImportError, "isn't UTF-8 text"):
+            import_products(io.BytesIO(data), "csv", self.store)
+        self.assertFalse(Product.objects.exists())
+
+    def test_malformed_csv_is_refused(self):
+        data = HEADER + csv_row(title="x" * 200000)
+        with self.assertRaisesMessage(CatalogImportError, "isn't valid CSV"):
+            import_products(io.BytesIO(data.encode()), "csv", self.store)
+
+    def test_failure_after_a_written_chunk_says_what_was_imported(self):
+        # The file is decoded a block at a time, so give it a few blocks of good rows.
+        data = (HEADER + csv_row() * 500).encode() + csv_row().encode("latin-1")
+        with self.assertRaisesMessage(CatalogImportError, "products before it were imported.") as raised:
+            import_products(io.BytesIO(data), "csv", self.store, chunk_size=50)
+        created = int(re.search(r"The (\d+) products", str(raised.exception)).group(1))
+        self.assertGreater(created, 0)
+        self.assertEqual(Product.objects.count(), created)
+
+
+class CatalogImportJobTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        make_category("Phones")
+        self.store = make_store()
+
+    def run_queued(self, data):
+        job = queue_import(ContentFile(data, name="catalog.csv"), "csv", self.store)
+        path = job.file.path
+        job = run_job(claim_job())
+        job.refresh_from_db()
+        self.assertFalse(job.file)
+        self.assertFalse(job.file.storage.exists(path))
+        return job
+
+    def test_job_imports_and_deletes_its_file(self):
+        job = self.run_queued((HEADER + csv_row()).encode())
+        self.assertEqual((job.status, job.created, job.failed), (CatalogImportJob.DONE, 1, 0))
+
+    def test_undecodable_file_fails_the_job(self):
+        job = self.run_queued((HEADER + csv_row()).encode("latin-1"))
+        self.assertEqual(job.status, CatalogImportJob.FAILED)
+        self.assertIn("isn't UTF-8 text", job.message)
+
+    def test_unexpected_errors_fail_the_job(self):
+        with mock.patch("Vendors.catalog_import.import_products", side_effect=RuntimeError("boom")), \
+                self.assertLogs("Vendors.catalog_import", "ERROR"):
+            job = self.run_queued((HEADER + csv_row()).encode())
+        self.assertEqual(job.status, CatalogImportJob.FAILED)
+        self.assertFalse(CatalogImportJob.objects.filter(status=CatalogImportJob.RUNNING).exists())
+
+
+class DashboardImportTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        make_category("Phones")
+        vendor = make_user("vendor@example.com", user_role="3", is_staff=True)
+        vendor.user_permissions.set(Permission.objects.filter(codename__in=["add_product", "view_product"]))
+        self.store = make_store(vendor)
+        self.client.force_login(vendor)
+
+    def upload(self, data):
+        return self.client.post("/vendor-dashboard/products/product/import/", {
+            "store": self.store.pk, "file": SimpleUploadedFile("catalog.csv", data, content_type="text/csv"),
+        })
+
+    def test_small_upload_is_imported_in_the_request(self):
+        response = self.upload((HEADER + csv_row()).encode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["report"].created, 1)
+
+    def test_undecodable_upload_is_a_form_error(self):
+        response = self.upload((HEADER + csv_row()).encode("latin-1"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("isn't UTF-8 text", response.context["form"].errors["file"][0])
@@ -1,10 +1,11 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from accounts.forms import RegistrationForm
 from django.contrib import messages
 from django.contrib.auth.models import Group
 
 from .models import VendorStore
 from products.models import Product
+from products.pagination import keyset_listing, wants_fragment, product_cards_fragment
 # Create your views here.
 
 
@@ -33,8 +34,10 @@ def vendor_registration(request):
     return render(request,'accounts/vendor/vendor_registration.html',context)
 
 def vendor_store_with_product(request, store_id):
-    vendor_store_obj = VendorStore.objects.get(id=store_id)
-    vendor_store_products = Product.objects.filter(vendor_stores=vendor_store_obj)
+    vendor_store_obj = get_object_or_404(VendorStore, id=store_id)
+    vendor_store_products = keyset_listing(request, Product.objects.cards().filter(vendor_stores=vendor_store_obj))
+    if wants_fragment(request):
+        return product_cards_fragment(request, vendor_store_products)
 
 
     context= {
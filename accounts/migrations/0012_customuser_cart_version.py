@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_alter_customuser_is_staff_alter_customuser_user_role'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='cart_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -40,6 +40,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     date_joined = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Changes whenever the user's cart does; keys the cached cart snapshot
+    # (products/cart.py) without an extra query, since the user row is
+    # loaded on every request anyway.
+    cart_version = models.PositiveBigIntegerField(default=0, editable=False)
 
 
     objects = CustomUserManager()
@@ -1,3 +1,49 @@
-from django.test import TestCase
+from products.models import CompletedOder, CompletedOderItems, PlacedeOderItem, PlacedOder
+from products.tests import StoreTestCase, make_address, make_category, make_product, make_user
 
-# Create your tests here.
+
+class UserDashboardTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.address = make_address(self.user)
+        self.products = [make_product(make_category(f"Category {index}"), title=f"Phone {index}", images=2)
+                         for index in range(3)]
+        self.client.force_login(self.user)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            placed = PlacedOder.objects.create(user=self.user, shipping_address=self.address, sub_total_price=90)
+            completed = CompletedOder.objects.create(user=self.user, shipping_address=self.address,
+                                                     sub_total_price=90, status="Oder Shipped", oder_number="OID1")
+            for product in self.products:
+                PlacedeOderItem.objects.create(placed_oder=placed, product=product, quantity=1)
+                CompletedOderItems.objects.create(completed_oder=completed, product=product, quantity=1,
+                                                  total_price=90)
+
+    def test_queries_do_not_grow_with_orders(self):
+        self.add_orders(1)
+        self.client.get("/user/dasboard/")
+        # The user, then per history: the count, the orders, their lines.
+        with self.assertNumQueries(7):
+            self.client.get("/user/dasboard/")
+        self.add_orders(5)
+        with self.assertNumQueries(7):
+            response = self.client.get("/user/dasboard/")
+        self.assertEqual(len(response.context["placed_orders"]), 6)
+        self.assertEqual(len(response.context["completed_orders"]), 6)
+
+    def test_orders_carry_their_lines_newest_first(self):
+        self.add_orders(12)
+        response = self.client.get("/user/dasboard/")
+        placed = response.context["placed_orders"]
+        self.assertEqual(len(placed), 10)
+        self.assertEqual(placed.paginator.num_pages, 2)
+        newest = PlacedOder.objects.latest("id")
+        self.assertEqual(placed[0].number, newest.oder_id)
+        self.assertEqual([line.title for line in placed[0].lines], ["Phone 0", "Phone 1", "Phone 2"])
+        self.assertEqual(placed[0].lines[0].image, self.products[0].productimage_set.order_by("id").first().image)
+        self.assertContains(response, newest.oder_id)
+
+        response = self.client.get("/user/dasboard/?completed_page=2")
+        self.assertEqual(len(response.context["completed_orders"]), 2)
@@ -1,7 +1,7 @@
 from django.shortcuts import render, redirect
 from . models import CustomUser
 from .forms import RegistrationForm, CustomUserEditForm
-from products.models import PlacedOder, CompletedOder
+from products import cart, order_history
 from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import authenticate, login, logout
@@ -32,6 +32,11 @@ def login_view(request):
             user = authenticate(username=email,password=password)
             if user is not None:
                 login(request, user)
+                # Someone who filled a cart before logging in goes back to it.
+                if cart.merge_guest_cart(request, user):
+                    response = redirect('show_cart')
+                    cart.save_guest_items(request, response, {})
+                    return response
                 return redirect('user_dashboard')
             messages.error(request, 'Invalid credentials, please try again.')
     else:
@@ -46,20 +51,9 @@ def login_view(request):
 
 @login_required(login_url='user_login')
 def user_dashboard(request):
-    placed_oders_by_oder_id = PlacedOder.placed_oders_by_user(user=request.user)
-    # print(placed_oders_by_oder_id)
-    placede_oder_obj = PlacedOder.objects.filter(user=request.user)
-    if placede_oder_obj:
-        shipping_addess = placede_oder_obj[0].shipping_address
-    else:
-        shipping_addess = None
-    
-    completed_order= CompletedOder.objects.filter(user=request.user)
-
     context = {
-        'placed_oders_by_oder_id':placed_oders_by_oder_id,
-        "shipping_addesss":shipping_addess,
-        "completed_order":completed_order,
+        "placed_orders": order_history.placed_orders(request.user, request.GET.get("page")),
+        "completed_orders": order_history.completed_orders(request.user, request.GET.get("completed_page")),
     }
     return render(request,'accounts/user/user-dashboard.html', context)
 
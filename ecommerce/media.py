@@ -0,0 +1,153 @@
+"""
+Serving uploaded media (MEDIA_ROOT) in production.
+
+Files get a strong ETag and Last-Modified from their stat, answer
+conditional requests with 304/412 and single byte ranges with 206.
+Content-hashed names (image renditions) are cached for a year as
+immutable; everything else for MEDIA_CACHE_MAX_AGE seconds.
+
+With MEDIA_SENDFILE set, the body is handed to the web server in front
+instead of being streamed by a gunicorn worker:
+    "x-accel-redirect"  nginx; MEDIA_ROOT must be exposed as an internal
+                        location at MEDIA_ACCEL_REDIRECT_PREFIX
+    "x-sendfile"        Apache mod_xsendfile / lighttpd, gets the file path
+Conditional requests are still answered here, so a 304 never reaches
+the disk twice.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+# Renditions are named <24 hex digest>-<width>.<ext>, see products/images.py.
+HASHED_NAME_RE = re.compile(r"(?:^|/)[0-9a-f]{24}-\d+\.\w+$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+COMPRESSED_TYPES = {
+    "bzip2": "application/x-bzip",
+    "gzip": "application/gzip",
+    "xz": "application/x-xz",
+    "br": "application/x-brotli",
+    "compress": "application/x-compress",
+}
+
+
+def file_etag(st):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single satisfiable range, None when the
+    whole file should be sent, or False when the range can't be satisfied.
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _range_applies(request, etag, mtime):
+    # If-Range: only send the part when the client still has this version.
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(mtime) <= date
+
+
+def _read(path, start, length):
+    with open(path, "rb") as fileobj:
+        fileobj.seek(start)
+        while length > 0:
+            data = fileobj.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def serve(request, path):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        st = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404("No such file")
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404("No such file")
+
+    etag = file_etag(st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(st.st_mtime),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": (
+            f"public, max-age={IMMUTABLE_MAX_AGE}, immutable" if HASHED_NAME_RE.search(path)
+            else f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 86400)}"
+        ),
+    }
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(st.st_mtime))
+    if conditional is not None:
+        for name, value in headers.items():
+            conditional[name] = value
+        return conditional
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    # foo.csv.gz is a gzip file to download, not a gzip-encoded csv: sent as
+    # Content-Encoding the browser would unpack it. Same mapping as FileResponse.
+    content_type = COMPRESSED_TYPES.get(encoding) or content_type or "application/octet-stream"
+    sendfile = getattr(settings, "MEDIA_SENDFILE", "")
+    if sendfile:
+        # The front server reads the file and handles ranges itself.
+        response = HttpResponse(content_type=content_type)
+        if sendfile == "x-accel-redirect":
+            prefix = getattr(settings, "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+            response["X-Accel-Redirect"] = quote(prefix.rstrip("/") + "/" + path.lstrip("/"))
+        else:
+            response["X-Sendfile"] = fullpath
+    else:
+        byte_range = None
+        if "HTTP_RANGE" in request.META and _range_applies(request, etag, st.st_mtime):
+            byte_range = parse_range(request.META["HTTP_RANGE"], st.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read(fullpath, start, end - start + 1),
+                                             status=206, content_type=content_type)
+            response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+            response["Content-Length"] = str(end - start + 1)
+        else:
+            # FileResponse goes through wsgi.file_wrapper, i.e. sendfile(2)
+            # under gunicorn.
+            response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+            response["Content-Length"] = str(st.st_size)
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -1,9 +1,11 @@
 import time
 from typing import Callable
 from django.core.cache import cache
-from django.http import JsonResponse, HttpRequest, HttpResponse
+from django.http import Http404, JsonResponse, HttpRequest, HttpResponse, HttpResponseNotFound
 from django.conf import settings
 
+from ecommerce import media
+
 
 class RateLimitMiddleware:
     """
@@ -47,3 +49,24 @@ class RateLimitMiddleware:
             return forwarded_for.split(",")[0].strip()
         return request.META.get("REMOTE_ADDR", "unknown")
 
+
+
+class MediaFilesMiddleware:
+    """
+    Serves uploaded media under MEDIA_URL (see ecommerce/media.py). It sits
+    right after WhiteNoise, so image requests skip the session, auth and
+    rate limiting work done for pages.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+        # A MEDIA_URL on another host (a CDN) is not ours to serve.
+        self.prefix = settings.MEDIA_URL if settings.MEDIA_URL.startswith("/") else None
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.prefix and request.path_info.startswith(self.prefix):
+            try:
+                return media.serve(request, request.path_info[len(self.prefix):])
+            except Http404:
+                return HttpResponseNotFound("Not found")
+        return self.get_response(request)
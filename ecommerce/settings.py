@@ -52,6 +52,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'ecommerce.middleware.MediaFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +75,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'products.context_processors.taxonomy_tree',
+                'products.context_processors.mini_cart',
             ],
         },
     },
@@ -138,6 +141,17 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedStaticFilesStorage"
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Media is served by ecommerce.middleware.MediaFilesMiddleware. Set
+# MEDIA_SENDFILE to "x-accel-redirect" (nginx) or "x-sendfile" (Apache)
+# to hand the file body to the front server.
+MEDIA_SENDFILE = os.getenv("MEDIA_SENDFILE", "")
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", "86400"))
+# Hosts (besides MEDIA_URL's) whose image urls may be fetched to build
+# renditions, e.g. a vendor CDN. Comma separated; see products/images.py.
+IMAGE_FETCH_HOSTS = [host.strip() for host in os.getenv("IMAGE_FETCH_HOSTS", "").split(",") if host.strip()]
+# Large catalog uploads wait here for `manage.py import_products --queued`.
+CATALOG_IMPORT_ROOT = os.getenv("CATALOG_IMPORT_ROOT", str(BASE_DIR / "catalog-imports"))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -166,6 +180,12 @@ CACHES = {
         "LOCATION": "ecommerce-local-cache",
     }
 }
+# With more than one process (gunicorn workers plus cron commands) the cache
+# has to be shared, e.g. CACHE_URL=redis://localhost:6379/1: page view
+# counts and rate limits live in it (see products/trending.py).
+CACHE_URL = os.getenv("CACHE_URL", "")
+if CACHE_URL:
+    CACHES["default"] = {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}
 
 SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
 
@@ -19,8 +19,6 @@ from django.urls import path, include, re_path
 from AdminPanel.admin import employee_Management_admin_site
 from Vendors.admin import vendor_admin_site
 from products.admin import super_admin_site
-from django.conf.urls.static import static
-from django.conf import settings
 from ecommerce.views import health_check
 from django.views.generic import RedirectView
 
@@ -37,4 +35,4 @@ urlpatterns = [
     path('', include('payments.urls')),
     path('health/', health_check, name='health_check'),
     re_path(r'^(?P<unused>.*)\.html$', RedirectView.as_view(url='/', permanent=False)),
-]+static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
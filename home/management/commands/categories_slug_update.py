@@ -1,25 +1,65 @@
+import time
+
 from django.core.management.base import BaseCommand
-from home.models import Industry, Categories, SubCategories
-from django.utils.text import slugify
+from django.db import transaction
+from products.models import Industry, Categories, SubCategories
+from products import taxonomy
+from products.slugs import SlugAllocator, slug_base
+
 
 class Command(BaseCommand):
-    help = 'Update industry slugs'
-
-    def handle(self, *args, **kwargs):
-        industryes = Industry.objects.all()
-        for industry in industryes:
-            industry.slug = slugify(industry.name)
-            industry.save()
-            self.stdout.write(self.style.SUCCESS(f'Successfully updated slug for "{industry.name}"'))
-
-        categories = Categories.objects.all()
-        for categori in categories:
-            categori.slug = slugify(categori.name)
-            categori.save()
-            self.stdout.write(self.style.SUCCESS(f'Successfully updated slug for "{categori.name}"'))
-        
-        sub_categories = SubCategories.objects.all()
-        for sub_cate in sub_categories:
-            sub_cate.slug = slugify(sub_cate.name)
-            sub_cate.save()
-            self.stdout.write(self.style.SUCCESS(f'Successfully updated slug for "{sub_cate.name}"'))
\ No newline at end of file
+    help = 'Rebuild industry, category and sub category slugs from their names'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+        for model in (Industry, Categories, SubCategories):
+            self.rebuild(model, batch_size, dry_run)
+        if not dry_run:
+            # bulk_update skips the signals that normally drop the cached menu.
+            taxonomy.bump_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Dry run finished" if dry_run else "Done"} in {time.monotonic() - started:.2f}s'
+        ))
+
+    def rebuild(self, model, batch_size, dry_run):
+        name = model.__name__
+        max_length = model._meta.get_field('slug').max_length
+        allocator = SlugAllocator()
+        changed = []
+        current = {}
+        total = 0
+        rows = model.objects.order_by('id').values_list('id', 'name', 'slug')
+        for pk, row_name, old_slug in rows.iterator(chunk_size=batch_size):
+            total += 1
+            current[old_slug] = pk
+            new_slug = allocator.allocate(slug_base(row_name, max_length, model._meta.model_name))
+            if new_slug != old_slug:
+                changed.append(model(id=pk, slug=new_slug))
+                if dry_run and self.verbosity > 1:
+                    self.stdout.write(f'  {old_slug} -> {new_slug}')
+
+        self.stdout.write(f'{name}: {len(changed)} of {total} slugs to update')
+        if dry_run or not changed:
+            return
+
+        with transaction.atomic():
+            # Slugs are unique, so two rows trading slugs would collide halfway
+            # through. Park the changed rows on a placeholder first in that case;
+            # slugify never produces a leading underscore.
+            if any(current.get(obj.slug, obj.id) != obj.id for obj in changed):
+                parked = [model(id=obj.id, slug=f'__rebuild__{obj.id}') for obj in changed]
+                self._bulk_update(model, parked, batch_size, None)
+            self._bulk_update(model, changed, batch_size, name)
+
+    def _bulk_update(self, model, objs, batch_size, name):
+        for start in range(0, len(objs), batch_size):
+            model.objects.bulk_update(objs[start:start + batch_size], ['slug'])
+            if name:
+                self.stdout.write(f'  {name}: {min(start + batch_size, len(objs))}/{len(objs)}')
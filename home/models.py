@@ -5,6 +5,8 @@ from django.utils.text import slugify
 #Front Big Slider
 class SliderArea(models.Model):
     image = models.ImageField(upload_to='media', height_field=None, width_field=None, max_length=None)
+    # Size and resized copies, filled in by products/images.py
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(max_length=200)
     discount = models.PositiveIntegerField()
     product_url = models.CharField(max_length=200,null=True,blank=True)
@@ -14,6 +16,8 @@ class SliderArea(models.Model):
 
 class DisplayHotProductInCategories(models.Model):
     image = models.ImageField(upload_to='media', height_field=None, width_field=None, max_length=None)
+    # Size and resized copies, filled in by products/images.py
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(max_length=200)
     categories = models.ForeignKey("products.Categories",  on_delete=models.DO_NOTHING)
     product_url = models.CharField(max_length=200)
@@ -23,6 +27,8 @@ class DisplayHotProductInCategories(models.Model):
 
 class PopularCategories(models.Model):
     image = models.ImageField(upload_to='media', height_field=None, width_field=None, max_length=None)
+    # Size and resized copies, filled in by products/images.py
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     categories = models.ForeignKey("products.Categories",  on_delete=models.DO_NOTHING)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -1,3 +1,39 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from products.models import Product
+from products.tests import StoreTestCase, make_category, make_product, make_store
+
+
+class CategoryListingTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = make_category()
+        self.store = make_store()
+
+    def add_products(self, count):
+        for _ in range(count):
+            make_product(self.category, title="Phone", images=2, vendor_stores=self.store)
+
+    def test_queries_do_not_grow_with_products(self):
+        self.add_products(3)
+        url = f"/categoris/{self.category.id}"
+        # The first request fills the facet, trending and menu caches.
+        self.client.get(url)
+        # The category, then the cards with their image and store.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["products"]), 3)
+
+        # Saving products drops the category's facet counts again.
+        self.add_products(9)
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["products"]), 12)
+
+    def test_cards_carry_first_image_and_price(self):
+        product = make_product(self.category, images=2, regular_price=200, discounted_parcent=25)
+        card = Product.objects.cards().get(pk=product.pk)
+        self.assertEqual(card.primary_image, product.productimage_set.order_by("id").first().image)
+        self.assertEqual(card.effective_price, Decimal("150.00"))
+        self.assertIn("description", card.get_deferred_fields())
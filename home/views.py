@@ -1,30 +1,27 @@
-from django.shortcuts import render 
+from django.shortcuts import render, get_object_or_404
 from .models import SliderArea, DisplayHotProductInCategories, PopularCategories
-from products.models import Industry, Product, Categories, Cart
+from products.models import Product, Categories, TrendingProduct
 from django.views.decorators.csrf import csrf_exempt
 from products.models import Categories
+from products import facets, trending
+from products.pagination import keyset_listing, wants_fragment, product_cards_fragment, NEWEST, TOP_RATED, PRICE_LOW_HIGH, PRICE_HIGH_LOW
 # Create your views here.
 
 
 def home(request):
-    sub_total = 0.00
-    carts = ""
-    if request.user.is_authenticated:
-        carts = Cart.objects.filter(user=request.user)
-        if carts:
-            sub_total = Cart.subtotal_product_price(user=request.user)
     slider = SliderArea.objects.all()
-    industry = Industry.objects.all()
     hot_products_in_cate = DisplayHotProductInCategories.objects.all()[:4]
     # vendor_user = CustomUser.objects.filter(id=6)
-    trending_product = Product.objects.all()
+    # Precomputed by `manage.py compute_trending`; newest products until it has run.
+    trending_product = trending.trending_products()
+    if not trending_product:
+        trending_product = keyset_listing(request, Product.objects.cards(), NEWEST)
+        if wants_fragment(request):
+            return product_cards_fragment(request, trending_product)
     trending_division_title = "Trending Product"
     popular_categories = PopularCategories.objects.all()
     context = {
-        "carts": carts,
-        "sub_total": format(sub_total, ".2f"),
         "slider": slider,
-        "industry": industry,
         "hot_products_in_cate": hot_products_in_cate,
         "trending_product": trending_product,
         "trending_division_title": trending_division_title,
@@ -33,10 +30,37 @@ def home(request):
     return render(request, "home/home.html", context)
 
 
+LISTING_SORTS = {
+    "newest": NEWEST,
+    "rating": TOP_RATED,
+    "price_asc": PRICE_LOW_HIGH,
+    "price_desc": PRICE_HIGH_LOW,
+}
+SORT_LABELS = (
+    ("newest", "Newest"),
+    ("rating", "Top rated"),
+    ("price_asc", "Price: low to high"),
+    ("price_desc", "Price: high to low"),
+)
+
+
 def display_categories_post(request, id):
-    categories = Categories.objects.get(id=id)
-    products = Product.objects.filter(categories=categories)
-    context = {"products": products}
+    categories = get_object_or_404(Categories, id=id)
+    ordering = LISTING_SORTS.get(request.GET.get("sort"), NEWEST)
+    filters = facets.parse_filters(request.GET)
+    queryset = facets.apply_filters(Product.objects.cards().filter(categories=categories), filters)
+    products = keyset_listing(request, queryset, ordering)
+    if wants_fragment(request):
+        return product_cards_fragment(request, products)
+    context = {
+        "products": products,
+        "categories": categories,
+        "trending_in_category": trending.trending_products(TrendingProduct.CATEGORY, categories.id),
+        "facets": facets.facet_options(request, facets.category_counts(categories), filters),
+        "filters": filters,
+        "sort_options": SORT_LABELS,
+        "current_sort": request.GET.get("sort", "newest"),
+    }
     return render(request, "categories-post.html", context)
 
 
@@ -5,7 +5,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 import stripe
 import json
-from products.models import Cart
+from products import cart, stock
 from django.conf import settings
 from products.views import create_order_from_cart
 
@@ -25,17 +25,19 @@ def create_checkout_session(request):
         return JsonResponse({'error': 'Invalid payload'}, status=400)
 
     try:
-        cart_products = Cart.objects.filter(user=request.user).values()
-        cart_product_list = list(cart_products)
-
-        if not cart_product_list:
+        # The amount charged is always computed from the database.
+        snapshot = cart.snapshot(request.user, fresh=True)
+        if not snapshot:
             return JsonResponse({'error': 'Cart is empty'}, status=400)
 
+        cart_product_list = [
+            {'id': line.id, 'product_id': line.product_id, 'quantity': line.quantity, 'total': line.total}
+            for line in snapshot
+        ]
         # Serialize cart_product_list to JSON
         serialized_cart_products = json.dumps(cart_product_list, cls=DjangoJSONEncoder)
 
-        subtotal = Cart.subtotal_product_price(request.user)
-        amount = subtotal * 100
+        amount = snapshot.subtotal * 100
 
         # Create a PaymentIntent with the order amount and currency
         intent = stripe.PaymentIntent.create(
@@ -53,14 +55,19 @@ def create_checkout_session(request):
 # Display Payment Details with products
 @login_required(login_url="user_login")
 def display_payment_details(request):
-    cart_products = Cart.objects.filter(user=request.user)
-    if not cart_products:
+    snapshot = cart.snapshot(request.user)
+    if not snapshot:
         messages.error(request, "You have no items in your cart to pay for.")
         return redirect('show_cart')
+    try:
+        stock.reserve_cart(request.user, snapshot)
+    except ValueError as exc:
+        messages.error(request, str(exc))
+        return redirect('show_cart')
 
     context = {
-        'cart_products': cart_products,
-        'payable': Cart.subtotal_product_price(request.user),
+        'cart_products': snapshot,
+        'payable': snapshot.subtotal,
         'stripe_publishable_key': settings.STRIPE_PUBLISHABLE_KEY,
         'return_url': request.build_absolute_uri('/payment-success/'),
     }
@@ -32,6 +32,12 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ['title','categories','regular_price','vendor_stores']
     list_editable =['vendor_stores']
 
+    def get_readonly_fields(self, request, obj=None):
+        # Sharded stock is set with `manage.py stock_slots`, see products/stock.py.
+        if obj and obj.stock_slots:
+            return ['stoc', 'out_of_stoc']
+        return []
+
 class CartModelAdmin(admin.ModelAdmin):
     list_display = ['product','user']
 
@@ -46,6 +52,7 @@ super_admin_site.register(CustomerAddress)
 super_admin_site.register(PlacedOder)
 super_admin_site.register(PlacedeOderItem)
 super_admin_site.register(CuponCodeGenaration)
+super_admin_site.register(CouponRedemption)
 super_admin_site.register(CompletedOder)
 super_admin_site.register(CompletedOderItems)
 super_admin_site.register(ProductStarRatingAndReview)
@@ -0,0 +1,504 @@
+"""
+Cart snapshots.
+
+snapshot(user) returns the user's cart as an immutable CartSnapshot:
+lines with title, image, unit price and line total, the coupon, the
+shipping address and the totals. It is built in one query.
+
+Snapshots are memoized on the user object for the rest of the request and
+cached under the user's `cart_version`. AuthenticationMiddleware loads that
+column with the user anyway, so a warm page costs no cart queries at all.
+Everything that changes a cart calls bump_version(user) (see views), which
+makes every cached snapshot of that cart unreachable in all processes.
+Price or stock edits don't bump carts, so cached snapshots live at most
+CART_CACHE_TIMEOUT. Paths that take money use snapshot(user, fresh=True).
+
+Visitors who aren't logged in keep their cart in a signed cookie as
+"product_id:quantity,..." (guest_items/save_guest_items), so browsing
+writes nothing to the database. for_request() gives either kind of cart
+as a snapshot; for guests the line id is the product id. Logging in
+merges the cookie into Cart rows with one upsert (merge_guest_cart).
+
+Cart.last_updated is the time of the line's last change. purge_stale()
+deletes carts that nobody touched for STALE_CART_DAYS, see the
+purge_stale_carts command.
+"""
+import time
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.signing import BadSignature
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.db.models.functions import Greatest, Least
+
+from .models import PLACEHOLDER_IMAGE, Cart, CartHeader, Product, primary_image_subquery
+
+CART_CACHE_TIMEOUT = 300
+CENT = Decimal("0.01")
+MAX_QUANTITY = 50
+GUEST_COOKIE = "guest_cart"
+GUEST_COOKIE_SALT = "products.cart"
+GUEST_COOKIE_AGE = 30 * 24 * 3600
+# Keeps the cookie far below the 4KB browsers accept.
+GUEST_MAX_LINES = 100
+MAX_OPERATIONS = 100
+STALE_CART_DAYS = 30
+
+
+@dataclass(frozen=True)
+class CartLine:
+    id: int
+    product_id: int
+    title: str
+    slug: str
+    image: str
+    image_renditions: dict
+    quantity: int
+    unit_price: Decimal
+    total: Decimal
+    stock: int
+    out_of_stock: bool
+    # > 0 for flash-sale products sold from stock slots (products/stock.py).
+    stock_slots: int = 0
+
+    def as_json(self):
+        return {
+            "id": self.id,
+            "product_id": self.product_id,
+            "image": self.image,
+            "title": self.title,
+            "quantity": self.quantity,
+            "regular_price": float(self.unit_price),
+            "total_product_price": float(self.total),
+        }
+
+
+@dataclass(frozen=True)
+class CartCoupon:
+    id: int
+    code: str
+    percent: int
+    cap: Decimal
+
+
+@dataclass(frozen=True)
+class CartSnapshot:
+    lines: tuple = ()
+    coupon: CartCoupon = None
+    shipping_address_id: int = None
+    items_total: Decimal = Decimal("0.00")
+    discount: Decimal = Decimal("0.00")
+    subtotal: Decimal = Decimal("0.00")
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    @property
+    def count(self):
+        return len(self.lines)
+
+    @property
+    def quantity(self):
+        return sum(line.quantity for line in self.lines)
+
+    def line(self, line_id):
+        return next((line for line in self.lines if line.id == line_id), None)
+
+    def as_json(self):
+        return {
+            "items_total": float(self.items_total),
+            "discount": float(self.discount),
+            "sub_total": float(self.subtotal),
+            "quantity": self.quantity,
+            "carts_product": [line.as_json() for line in self.lines] or ["no-product"],
+        }
+
+
+EMPTY = CartSnapshot()
+
+
+def coupon_discount(items_total, coupon):
+    if coupon is None:
+        return Decimal("0.00")
+    return min(items_total * Decimal(coupon.percent) / Decimal("100"), coupon.cap)
+
+
+def build_snapshot(user):
+    rows = (
+        Cart.objects.filter(user=user)
+        .order_by("id")
+        .annotate(image=primary_image_subquery("product_id"),
+                  image_renditions=primary_image_subquery("product_id", "image_renditions"))
+        .values_list(
+            "id", "product_id", "product__title", "product__slug", "image", "image_renditions",
+            "quantity", "product__effective_price", "product__stoc", "product__out_of_stoc",
+            "product__stock_slots", "header__shipping_address_id", "header__cupon_code_id", "header__cupon_code__cupon_code",
+            "header__cupon_code__discoun_parcent", "header__cupon_code__up_to",
+        )
+    )
+    lines = []
+    coupon = None
+    shipping_address_id = None
+    for (line_id, product_id, title, slug, image, renditions, quantity, price, stock, out_of_stock,
+         stock_slots, address_id, coupon_id, code, percent, cap) in rows:
+        lines.append(CartLine(
+            id=line_id, product_id=product_id, title=title, slug=slug,
+            image=image or PLACEHOLDER_IMAGE, image_renditions=renditions or {},
+            quantity=quantity, unit_price=price, total=price * quantity,
+            stock=stock, out_of_stock=out_of_stock, stock_slots=stock_slots,
+        ))
+        # Every line carries the same header.
+        if len(lines) == 1:
+            shipping_address_id = address_id
+            if coupon_id:
+                coupon = CartCoupon(id=coupon_id, code=code, percent=percent, cap=Decimal(cap))
+
+    items_total = sum((line.total for line in lines), Decimal("0.00"))
+    discount = coupon_discount(items_total, coupon)
+    return CartSnapshot(
+        lines=tuple(lines),
+        coupon=coupon,
+        shipping_address_id=shipping_address_id,
+        items_total=items_total,
+        discount=discount,
+        subtotal=(items_total - discount).quantize(CENT, rounding=ROUND_HALF_UP),
+    )
+
+
+def cache_key(user):
+    return f"products:cart:{user.pk}:{user.cart_version}"
+
+
+def snapshot(user, fresh=False):
+    """
+    The user's cart, memoized for the request and cached per cart version.
+    fresh=True skips both and reads the database.
+    """
+    if not user.is_authenticated:
+        return EMPTY
+    if fresh:
+        return build_snapshot(user)
+    memo = getattr(user, "_cart_snapshot", None)
+    if memo is None:
+        memo = cache.get(cache_key(user))
+        if memo is None:
+            memo = build_snapshot(user)
+            cache.set(cache_key(user), memo, CART_CACHE_TIMEOUT)
+        user._cart_snapshot = memo
+    return memo
+
+
+def bump_version(user):
+    """
+    Call after changing the user's cart rows.
+    """
+    # A new value rather than +1, so the in-memory user can be updated
+    # without reading the row back.
+    version = time.time_ns() // 1000
+    get_user_model().objects.filter(pk=user.pk).update(cart_version=version)
+    user.cart_version = version
+    user._cart_snapshot = None
+
+
+def header_for(user):
+    return CartHeader.objects.get_or_create(user=user)[0]
+
+
+def update_header(user, **fields):
+    """
+    Set the cart's shipping address and/or coupon: one row, whatever the
+    number of lines.
+    """
+    # update() skips auto_now; the header's updated_at marks the cart as
+    # active for stale_lines().
+    if not CartHeader.objects.filter(user=user).update(updated_at=timezone.now(), **fields):
+        CartHeader.objects.update_or_create(user=user, defaults=fields)
+    bump_version(user)
+
+
+# ---- Guest carts ----
+
+def _parse_guest(value):
+    items = {}
+    for part in value.split(","):
+        product_id, _, quantity = part.partition(":")
+        if product_id.isdigit() and quantity.isdigit() and int(quantity) > 0:
+            items[int(product_id)] = min(int(quantity), MAX_QUANTITY)
+    return items
+
+
+def guest_items(request):
+    """
+    {product_id: quantity} of the visitor's cookie cart, in the order added.
+    """
+    items = getattr(request, "_guest_cart_items", None)
+    if items is None:
+        try:
+            value = request.get_signed_cookie(GUEST_COOKIE, default="", salt=GUEST_COOKIE_SALT)
+        except BadSignature:
+            value = ""
+        items = request._guest_cart_items = _parse_guest(value)
+    return items
+
+
+def save_guest_items(request, response, items):
+    request._guest_cart_items = items
+    request._guest_cart_snapshot = None
+    if not items:
+        response.delete_cookie(GUEST_COOKIE)
+        return
+    value = ",".join(f"{product_id}:{quantity}" for product_id, quantity in list(items.items())[-GUEST_MAX_LINES:])
+    response.set_signed_cookie(
+        GUEST_COOKIE, value, salt=GUEST_COOKIE_SALT, max_age=GUEST_COOKIE_AGE,
+        secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite="Lax",
+    )
+
+
+def build_guest_snapshot(items):
+    if not items:
+        return EMPTY
+    rows = {
+        row[0]: row for row in
+        Product.objects.filter(id__in=list(items))
+        .annotate(image=primary_image_subquery(), image_renditions=primary_image_subquery(field="image_renditions"))
+        .values_list("id", "title", "slug", "image", "image_renditions", "effective_price", "stoc", "out_of_stoc")
+    }
+    lines = []
+    for product_id, quantity in items.items():
+        if product_id not in rows:
+            continue
+        _, title, slug, image, renditions, price, stock, out_of_stock = rows[product_id]
+        lines.append(CartLine(
+            id=product_id, product_id=product_id, title=title, slug=slug,
+            image=image or PLACEHOLDER_IMAGE, image_renditions=renditions or {},
+            quantity=quantity, unit_price=price, total=price * quantity,
+            stock=stock, out_of_stock=out_of_stock,
+        ))
+    items_total = sum((line.total for line in lines), Decimal("0.00"))
+    return CartSnapshot(lines=tuple(lines), items_total=items_total,
+                        subtotal=items_total.quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def for_request(request):
+    """
+    The cart of whoever made the request: the user's, or the guest cookie's.
+    """
+    if request.user.is_authenticated:
+        return snapshot(request.user)
+    memo = getattr(request, "_guest_cart_snapshot", None)
+    if memo is None:
+        memo = request._guest_cart_snapshot = build_guest_snapshot(guest_items(request))
+    return memo
+
+
+def _new_line(header, product_id, quantity):
+    return Cart(user_id=header.user_id, header=header, product_id=product_id, quantity=quantity)
+
+
+def merge_guest_cart(request, user):
+    """
+    Move the guest cart into the user's Cart rows: quantities add up (to
+    MAX_QUANTITY) and new lines join the user's cart header. Returns
+    True when there was anything to merge; the caller drops the cookie.
+    """
+    items = guest_items(request)
+    if not items:
+        return False
+    with transaction.atomic():
+        existing = {
+            row.product_id: row for row in
+            Cart.objects.select_for_update().filter(user=user).order_by("id")
+        }
+        header = header_for(user)
+        valid = set(Product.objects.filter(id__in=list(items)).values_list("id", flat=True))
+        rows = []
+        for product_id, quantity in items.items():
+            if product_id not in valid:
+                continue
+            current = existing.get(product_id)
+            rows.append(_new_line(header, product_id, min((current.quantity if current else 0) + quantity, MAX_QUANTITY)))
+        Cart.objects.bulk_create(rows, update_conflicts=True, unique_fields=["user", "product"],
+                                 update_fields=["quantity", "last_updated"])
+        bump_version(user)
+    return True
+
+
+# ---- Batched changes ----
+
+def _int(value, name):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"{name} must be an integer")
+    return value
+
+
+def parse_operations(operations):
+    """
+    Fold a list of cart operations into their net effect:
+
+        {"op": "set", "id": <line>, "quantity": n}    0 removes the line
+        {"op": "increment", "id": <line>, "by": n}    n may be negative
+        {"op": "remove", "id": <line>}
+        {"op": "add", "product": <product id>, "quantity": n}
+
+    Returns (lines, adds): {line_id: ("set", n) | ("increment", n) |
+    ("remove", None)} and {product_id: quantity}. Operations on the same
+    line apply in order. Raises ValueError for anything malformed.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("ops must be a non-empty list")
+    if len(operations) > MAX_OPERATIONS:
+        raise ValueError(f"at most {MAX_OPERATIONS} ops per request")
+    lines, adds = {}, {}
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise ValueError("every op must be an object")
+        kind = operation.get("op")
+        if kind == "add":
+            product_id = _int(operation.get("product"), "product")
+            quantity = _int(operation.get("quantity", 1), "quantity")
+            if quantity < 1:
+                raise ValueError("quantity must be positive")
+            adds[product_id] = adds.get(product_id, 0) + quantity
+            continue
+        line_id = _int(operation.get("id"), "id")
+        current = lines.get(line_id)
+        if current and current[0] == "remove":
+            continue
+        if kind == "remove":
+            lines[line_id] = ("remove", None)
+        elif kind == "set":
+            quantity = _int(operation.get("quantity"), "quantity")
+            if quantity < 0:
+                raise ValueError("quantity can't be negative")
+            lines[line_id] = ("set", min(quantity, MAX_QUANTITY)) if quantity else ("remove", None)
+        elif kind == "increment":
+            by = _int(operation.get("by", 1), "by")
+            if current:
+                lines[line_id] = (current[0], current[1] + by)
+            else:
+                lines[line_id] = ("increment", by)
+        else:
+            raise ValueError(f"unknown op {kind!r}")
+    # A set followed by increments is still a set, clamped like any other.
+    for line_id, (kind, value) in lines.items():
+        if kind == "set":
+            lines[line_id] = (kind, min(max(value, 1), MAX_QUANTITY))
+    return lines, adds
+
+
+def _group(lines, kind):
+    groups = {}
+    for line_id, (line_kind, value) in lines.items():
+        if line_kind == kind:
+            groups.setdefault(value, []).append(line_id)
+    return groups
+
+
+def apply_operations(user, lines, adds):
+    """
+    Apply parsed operations to the user's cart in one transaction. Every
+    change is a single UPDATE or DELETE computed in the database (F()
+    clamped to 1..MAX_QUANTITY), so concurrent requests can't lose each
+    other's clicks. Lines of other users are silently left alone.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        carts = Cart.objects.filter(user=user)
+        removed = [line_id for line_id, (kind, _) in lines.items() if kind == "remove"]
+        if removed:
+            carts.filter(id__in=removed).delete()
+        for quantity, ids in _group(lines, "set").items():
+            carts.filter(id__in=ids).update(quantity=quantity, last_updated=now)
+        for by, ids in _group(lines, "increment").items():
+            if by:
+                carts.filter(id__in=ids).update(
+                    quantity=Least(Greatest(F("quantity") + by, 1), MAX_QUANTITY), last_updated=now)
+        if adds:
+            existing = {
+                row.product_id: row for row in
+                carts.select_for_update().filter(product_id__in=list(adds)).order_by("id")
+            }
+            increments = {}
+            for product_id, quantity in adds.items():
+                if product_id in existing:
+                    increments.setdefault(quantity, []).append(product_id)
+            for quantity, product_ids in increments.items():
+                carts.filter(product_id__in=product_ids).update(
+                    quantity=Least(F("quantity") + quantity, MAX_QUANTITY), last_updated=now)
+            missing = set(Product.objects.filter(id__in=[pid for pid in adds if pid not in existing])
+                          .values_list("id", flat=True))
+            if missing:
+                header = header_for(user)
+                Cart.objects.bulk_create([
+                    _new_line(header, product_id, min(quantity, MAX_QUANTITY))
+                    for product_id, quantity in adds.items() if product_id in missing
+                ], update_conflicts=True, unique_fields=["user", "product"], update_fields=["quantity", "last_updated"])
+        bump_version(user)
+
+
+def apply_guest_operations(items, lines, adds):
+    """
+    The same for a guest cart, whose line ids are product ids. Returns the
+    new {product_id: quantity}.
+    """
+    items = dict(items)
+    for product_id, (kind, value) in lines.items():
+        if product_id not in items:
+            continue
+        if kind == "remove":
+            del items[product_id]
+        elif kind == "set":
+            items[product_id] = value
+        else:
+            items[product_id] = min(max(items[product_id] + value, 1), MAX_QUANTITY)
+    known = set(Product.objects.filter(id__in=[pid for pid in adds if pid not in items]).values_list("id", flat=True))
+    for product_id, quantity in adds.items():
+        if product_id in items or product_id in known:
+            items[product_id] = min(items.get(product_id, 0) + quantity, MAX_QUANTITY)
+    return items
+
+
+# ---- Abandoned carts ----
+
+def stale_lines(cutoff):
+    """
+    Lines of carts nobody touched since cutoff: no line of the cart and
+    not its header changed after it.
+    """
+    return (
+        Cart.objects.filter(last_updated__lt=cutoff)
+        .exclude(user__in=Cart.objects.filter(last_updated__gte=cutoff).values("user"))
+        .exclude(header__updated_at__gte=cutoff)
+    )
+
+
+def purge_stale(cutoff, batch_size=500, pause=0.5):
+    """
+    Delete stale lines oldest first, batch_size at a time, each batch in its
+    own short transaction with `pause` seconds between batches, so row locks
+    are brief and replicas keep up. Yields the number deleted per batch.
+    """
+    while True:
+        batch = list(stale_lines(cutoff).order_by("last_updated").values_list("id", "user_id")[:batch_size])
+        if not batch:
+            return
+        with transaction.atomic():
+            # Filtered again, in case the cart was touched since the select.
+            deleted, _ = stale_lines(cutoff).filter(id__in=[line_id for line_id, _ in batch]).delete()
+            get_user_model().objects.filter(pk__in={user_id for _, user_id in batch}).update(
+                cart_version=time.time_ns() // 1000)
+        yield deleted
+        if len(batch) < batch_size:
+            return
+        time.sleep(pause)
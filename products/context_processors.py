@@ -0,0 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import cart, taxonomy
+
+
+def taxonomy_tree(request):
+    """
+    Expose the cached category tree as `industry` to every template, so views
+    no longer query Industry.objects.all() for the header.
+    """
+    return {"industry": SimpleLazyObject(taxonomy.get_tree)}
+
+
+def mini_cart(request):
+    """
+    The header mini-cart, as the user's or guest's cart snapshot. Nothing
+    is loaded unless a template actually renders it.
+    """
+    return {"mini_cart": SimpleLazyObject(lambda: cart.for_request(request))}
@@ -0,0 +1,156 @@
+"""
+Coupon codes.
+
+lookup(code) reads through the cache. The terms of an existing code are
+cached for COUPON_TIMEOUT, and a code that doesn't exist is cached as
+missing for MISSING_TIMEOUT, so guessing codes doesn't reach the
+database. Saving or deleting a coupon drops its entry (see
+products/signals.py).
+
+check() decides whether a user may apply a code now. The coupon must be
+active, inside its validity window, not used up, and not already used
+max_per_user times by that user. Usage is always read from the database.
+Each user gets MAX_FAILED_ATTEMPTS wrong codes per ATTEMPT_WINDOW.
+
+redeem() runs inside order placement. It takes a use with one conditional
+UPDATE of times_redeemed, so two orders can't both get the last one. It
+then records a CouponRedemption for the order.
+"""
+import hashlib
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CouponRedemption, CuponCodeGenaration
+
+COUPON_TIMEOUT = 300
+MISSING_TIMEOUT = 600
+MAX_FAILED_ATTEMPTS = 10
+ATTEMPT_WINDOW = 900
+CODE_MAX_LENGTH = CuponCodeGenaration._meta.get_field("cupon_code").max_length
+
+
+class CouponError(ValueError):
+    """
+    A coupon can't be used; the message is meant for the customer.
+    """
+
+
+@dataclass(frozen=True)
+class CouponTerms:
+    id: int
+    code: str
+    percent: int
+    cap: int
+    is_active: bool
+    valid_from: object
+    valid_until: object
+    max_redemptions: int
+    max_per_user: int
+
+
+TERM_FIELDS = ("id", "cupon_code", "discoun_parcent", "up_to", "is_active", "valid_from", "valid_until",
+               "max_redemptions", "max_per_user")
+
+
+def normalize(code):
+    return (code or "").strip()
+
+
+def cache_key(code):
+    # Codes are user input; hashing keeps the key short and safe for any backend.
+    return "products:coupon:" + hashlib.sha256(code.encode()).hexdigest()[:32]
+
+
+def lookup(code):
+    """
+    The CouponTerms for code, or None when there is no such coupon.
+    """
+    code = normalize(code)
+    if not code or len(code) > CODE_MAX_LENGTH:
+        return None
+    terms = cache.get(cache_key(code))
+    if terms is None:
+        row = CuponCodeGenaration.objects.filter(cupon_code=code).values_list(*TERM_FIELDS).first()
+        terms = CouponTerms(*row) if row else False
+        cache.set(cache_key(code), terms, COUPON_TIMEOUT if terms else MISSING_TIMEOUT)
+    return terms or None
+
+
+def invalidate(codes):
+    cache.delete_many([cache_key(normalize(code)) for code in set(codes) if normalize(code)])
+
+
+def _attempts_key(user):
+    return f"products:coupon-attempts:{user.pk}"
+
+
+def _count_failure(user):
+    key = _attempts_key(user)
+    cache.add(key, 0, ATTEMPT_WINDOW)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add and incr.
+        cache.set(key, 1, ATTEMPT_WINDOW)
+
+
+def unavailable(terms, user, now=None):
+    """
+    Why user can't use the coupon right now, or None if they can.
+    """
+    now = now or timezone.now()
+    if not terms.is_active or (terms.valid_until and now > terms.valid_until):
+        return "This coupon has expired."
+    if terms.valid_from and now < terms.valid_from:
+        return "This coupon is not valid yet."
+    if terms.max_redemptions is not None and not CuponCodeGenaration.objects.filter(
+            id=terms.id, times_redeemed__lt=F("max_redemptions")).exists():
+        return "This coupon has been used up."
+    if terms.max_per_user is not None and (
+            CouponRedemption.objects.filter(coupon_id=terms.id, user=user).count() >= terms.max_per_user):
+        return "You have already used this coupon."
+    return None
+
+
+def check(code, user):
+    """
+    The CouponTerms of code if user may apply it now; raises CouponError
+    otherwise.
+    """
+    if (cache.get(_attempts_key(user)) or 0) >= MAX_FAILED_ATTEMPTS:
+        raise CouponError("Too many invalid coupon codes. Please try again later.")
+    terms = lookup(code)
+    if terms is None:
+        _count_failure(user)
+        raise CouponError("Invalid coupon code.")
+    problem = unavailable(terms, user)
+    if problem:
+        raise CouponError(problem)
+    return terms
+
+
+def redeem(coupon, user, order, discount):
+    """
+    Use up one redemption of coupon (a cart.CartCoupon) for order. Call
+    inside the order's transaction; raises CouponError if the coupon can't
+    be used any more, which rolls the order back.
+    """
+    now = timezone.now()
+    taken = (
+        CuponCodeGenaration.objects.filter(id=coupon.id, is_active=True)
+        .exclude(valid_from__gt=now).exclude(valid_until__lt=now)
+        .filter(Q(max_redemptions__isnull=True) | Q(times_redeemed__lt=F("max_redemptions")))
+        .update(times_redeemed=F("times_redeemed") + 1)
+    )
+    if not taken:
+        raise CouponError(f"The coupon {coupon.code} is no longer available. Please remove it and try again.")
+    # The UPDATE above holds the coupon's row lock until commit, so this
+    # count can't race another order using the same coupon.
+    terms = lookup(coupon.code)
+    if terms and terms.max_per_user is not None and (
+            CouponRedemption.objects.filter(coupon_id=coupon.id, user=user).count() >= terms.max_per_user):
+        raise CouponError(f"You have already used the coupon {coupon.code}.")
+    return CouponRedemption.objects.create(coupon_id=coupon.id, user=user, order=order, discount=discount)
@@ -0,0 +1,200 @@
+"""
+Faceted filtering for product listings.
+
+Facet counts for a category come from two queries: one row of conditional
+aggregates (price buckets, discount, rating and stock) and one GROUP BY on
+the vendor store. They describe the whole category, not the filtered
+subset, which is what lets them be cached per category. The cache entry is
+dropped whenever a product in that category is saved, imported or deleted
+(see products/signals.py), or goes in or out of stock through an order or
+a reservation (products/orders.py, products/stock.py), and otherwise
+expires after FACET_TIMEOUT.
+
+Filters arrive as query parameters:
+    price_min, price_max  effective (discounted) price, max exclusive
+    discount              minimum discount percent
+    store                 vendor store id, repeatable
+    in_stock=1            only products that can be bought: free stock
+                          (stoc - reserved), or stock left in any slot
+                          for sharded products
+    rating                minimum average star rating
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from .models import Product, ProductStockSlot
+
+
+FACET_TIMEOUT = 600
+PRICE_BUCKETS = ((0, 25), (25, 50), (50, 100), (100, 250), (250, 500), (500, None))
+DISCOUNT_STEPS = (10, 25, 50)
+RATING_STEPS = (4, 3, 2)
+FILTER_PARAMS = ("price_min", "price_max", "discount", "store", "in_stock", "rating")
+
+IN_STOCK = Q(out_of_stoc=False) & (
+    Q(stock_slots=0, stoc__gt=F("reserved"))
+    | Q(Exists(ProductStockSlot.objects.filter(product=OuterRef("pk"), stoc__gt=0)), stock_slots__gt=0)
+)
+
+
+def cache_key(category_id):
+    return f"products:facets:{category_id}"
+
+
+def _decimal(value):
+    try:
+        value = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return value if value.is_finite() and value >= 0 else None
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_filters(params):
+    """
+    The valid filters in a QueryDict; anything malformed is ignored.
+    """
+    return {
+        "price_min": _decimal(params.get("price_min")),
+        "price_max": _decimal(params.get("price_max")),
+        "discount": _int(params.get("discount")),
+        "stores": [store for store in map(_int, params.getlist("store")) if store is not None],
+        "in_stock": params.get("in_stock") == "1",
+        "rating": _int(params.get("rating")),
+    }
+
+
+def apply_filters(queryset, filters):
+    if filters["price_min"] is not None:
+        queryset = queryset.filter(effective_price__gte=filters["price_min"])
+    if filters["price_max"] is not None:
+        queryset = queryset.filter(effective_price__lt=filters["price_max"])
+    if filters["discount"]:
+        queryset = queryset.filter(discounted_parcent__gte=filters["discount"])
+    if filters["stores"]:
+        queryset = queryset.filter(vendor_stores_id__in=filters["stores"])
+    if filters["in_stock"]:
+        queryset = queryset.filter(IN_STOCK)
+    if filters["rating"]:
+        queryset = queryset.filter(rating_avg__gte=filters["rating"])
+    return queryset
+
+
+def _price_q(low, high):
+    condition = Q(effective_price__gte=low)
+    if high is not None:
+        condition &= Q(effective_price__lt=high)
+    return condition
+
+
+def compute_counts(queryset):
+    queryset = queryset.order_by()
+    aggregates = {"total": Count("id"), "in_stock": Count("id", filter=IN_STOCK)}
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f"price_{index}"] = Count("id", filter=_price_q(low, high))
+    for step in DISCOUNT_STEPS:
+        aggregates[f"discount_{step}"] = Count("id", filter=Q(discounted_parcent__gte=step))
+    for step in RATING_STEPS:
+        aggregates[f"rating_{step}"] = Count("id", filter=Q(rating_avg__gte=step))
+    row = queryset.aggregate(**aggregates)
+
+    stores = (
+        queryset.filter(vendor_stores__isnull=False)
+        .values_list("vendor_stores_id", "vendor_stores__name")
+        .annotate(count=Count("id"))
+        .order_by("-count", "vendor_stores__name")
+    )
+    return {
+        "total": row["total"],
+        "in_stock": row["in_stock"],
+        "price": [(low, high, row[f"price_{index}"]) for index, (low, high) in enumerate(PRICE_BUCKETS)],
+        "discount": [(step, row[f"discount_{step}"]) for step in DISCOUNT_STEPS],
+        "rating": [(step, row[f"rating_{step}"]) for step in RATING_STEPS],
+        "stores": list(stores),
+    }
+
+
+def category_counts(category):
+    counts = cache.get(cache_key(category.id))
+    if counts is None:
+        counts = compute_counts(Product.objects.filter(categories=category))
+        cache.set(cache_key(category.id), counts, FACET_TIMEOUT)
+    return counts
+
+
+def invalidate(category_ids):
+    cache.delete_many([cache_key(category_id) for category_id in set(category_ids) if category_id])
+
+
+def _url(request, **changes):
+    query = request.GET.copy()
+    for name in ("cursor", "format"):
+        query.pop(name, None)
+    for name, value in changes.items():
+        query.pop(name, None)
+        if isinstance(value, (list, tuple)):
+            query.setlist(name, [str(item) for item in value])
+        elif value not in (None, ""):
+            query[name] = str(value)
+    return f"{request.path}?{query.urlencode()}" if query else request.path
+
+
+def facet_options(request, counts, filters):
+    """
+    Counts plus a toggle url and selected flag for every facet value, ready
+    for products/facets.html.
+    """
+    def option(label, count, selected, **changes):
+        return {"label": label, "count": count, "selected": selected, "url": _url(request, **changes)}
+
+    price = []
+    for low, high, count in counts["price"]:
+        selected = filters["price_min"] == low and filters["price_max"] == high
+        label = f"${low} - ${high}" if high is not None else f"${low} & above"
+        price.append(option(label, count, selected, price_min=None if selected else low,
+                            price_max=None if selected else high))
+
+    discount = [
+        option(f"{step}% off or more", count, filters["discount"] == step,
+               discount=None if filters["discount"] == step else step)
+        for step, count in counts["discount"]
+    ]
+    rating = [
+        option(f"{step} stars & up", count, filters["rating"] == step,
+               rating=None if filters["rating"] == step else step)
+        for step, count in counts["rating"]
+    ]
+    stores = []
+    for store_id, name, count in counts["stores"]:
+        selected = store_id in filters["stores"]
+        chosen = [store for store in filters["stores"] if store != store_id] if selected else filters["stores"] + [store_id]
+        stores.append(option(name, count, selected, store=chosen))
+
+    in_stock = option("In stock only", counts["in_stock"], filters["in_stock"],
+                      in_stock=None if filters["in_stock"] else 1)
+
+    # Everything but the sort and price range, carried as hidden inputs by
+    # the form that sets those two.
+    keep = [
+        (name, value) for name, values in request.GET.lists()
+        if name not in ("sort", "price_min", "price_max", "cursor", "format") for value in values
+    ]
+    return {
+        "total": counts["total"],
+        "price": price,
+        "discount": discount,
+        "rating": rating,
+        "stores": stores,
+        "in_stock": in_stock,
+        "hidden": keep,
+        "active": any(request.GET.get(name) for name in FILTER_PARAMS),
+        "clear_url": _url(request, **{name: None for name in FILTER_PARAMS}),
+    }
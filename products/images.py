@@ -0,0 +1,244 @@
+"""
+Responsive image renditions.
+
+Every image the shop renders (see IMAGE_FIELDS) gets a `<field>_renditions`
+JSON manifest next to it:
+
+    {"source": <file name or url>, "width": 1200, "height": 900,
+     "webp": [[80, 60, "renditions/ab/ab12...-80.webp"], ...],
+     "jpeg": [[80, 60, "renditions/ab/ab12...-80.jpg"], ...]}
+
+Renditions are downscaled with Pillow to the fixed WIDTHS that are smaller
+than the original, plus the original width up to the largest of them. They are stored under a hash of the source bytes, so
+identical uploads share files and every rendition name is safe to cache
+forever. Templates render from the manifest alone (the `images` template
+tags), so showing an image never opens it.
+
+Saving a model only marks its new or changed images pending (their
+manifest becomes {"pending": true}, so templates fall back to the plain
+image). `python manage.py build_image_renditions --pending`, run from cron
+or a worker every minute, builds them; without --pending it also catches
+anything else that is missing or outdated. Neither the web process nor an
+import ever waits for a download or for Pillow.
+"""
+import hashlib
+import io
+import ipaddress
+import logging
+import socket
+import urllib.parse
+import urllib.request
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+
+# (model label, image field); the manifest lives in `<field>_renditions`.
+IMAGE_FIELDS = (
+    ("products.ProductImage", "image"),
+    ("products.ProductStarRatingAndReview", "review_images"),
+    ("home.SliderArea", "image"),
+    ("home.DisplayHotProductInCategories", "image"),
+    ("home.PopularCategories", "image"),
+    ("Vendors.VendorStore", "logo"),
+    ("Vendors.VendorStore", "cover_photo"),
+)
+
+WIDTHS = (80, 160, 320, 640, 1280, 1920)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+RENDITION_DIR = "renditions"
+# Remote product image urls (catalog imports) are fetched with these limits,
+# and only from the hosts in fetch_hosts().
+FETCH_TIMEOUT = 10
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+ORIENTATION = 0x0112
+
+
+def manifest_field(field):
+    return f"{field}_renditions"
+
+
+def image_fields(model):
+    label = model._meta.label
+    return [field for model_label, field in IMAGE_FIELDS if model_label == label]
+
+
+def source_of(value):
+    """
+    What a manifest is built from: the storage name of an ImageField
+    value, or the url/path stored in a plain CharField.
+    """
+    return getattr(value, "name", value) or ""
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    # A redirect could point anywhere, past the host check; fail instead.
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirects)
+
+
+def fetch_hosts():
+    hosts = {host.lower() for host in getattr(settings, "IMAGE_FETCH_HOSTS", ())}
+    media_host = urllib.parse.urlsplit(settings.MEDIA_URL).hostname
+    if media_host:
+        hosts.add(media_host.lower())
+    return hosts
+
+
+def check_remote(url):
+    """
+    Raise ValueError unless url is on an allowed image host (MEDIA_URL's,
+    or settings.IMAGE_FETCH_HOSTS) that resolves to public addresses only,
+    so vendor-supplied urls can't reach internal services.
+    """
+    parts = urllib.parse.urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if host not in fetch_hosts():
+        raise ValueError(f"{host or url!r} is not an allowed image host")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (ValueError, socket.gaierror) as exc:
+        raise ValueError(f"can't resolve {host}: {exc}")
+    for *_, sockaddr in addresses:
+        if not ipaddress.ip_address(sockaddr[0].split("%")[0]).is_global:
+            raise ValueError(f"{host} resolves to a non-public address")
+
+
+def read_source(source):
+    if source.startswith(settings.MEDIA_URL):
+        # Our own media is read from storage, even when MEDIA_URL is a CDN.
+        source = source[len(settings.MEDIA_URL):]
+    elif source.startswith(("http://", "https://")):
+        check_remote(source)
+        request = urllib.request.Request(source, headers={"User-Agent": "renditions"})
+        with _opener.open(request, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ValueError("image too large")
+        return data
+    with default_storage.open(source.lstrip("/"), "rb") as fileobj:
+        return fileobj.read()
+
+
+def _flatten(image):
+    # JPEG has no alpha channel; composite onto white rather than black.
+    if image.mode != "RGBA":
+        return image
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def render(data, widths=WIDTHS):
+    """
+    Source bytes -> (width, height, [(width, height, format, bytes)]), the
+    width and height being those of the original, upright.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+        if image.getexif().get(ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEG can decode straight at a fraction of the size, which is
+        # most of the saving for large camera uploads.
+        image.draft("RGB", (max(widths), max(widths)))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        variants = []
+        # The fixed widths below the original, plus the original itself
+        # (capped) so large screens still get full detail.
+        targets = {target for target in widths if target < width} | {min(width, max(widths))}
+        for target in sorted(targets, reverse=True):
+            size = (target, max(1, round(height * target / width)))
+            resized = image if size == image.size else image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+            webp = io.BytesIO()
+            resized.save(webp, "WEBP", quality=WEBP_QUALITY, method=4)
+            jpeg = io.BytesIO()
+            _flatten(resized).save(jpeg, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            variants.append((size[0], size[1], "webp", webp.getvalue()))
+            variants.append((size[0], size[1], "jpeg", jpeg.getvalue()))
+            # Each smaller size is cut from the previous one, not the original.
+            image = resized
+    return width, height, variants
+
+
+def build_manifest(source):
+    data = read_source(source)
+    digest = hashlib.sha256(data).hexdigest()[:24]
+    width, height, variants = render(data)
+    manifest = {"source": source, "width": width, "height": height, "webp": [], "jpeg": []}
+    for variant_width, variant_height, fmt, content in sorted(variants):
+        extension = "jpg" if fmt == "jpeg" else fmt
+        name = f"{RENDITION_DIR}/{digest[:2]}/{digest}-{variant_width}.{extension}"
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(content))
+        manifest[fmt].append([variant_width, variant_height, name])
+    return manifest
+
+
+def process(model, pk, field):
+    """
+    Build the manifest of one image and store it, unless the image was
+    replaced meanwhile (the next save marks that one pending).
+    """
+    source = source_of(model.objects.filter(pk=pk).values_list(field, flat=True).first())
+    if not source:
+        return None
+    try:
+        manifest = build_manifest(source)
+    except (OSError, ValueError, SuspiciousFileOperation, UnidentifiedImageError,
+            Image.DecompressionBombError) as exc:
+        logger.warning("No renditions for %s %s.%s (%s): %s", model._meta.label, pk, field, source, exc)
+        manifest = {"source": source, "failed": True}
+    model.objects.filter(pk=pk, **{field: source}).update(**{manifest_field(field): manifest})
+    return manifest
+
+
+PENDING = {"pending": True}
+
+
+def mark_pending(model, pks, field):
+    """
+    Reset the manifests of these rows so build_image_renditions picks
+    them up.
+    """
+    pks = list(pks)
+    if pks:
+        model.objects.filter(pk__in=pks).update(**{manifest_field(field): PENDING})
+
+
+def mark_changed(sender, instance, raw=False, **kwargs):
+    """
+    post_save receiver: mark images whose manifest was built from
+    something else pending, and clear the manifest of removed ones.
+    """
+    if raw:
+        return
+    for field in image_fields(sender):
+        source = source_of(getattr(instance, field))
+        manifest = getattr(instance, manifest_field(field)) or {}
+        if manifest.get("source") == source or (source and manifest == PENDING):
+            continue
+        if source:
+            mark_pending(sender, [instance.pk], field)
+        elif manifest:
+            sender.objects.filter(pk=instance.pk).update(**{manifest_field(field): {}})
+
+
+def registered_models():
+    models = {}
+    for label, field in IMAGE_FIELDS:
+        models.setdefault(apps.get_model(label), []).append(field)
+    return models
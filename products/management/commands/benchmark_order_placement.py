@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from accounts.models import CustomUser
+from products import cart
+from products.models import Cart, Categories, CustomerAddress, Product
+from products.orders import create_order_from_cart
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time order placement for growing cart sizes on synthetic data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 10, 25, 50, 100])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['sizes'], options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write('Synthetic orders rolled back.')
+
+    def _run(self, sizes, repeat):
+        category = Categories.objects.order_by('id').first()
+        if category is None:
+            self.stderr.write('Needs at least one category.')
+            return
+        user = CustomUser.objects.create_user(
+            'order-benchmark@example.com', first_name='Order', last_name='Benchmark', mobile=1)
+        address = CustomerAddress.objects.create(
+            user=user, state='-', city='-', zip_code=1, street_address='-', mobile=1)
+        header = cart.header_for(user)
+        cart.update_header(user, shipping_address=address)
+        products = Product.objects.bulk_create([
+            Product(
+                title=f'Order benchmark {i}', slug=f'order-benchmark-{i}', regular_price=10 + i,
+                discounted_parcent=0, description='-', details_description='-', modle='-', tag='',
+                categories=category, stoc=1_000_000,
+            )
+            for i in range(max(sizes))
+        ])
+
+        self.stdout.write(f'{"lines":>6} {"queries":>8} {"median ms":>10} {"p95 ms":>8}')
+        for size in sizes:
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                Cart.objects.bulk_create([
+                    Cart(user=user, header=header, product=product, quantity=2) for product in products[:size]
+                ])
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as captured:
+                    create_order_from_cart(user)
+                timings.append((time.perf_counter() - started) * 1000)
+                queries = len(captured)
+            ordered = sorted(timings)
+            self.stdout.write(
+                f'{size:>6} {queries:>8} {statistics.median(timings):>10.2f} '
+                f'{ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]:>8.2f}'
+            )
@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from products import search
+from products.models import Industry, Categories, Product
+
+
+WORDS = (
+    "samsung apple xiaomi sony phone laptop tablet camera lens charger cable wireless "
+    "bluetooth speaker headphone keyboard mouse monitor gaming chair desk lamp kettle "
+    "blender mixer oven fridge washer dryer vacuum cleaner shirt jacket jeans shoes "
+    "sneaker watch bracelet necklace ring perfume cream lotion shampoo soap towel "
+    "pillow blanket curtain sofa table cabinet shelf drill hammer wrench bicycle "
+    "helmet tent backpack bottle stroller toy puzzle novel notebook pen marker"
+).split()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare full-text search latency with an icontains scan on a synthetic catalog (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self._run(rng, options['products'], options['queries'])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write('Synthetic catalog rolled back.')
+
+    def _run(self, rng, total, query_count):
+        backend = search.get_backend()
+        industries = [Industry.objects.create(name=f'Bench Industry {i}', slug=f'bench-industry-{i}') for i in range(4)]
+        categories = [
+            Categories.objects.create(name=f'Bench {word}', slug=f'bench-{word}', industry=industries[i % 4])
+            for i, word in enumerate(WORDS[:12])
+        ]
+
+        started = time.perf_counter()
+        batch = []
+        for i in range(total):
+            title = ' '.join(rng.choices(WORDS, k=rng.randint(3, 6)))
+            batch.append(Product(
+                title=title,
+                slug=f'bench-product-{i}',
+                regular_price=rng.randint(5, 2000),
+                discounted_parcent=rng.randint(0, 40),
+                description='<p>' + ' '.join(rng.choices(WORDS, k=30)) + '</p>',
+                details_description='<p>benchmark</p>',
+                modle=f'M{rng.randint(100, 999)}',
+                tag=','.join(rng.choices(WORDS, k=3)),
+                categories=rng.choice(categories),
+            ))
+            if len(batch) == 2000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        seeded = time.perf_counter()
+
+        with connection.cursor() as cursor:
+            backend.upsert(cursor, search.product_rows(Product.objects.filter(slug__startswith='bench-product-')))
+        indexed = time.perf_counter()
+        self.stdout.write(
+            f'Seeded {total} products in {seeded - started:.1f}s, indexed in {indexed - seeded:.1f}s '
+            f'({type(backend).__name__})'
+        )
+
+        queries = [' '.join(rng.sample(WORDS, rng.randint(1, 2))) for _ in range(query_count)]
+        fts = self._measure(queries, lambda q: self._fulltext_page(q))
+        scan = self._measure(queries, lambda q: self._icontains_page(q))
+        for label, timings in (('full-text', fts), ('icontains', scan)):
+            self.stdout.write(
+                f'{label:>10}: median {statistics.median(timings):8.2f} ms   '
+                f'p95 {self._p95(timings):8.2f} ms   max {max(timings):8.2f} ms'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Speed-up (median): {statistics.median(scan) / max(statistics.median(fts), 1e-6):.1f}x'
+        ))
+
+    @staticmethod
+    def _fulltext_page(query):
+        results = search.SearchResults(query)
+        results.count()
+        return results[0:24]
+
+    @staticmethod
+    def _icontains_page(query):
+        queryset = search.IcontainsSearchBackend.filter_queryset(Product.objects.all(), search.search_terms(query))
+        queryset.count()
+        return list(queryset.order_by('-created_at', '-id')[:24])
+
+    @staticmethod
+    def _measure(queries, run):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            run(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    @staticmethod
+    def _p95(timings):
+        ordered = sorted(timings)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
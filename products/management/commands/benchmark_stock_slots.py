@@ -0,0 +1,73 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from products import stock
+from products.models import Categories, Product
+
+
+class Command(BaseCommand):
+    help = ('Stress one hot product from concurrent workers and report orders/s for each number of '
+            'stock slots (0 = the plain product row). Commits to the database; the synthetic product '
+            'is deleted afterwards. Only meaningful on PostgreSQL/MySQL: SQLite runs one writer at a time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, nargs='+', default=[0, 1, 4, 16])
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--orders', type=int, default=200, help='Orders per worker')
+        parser.add_argument('--hold-ms', type=float, default=2.0,
+                            help='Time each order keeps its transaction open after taking stock')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and options['workers'] > 1:
+            # Concurrent writers just get "database is locked" there.
+            self.stderr.write('SQLite runs one writer at a time; using a single worker.')
+            options['workers'] = 1
+        category = Categories.objects.order_by('id').first()
+        if category is None:
+            self.stderr.write('Needs at least one category.')
+            return
+        product = Product.objects.create(
+            title='Stock slot benchmark', slug=f'stock-slot-benchmark-{int(time.time())}', regular_price=10,
+            discounted_parcent=0, description='-', details_description='-', modle='-', tag='',
+            categories=category, stoc=0,
+        )
+        try:
+            self.stdout.write(f'{"slots":>6} {"orders/s":>10} {"short":>6} {"left":>8}')
+            for slots in options['slots']:
+                self._run(product.id, slots, options['workers'], options['orders'], options['hold_ms'] / 1000)
+        finally:
+            stock.set_slots(product.id, 0)
+            product.delete()
+
+    def _run(self, product_id, slots, workers, orders, hold):
+        total = workers * orders
+        stock.set_slots(product_id, slots, total)
+        short = []
+
+        def buy():
+            try:
+                for _ in range(orders):
+                    with transaction.atomic():
+                        if slots:
+                            missed = stock.take_from_slots(product_id, 1)
+                        else:
+                            Product.objects.select_for_update().filter(id=product_id).values_list('id').get()
+                            missed = not stock.take_stock({product_id: 1})
+                        time.sleep(hold)
+                    if missed:
+                        short.append(1)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buy) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        left = stock.slot_total(product_id, cached=False) if slots else Product.objects.get(id=product_id).stoc
+        # Every unit is either sold or still there: the counters stay exact.
+        self.stdout.write(f'{slots:>6} {total / elapsed:>10.1f} {len(short):>6} {left:>8}')
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django import db
+from django.core.management.base import BaseCommand
+from products import images
+
+
+def _process(model, pk, field):
+    try:
+        return images.process(model, pk, field)
+    finally:
+        db.connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Build missing or outdated image renditions (run it with --pending from cron every minute)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append',
+                            help='Only this model label, e.g. products.ProductImage (repeatable)')
+        parser.add_argument('--pending', action='store_true',
+                            help='Only images saved since the last run, without scanning the rest')
+        parser.add_argument('--force', action='store_true', help='Rebuild every image')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Retry images that could not be read or decoded before')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        jobs = []
+        for model, fields in images.registered_models().items():
+            if options['model'] and model._meta.label not in options['model']:
+                continue
+            for field in fields:
+                rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                if options['pending']:
+                    rows = rows.filter(**{images.manifest_field(field): images.PENDING})
+                rows = rows.values_list('pk', field, images.manifest_field(field)).iterator(chunk_size=2000)
+                for pk, source, manifest in rows:
+                    manifest = manifest or {}
+                    if (options['force'] or manifest.get('source') != source
+                            or (options['retry_failed'] and manifest.get('failed'))):
+                        jobs.append((model, pk, field))
+
+        built = failed = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for manifest in pool.map(lambda job: _process(*job), jobs):
+                if manifest and manifest.get('failed'):
+                    failed += 1
+                elif manifest:
+                    built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'{built} images built, {failed} failed, {len(jobs) - built - failed} skipped '
+            f'in {time.monotonic() - started:.2f}s'
+        ))
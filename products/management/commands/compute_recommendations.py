@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from products import recommendations
+from products.models import ProductRecommendation
+
+
+class Command(BaseCommand):
+    help = 'Rebuild "frequently bought together" recommendations from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K)
+        parser.add_argument('--min-support', type=int, default=recommendations.MIN_SUPPORT,
+                            help='Minimum number of shared baskets for a pair to count')
+        parser.add_argument('--metric', choices=['cosine', 'lift'], default='cosine')
+        parser.add_argument('--batch-size', type=int, default=recommendations.ORDER_BATCH,
+                            help='Order ids per batch')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        sources, targets, scores = recommendations.compute_neighbours(
+            top_k=options['top_k'],
+            min_support=options['min_support'],
+            metric=options['metric'],
+            batch_size=max(options['batch_size'], 1),
+        )
+        computed = time.monotonic() - started
+        written = recommendations.store_neighbours(ProductRecommendation.BOUGHT_TOGETHER, sources, targets, scores)
+        self.stdout.write(self.style.SUCCESS(
+            f'{written} recommendations for {len(set(sources.tolist()))} products; '
+            f'scored in {computed:.2f}s, total {time.monotonic() - started:.2f}s'
+        ))
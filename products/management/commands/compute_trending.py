@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from products import trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trending product lists (run it from cron every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-days', type=int, default=trending.WINDOW_DAYS)
+        parser.add_argument('--half-life-hours', type=float, default=trending.HALF_LIFE_HOURS)
+        parser.add_argument('--top', type=int, default=trending.TOP_N)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        views = trending.flush_views()
+        now = timezone.now()
+        rankings = trending.compute_rankings(
+            now,
+            window_days=options['window_days'],
+            half_life_hours=options['half_life_hours'],
+            top_n=options['top'],
+        )
+        computed = time.monotonic() - started
+        written = trending.store_rankings(rankings, now)
+        self.stdout.write(self.style.SUCCESS(
+            f'{views} page views flushed, {len(rankings)} trending lists, {written} changed; '
+            f'scored in {computed:.2f}s, total {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from products import cart
+
+
+class Command(BaseCommand):
+    help = 'Delete carts nobody has touched for a while, in small throttled batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=cart.STALE_CART_DAYS,
+                            help='Carts untouched for this many days are deleted')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.5, help='Seconds to wait between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the lines that would go')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            self.stdout.write(f'{cart.stale_lines(cutoff).count()} cart lines untouched since {cutoff:%Y-%m-%d %H:%M}')
+            return
+        total = batches = 0
+        for deleted in cart.purge_stale(cutoff, options['batch_size'], options['sleep']):
+            total += deleted
+            batches += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} cart lines deleted in {batches} batches, {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Avg, Q
+from products.models import Product, ProductStarRatingAndReview
+
+
+RATING_FIELDS = ['rating_avg', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+
+def rebuild_product_ratings(product_model, review_model, batch_size=1000):
+    """
+    Recompute Product.rating_* from the review table: one grouped aggregate
+    query, then chunked bulk_update. Returns the number of rated products.
+    """
+    aggregates = (
+        review_model.objects.values('product_id')
+        .annotate(
+            avg=Avg('stars'),
+            count=Count('id'),
+            **{f'stars_{n}': Count('id', filter=Q(stars=n)) for n in range(1, 6)},
+        )
+        .order_by('product_id')
+    )
+    with transaction.atomic():
+        product_model.objects.filter(rating_count__gt=0).update(
+            rating_avg=0, rating_count=0, rating_1=0, rating_2=0, rating_3=0, rating_4=0, rating_5=0,
+        )
+        batch = []
+        rated = 0
+        for row in aggregates.iterator(chunk_size=batch_size):
+            product = product_model(
+                id=row['product_id'],
+                rating_avg=round(row['avg'], 2),
+                rating_count=row['count'],
+                **{f'rating_{n}': row[f'stars_{n}'] for n in range(1, 6)},
+            )
+            batch.append(product)
+            if len(batch) >= batch_size:
+                product_model.objects.bulk_update(batch, RATING_FIELDS)
+                rated += len(batch)
+                batch = []
+        product_model.objects.bulk_update(batch, RATING_FIELDS)
+        rated += len(batch)
+    return rated
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored rating average, count and star histogram of every product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rated = rebuild_product_ratings(Product, ProductStarRatingAndReview, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings for {rated} reviewed products'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from products import search
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index'
+
+    def handle(self, *args, **kwargs):
+        backend = search.get_backend()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                backend.install(cursor)
+                backend.clear(cursor)
+            search.index_products(Product.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {Product.objects.count()} products ({connection.vendor} backend: {type(backend).__name__})'
+        ))
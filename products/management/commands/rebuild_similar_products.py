@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from products import similarity
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the content vectors and "similar products" lists, or with --pending only '
+            'refresh the products saved since the last run (run that every few minutes)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', type=int, action='append',
+                            help='Only rebuild this category id (repeatable)')
+        parser.add_argument('--top-k', type=int, default=similarity.TOP_K)
+        parser.add_argument('--pending', action='store_true')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['pending']:
+            refreshed = similarity.refresh_pending(options['top_k'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{refreshed} saved products refreshed in {time.monotonic() - started:.2f}s'))
+            return
+        products = Product.objects.order_by('id')
+        if options['category']:
+            products = products.filter(categories_id__in=options['category'])
+        similarity.index_products(products.values_list('id', flat=True))
+        indexed = time.monotonic() - started
+
+        categories = options['category'] or sorted(set(products.values_list('categories_id', flat=True)))
+        total = 0
+        for category_id in categories:
+            total += similarity.rebuild_category(category_id, options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} products in {len(categories)} categories; '
+            f'vectors in {indexed:.2f}s, total {time.monotonic() - started:.2f}s'
+        ))
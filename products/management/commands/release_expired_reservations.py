@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from products import stock
+
+
+class Command(BaseCommand):
+    help = 'Release checkout stock reservations that have expired (run it from cron every minute)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.2, help='Seconds to wait between batches')
+        parser.add_argument('--recount', action='store_true',
+                            help='Afterwards recompute every product\'s reserved count from the live holds')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        released = sum(stock.release_expired(batch_size=options['batch_size'], pause=options['sleep']))
+        message = f'{released} expired reservations released'
+        if options['recount']:
+            message += f', {stock.recount()} reserved counts corrected'
+        self.stdout.write(self.style.SUCCESS(f'{message}, {time.monotonic() - started:.2f}s'))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from products import stock
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = ('Shard a flash-sale product\'s stock over several rows, or with --rebalance even out '
+            'every sharded product and sync its stock column (run it from cron every minute)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', type=int, nargs='*')
+        parser.add_argument('--slots', type=int, help='Number of stock slots; 0 turns sharding off')
+        parser.add_argument('--stock', type=int, help='Set a new stock level while at it')
+        parser.add_argument('--rebalance', action='store_true')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['rebalance']:
+            product_ids = options['product_ids'] or Product.objects.filter(stock_slots__gt=0).values_list('id', flat=True)
+            count = sum(stock.rebalance(product_id) is not None for product_id in product_ids)
+            self.stdout.write(self.style.SUCCESS(f'{count} sharded products rebalanced, {time.monotonic() - started:.2f}s'))
+            return
+
+        slots = options['slots']
+        if slots is None or not options['product_ids']:
+            raise CommandError('Give product ids and --slots (or --rebalance).')
+        if not 0 <= slots <= 64:
+            raise CommandError('--slots must be between 0 and 64.')
+        if options['stock'] is not None and options['stock'] < 0:
+            raise CommandError('--stock can\'t be negative.')
+        for product_id in options['product_ids']:
+            try:
+                total = stock.set_slots(product_id, slots, options['stock'])
+            except Product.DoesNotExist:
+                raise CommandError(f'No product {product_id}.')
+            self.stdout.write(f'Product {product_id}: {total} in stock over {slots or "no"} slots')
@@ -0,0 +1,88 @@
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# The search index as this migration creates it. Later changes belong in
+# products/search.py and a new migration, not here.
+FTS_TABLE = "products_product_fts"
+TSVECTOR_TABLE = "products_product_search"
+COLUMNS = ("title", "tag", "modle", "taxonomy", "description")
+TSVECTOR_WEIGHTS = {"title": "A", "tag": "A", "modle": "B", "taxonomy": "C", "description": "D"}
+
+
+def documents(Product):
+    rows = Product.objects.values_list(
+        "id", "title", "tag", "modle", "description",
+        "categories__name", "categories__industry_id", "categories__industry__name",
+    )
+    for (product_id, title, tag, modle, description,
+         category_name, industry_id, industry_name) in rows.iterator(chunk_size=2000):
+        yield (product_id, industry_id, {
+            "title": title or "",
+            "tag": (tag or "").replace(",", " "),
+            "modle": modle or "",
+            "taxonomy": f"{category_name or ''} {industry_name or ''}".strip(),
+            "description": " ".join(strip_tags(description or "").split()),
+        })
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in ("sqlite", "postgresql"):
+        # Searched with icontains; there is no index to build.
+        return
+    rows = list(documents(apps.get_model("products", "Product")))
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"{', '.join(COLUMNS)}, industry_id UNINDEXED, "
+                f"tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(COLUMNS)}, industry_id) "
+                f"VALUES ({', '.join(['%s'] * (len(COLUMNS) + 2))})",
+                [(product_id, *(document[name] for name in COLUMNS), industry_id)
+                 for product_id, industry_id, document in rows],
+            )
+        else:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {TSVECTOR_TABLE} ("
+                f"product_id bigint PRIMARY KEY REFERENCES products_product (id) "
+                f"ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                f"industry_id bigint NULL, "
+                f"document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TSVECTOR_TABLE}_document_gin "
+                f"ON {TSVECTOR_TABLE} USING gin (document)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TSVECTOR_TABLE}_industry "
+                f"ON {TSVECTOR_TABLE} (industry_id)"
+            )
+            vector = " || ".join(
+                f"setweight(to_tsvector('simple', %s), '{TSVECTOR_WEIGHTS[name]}')" for name in COLUMNS
+            )
+            cursor.executemany(
+                f"INSERT INTO {TSVECTOR_TABLE} (product_id, industry_id, document) VALUES (%s, %s, {vector})",
+                [(product_id, industry_id, *(document[name] for name in COLUMNS))
+                 for product_id, industry_id, document in rows],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    table = {"sqlite": FTS_TABLE, "postgresql": TSVECTOR_TABLE}.get(schema_editor.connection.vendor)
+    if table:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_alter_completedoderitems_product'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.0.7 on 2026-10-18 08:46
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Q
+
+
+def populate_ratings(apps, schema_editor):
+    # Written out here rather than calling rebuild_product_ratings, so later
+    # changes to the command or the Product model can't change this step.
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('products', 'ProductStarRatingAndReview')
+    fields = ['rating_avg', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+    aggregates = (
+        Review.objects.values('product_id')
+        .annotate(
+            avg=Avg('stars'),
+            count=Count('id'),
+            **{f'stars_{n}': Count('id', filter=Q(stars=n)) for n in range(1, 6)},
+        )
+        .order_by('product_id')
+    )
+    batch = []
+    for row in aggregates.iterator(chunk_size=1000):
+        batch.append(Product(
+            id=row['product_id'],
+            rating_avg=round(row['avg'], 2),
+            rating_count=row['count'],
+            **{f'rating_{n}': row[f'stars_{n}'] for n in range(1, 6)},
+        ))
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, fields)
+            batch = []
+    Product.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Vendors', '0001_initial'),
+        ('products', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_avg', '-rating_count'], name='product_rating_idx'),
+        ),
+        migrations.RunPython(populate_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.7 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Vendors', '0001_initial'),
+        ('products', '0005_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', '-id'], name='product_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['categories', '-created_at', '-id'], name='product_category_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['categories', '-rating_avg', '-rating_count', '-id'], name='product_category_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['vendor_stores', '-created_at', '-id'], name='product_vendor_newest_idx'),
+        ),
+    ]
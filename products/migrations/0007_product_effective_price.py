@@ -0,0 +1,29 @@
+# Generated by Django 5.0.7 on 2026-10-18 08:58
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Vendors', '0001_initial'),
+        ('products', '0006_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(models.F('regular_price'), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', models.F('discounted_parcent'))), models.FloatField()), '/', models.Value(100.0)), models.DecimalField(decimal_places=2, max_digits=12)), output_field=models.DecimalField(decimal_places=2, max_digits=12)),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['categories', 'effective_price', 'id'], name='product_category_price_idx'),
+        ),
+    ]
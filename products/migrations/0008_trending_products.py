@@ -0,0 +1,46 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Global'), ('industry', 'Industry'), ('category', 'Category')], max_length=10)),
+                ('scope_id', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductDailyView',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='product_daily_view_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productdailyview',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='product_daily_view_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='trendingproduct',
+            constraint=models.UniqueConstraint(fields=('scope', 'scope_id', 'rank'), name='trending_product_rank_unique'),
+        ),
+    ]
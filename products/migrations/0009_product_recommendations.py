@@ -0,0 +1,29 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_trending_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bought_together', 'Frequently bought together'), ('similar', 'Similar products')], max_length=20)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_in', to='products.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='productrecommendation',
+            constraint=models.UniqueConstraint(fields=('product', 'kind', 'rank'), name='product_recommendation_rank_unique'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductContentVector',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='products.product')),
+                ('category_id', models.PositiveIntegerField(db_index=True)),
+                ('terms', models.BinaryField()),
+                ('counts', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_content_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productstarratingandreview',
+            name='review_images_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
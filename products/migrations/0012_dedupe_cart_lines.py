@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # Fold repeated (user, product) lines into the oldest one before the
+    # unique constraint goes on.
+    Cart = apps.get_model("products", "Cart")
+    duplicates = (
+        Cart.objects.values("user_id", "product_id")
+        .annotate(lines=Count("id")).filter(lines__gt=1)
+    )
+    for duplicate in duplicates:
+        lines = list(Cart.objects.filter(user_id=duplicate["user_id"], product_id=duplicate["product_id"]).order_by("id"))
+        keep = lines[0]
+        keep.quantity = min(sum(line.quantity for line in lines), 50)
+        keep.save(update_fields=["quantity"])
+        Cart.objects.filter(id__in=[line.id for line in lines[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0011_image_renditions"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_dedupe_cart_lines'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='cart_user_product_unique'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def fill_headers(apps, schema_editor):
+    # The address and coupon were copied onto every line; the oldest line's
+    # copy is the one the cart used.
+    Cart = apps.get_model("products", "Cart")
+    CartHeader = apps.get_model("products", "CartHeader")
+    headers = []
+    seen = set()
+    for user_id, address_id, coupon_applied, coupon_id in (
+            Cart.objects.order_by("user_id", "id")
+            .values_list("user_id", "shipping_address_id", "cupon_applaied", "cupon_code_id")):
+        if user_id in seen:
+            continue
+        seen.add(user_id)
+        headers.append(CartHeader(user_id=user_id, shipping_address_id=address_id,
+                                  cupon_code_id=coupon_id if coupon_applied else None))
+    CartHeader.objects.bulk_create(headers, batch_size=1000)
+    Cart.objects.update(header_id=Subquery(
+        CartHeader.objects.filter(user_id=OuterRef("user_id")).values("id")[:1]
+    ))
+
+
+def copy_back(apps, schema_editor):
+    Cart = apps.get_model("products", "Cart")
+    for header in apps.get_model("products", "CartHeader").objects.all():
+        Cart.objects.filter(header=header).update(
+            shipping_address_id=header.shipping_address_id,
+            cupon_code_id=header.cupon_code_id,
+            cupon_applaied=header.cupon_code_id is not None,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0014_cartheader"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_headers, copy_back),
+    ]
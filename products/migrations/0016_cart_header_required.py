@@ -0,0 +1,29 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_fill_cart_headers'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='cart',
+            name='cupon_applaied',
+        ),
+        migrations.RemoveField(
+            model_name='cart',
+            name='cupon_code',
+        ),
+        migrations.RemoveField(
+            model_name='cart',
+            name='shipping_address',
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='header',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='products.cartheader'),
+        ),
+    ]
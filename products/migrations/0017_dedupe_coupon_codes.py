@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def rename_duplicate_codes(apps, schema_editor):
+    # The oldest coupon keeps a repeated code; the others get a suffix
+    # until someone picks a new code for them.
+    Coupon = apps.get_model("products", "CuponCodeGenaration")
+    duplicates = Coupon.objects.values("cupon_code").annotate(copies=Count("id")).filter(copies__gt=1)
+    for duplicate in duplicates:
+        coupons = Coupon.objects.filter(cupon_code=duplicate["cupon_code"]).order_by("id")
+        for coupon in coupons[1:]:
+            coupon.cupon_code = f"{coupon.cupon_code[:40]}-DUP{coupon.id}"
+            coupon.save(update_fields=["cupon_code"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0016_cart_header_required"),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_dedupe_coupon_codes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cuponcodegenaration',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='cuponcodegenaration',
+            name='max_per_user',
+            field=models.PositiveIntegerField(blank=True, help_text='Empty for no limit', null=True),
+        ),
+        migrations.AddField(
+            model_name='cuponcodegenaration',
+            name='max_redemptions',
+            field=models.PositiveIntegerField(blank=True, help_text='Empty for no limit', null=True),
+        ),
+        migrations.AddField(
+            model_name='cuponcodegenaration',
+            name='times_redeemed',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cuponcodegenaration',
+            name='valid_from',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cuponcodegenaration',
+            name='valid_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='cuponcodegenaration',
+            name='cupon_code',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+        migrations.CreateModel(
+            name='CouponRedemption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('discount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='redemptions', to='products.cuponcodegenaration')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.placedoder')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['coupon', 'user'], name='coupon_redemption_user_idx')],
+            },
+        ),
+    ]
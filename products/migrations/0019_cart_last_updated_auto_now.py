@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_coupon_limits'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import Q
+
+
+def fill_order_numbers(apps, schema_editor):
+    # Order numbers become unique; give the odd order without one the
+    # number it always displayed.
+    PlacedOder = apps.get_model("products", "PlacedOder")
+    for order in PlacedOder.objects.filter(Q(order_number="") | Q(order_number__isnull=True)):
+        order.order_number = f"OID{str(order.id).zfill(6)}"
+        order.save(update_fields=["order_number"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0019_cart_last_updated_auto_now"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_order_numbers, migrations.RunPython.noop),
+    ]
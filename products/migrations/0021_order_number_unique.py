@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0020_fill_order_numbers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='completedoder',
+            name='oder_number',
+            field=models.CharField(max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='placedoder',
+            name='order_number',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0022_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_slots',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ProductStockSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('stoc', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_slot_rows', to='products.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='productstockslot',
+            constraint=models.UniqueConstraint(fields=('product', 'slot'), name='product_stock_slot_unique'),
+        ),
+    ]
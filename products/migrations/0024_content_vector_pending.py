@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0023_product_stock_slots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcontentvector',
+            name='pending',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -1,11 +1,14 @@
-from django.db import models
-from django.db.models import Avg
-from django.utils.text import slugify
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Case, When, Value, OuterRef, Subquery
+from django.db.models.functions import Cast, Greatest, Round
 from ckeditor.fields import RichTextField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import PermissionDenied
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 from decimal import Decimal, ROUND_HALF_UP
 import time
+from .slugs import unique_slug
 # Create your models here.
 
 
@@ -16,7 +19,7 @@ class Industry(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = unique_slug(self, self.name)
         super(Industry, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -31,7 +34,7 @@ class Categories(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = unique_slug(self, self.name)
         super(Categories, self).save(*args, **kwargs)
 
     def __str__(self):
@@ -46,13 +49,76 @@ class SubCategories(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            self.slug = unique_slug(self, self.name)
         super(SubCategories, self).save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
+PLACEHOLDER_IMAGE = 'https://placehold.co/200x200'
+
+# Columns a product card (listing grids, carts, order lines) actually renders.
+CARD_FIELDS = (
+    "id", "title", "slug", "regular_price", "discounted_parcent", "stoc", "out_of_stoc", "stock_slots",
+    "effective_price", "rating_avg", "rating_count", "categories", "created_at",
+    "vendor_stores", "vendor_stores__name",
+)
+
+
+def primary_image_subquery(product_ref="pk", field="image"):
+    """
+    URL (or with field="image_renditions", the renditions) of the product's
+    first image, as a correlated subquery so listings don't issue one
+    productimage_set.first() query per product.
+    """
+    return Subquery(
+        ProductImage.objects.filter(product=OuterRef(product_ref)).order_by("id").values(field)[:1]
+    )
+
+
+def effective_price_expression(prefix=""):
+    """
+    SQL version of Product.discounted_price. Prices are whole units and the
+    discount a whole percent, so the result is exact to the cent.
+    """
+    cents = F(f"{prefix}regular_price") * (Value(100) - F(f"{prefix}discounted_parcent"))
+    return Cast(
+        Cast(cents, models.FloatField()) / Value(100.0),
+        models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    def cards(self):
+        """
+        Only the fields a product card renders, plus `primary_image` and its
+        renditions, in a single query. The rich-text descriptions are never
+        loaded.
+        """
+        return (
+            self.select_related("vendor_stores")
+            .only(*CARD_FIELDS)
+            .annotate(primary_image=primary_image_subquery(),
+                      primary_image_renditions=primary_image_subquery(field="image_renditions"))
+        )
+
+
+class ProductLineQuerySet(models.QuerySet):
+    """
+    Shared by Cart and the order item models, which all render a product
+    thumbnail, title and price per line.
+    """
+
+    def with_product_cards(self):
+        return (
+            self.select_related("product")
+            .defer("product__description", "product__details_description")
+            .annotate(product_image=primary_image_subquery("product_id"),
+                      product_image_renditions=primary_image_subquery("product_id", "image_renditions"))
+        )
+
+
 class Product(models.Model):
     from Vendors.models import VendorStore
 
@@ -60,7 +126,12 @@ class Product(models.Model):
     slug = models.SlugField(unique=True, blank=True, max_length=250)
     regular_price = models.PositiveIntegerField()
     stoc = models.PositiveIntegerField(default=10, verbose_name="Available in Stock")
+    # Units held by live checkout reservations, see products/stock.py.
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     out_of_stoc = models.BooleanField(default=False)
+    # Flash-sale mode: when > 0 the stock lives in that many ProductStockSlot
+    # rows and stoc is only a periodically synced total, see products/stock.py.
+    stock_slots = models.PositiveSmallIntegerField(default=0, editable=False)
     discounted_parcent = models.PositiveIntegerField()
     description = RichTextField(max_length=2000)
     modle = models.CharField(max_length=50)
@@ -71,19 +142,100 @@ class Product(models.Model):
         help_text="Details product description display in the bottom of the product Page. It's help buyer to make deceion on your product")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Review aggregates, maintained by ProductStarRatingAndReview and
+    # rebuilt by `python manage.py rebuild_product_ratings`.
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    # What the customer pays, computed and stored by the database so listings
+    # can sort and range-filter on it. Also kept current by queryset.update()
+    # and bulk_update(), which never call save().
+    effective_price = models.GeneratedField(
+        expression=effective_price_expression(),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-rating_avg", "-rating_count"], name="product_rating_idx"),
+            # Keyset pagination sort keys (see products/pagination.py).
+            models.Index(fields=["-created_at", "-id"], name="product_newest_idx"),
+            models.Index(fields=["categories", "-created_at", "-id"], name="product_category_newest_idx"),
+            models.Index(fields=["categories", "-rating_avg", "-rating_count", "-id"], name="product_category_rating_idx"),
+            models.Index(fields=["vendor_stores", "-created_at", "-id"], name="product_vendor_newest_idx"),
+            models.Index(fields=["effective_price", "id"], name="product_price_idx"),
+            models.Index(fields=["categories", "effective_price", "id"], name="product_category_price_idx"),
+        ]
+
     @property
     def discounted_price(self):
+        # The stored column, unless this instance was never loaded from the
+        # database (or was just updated, see save()).
+        if self.__dict__.get("effective_price") is not None:
+            return self.effective_price
         regular_price = Decimal(self.regular_price)
         discount = (regular_price * Decimal(self.discounted_parcent) / Decimal("100")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
         price = regular_price - discount
         return price.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
     
+    @property
+    def available_stock(self):
+        return max(self.stoc - self.reserved, 0)
+
+    @property
+    def current_stock(self):
+        # What the storefront shows; sharded products read a cached slot sum.
+        if self.stock_slots:
+            from .stock import slot_total
+            return slot_total(self.pk)
+        return self.stoc
+
     @property
     def avarage_review(self):
-        all_reviews = ProductStarRatingAndReview.objects.filter(product=self.id).aggregate(avarage=Avg('stars'))
-        print(all_reviews)
-        return all_reviews
-    
+        return {'avarage': self.rating_avg if self.rating_count else None}
+
+    @property
+    def rating_histogram(self):
+        """
+        [(stars, count, percent), ...] from 5 stars down to 1.
+        """
+        histogram = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f"rating_{stars}")
+            percent = round(count * 100 / self.rating_count) if self.rating_count else 0
+            histogram.append((stars, count, percent))
+        return histogram
+
+    @staticmethod
+    def rating_changes(stars, delta):
+        """
+        update() kwargs that add (delta=1) or remove (delta=-1) one review of
+        `stars` to the stored aggregates in a single UPDATE statement.
+        """
+        stars = int(stars)
+        star_sum = sum(F(f"rating_{n}") * n for n in range(1, 6)) + stars * delta
+        new_count = F("rating_count") + delta
+        if delta > 0:
+            rating_avg = Round(Cast(star_sum, models.FloatField()) / new_count, 2)
+        else:
+            rating_avg = Case(
+                When(rating_count__lte=-delta, then=Value(0.0)),
+                default=Round(Cast(star_sum, models.FloatField()) / new_count, 2),
+            )
+        return {
+            "rating_count": Greatest(new_count, 0),
+            f"rating_{stars}": Greatest(F(f"rating_{stars}") + delta, 0),
+            "rating_avg": rating_avg,
+        }
+
 
     @property
     def total_review_of_product(self):
@@ -92,14 +244,13 @@ class Product(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.title)
-            unique_slug = base_slug
-            counter = 1
-            while Product.objects.filter(slug=unique_slug).exists():
-                unique_slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = unique_slug
+            self.slug = unique_slug(self, self.title)
+        adding = self._state.adding
         super(Product, self).save(*args, **kwargs)
+        if not adding:
+            # Inserts read the generated price back, updates don't; drop the
+            # stale value so it is reloaded on next access.
+            self.__dict__.pop("effective_price", None)
 
     def __str__(self):
         return self.title
@@ -107,6 +258,8 @@ class Product(models.Model):
 
 class ProductImage(models.Model):
     image = models.CharField(max_length=300)
+    # Size and resized copies, filled in by products/images.py
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     upload_at = models.DateTimeField(auto_now_add=True)
 
@@ -133,6 +286,7 @@ class ProductStarRatingAndReview(models.Model):
     )
     review_message = models.CharField(max_length=1000)
     review_images = models.ImageField(upload_to=f"product-review-images/", blank=True)
+    review_images_renditions = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, blank=True)
 
     def __str__(self):
@@ -145,20 +299,52 @@ class ProductStarRatingAndReview(models.Model):
     def save(self, *args, **kwargs):
         if self.user.user_role != '1': # if not Customer 
             raise PermissionDenied('Only Customer can Add Review')
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous_stars = None
+            if not self._state.adding:
+                previous_stars = ProductStarRatingAndReview.objects.filter(pk=self.pk).values_list('stars', flat=True).first()
+            super().save(*args, **kwargs)
+
+            # Keep Product.rating_* in step with this review.
+            if previous_stars != int(self.stars):
+                products = Product.objects.filter(pk=self.product_id)
+                if previous_stars is not None:
+                    products.update(**Product.rating_changes(previous_stars, -1))
+                products.update(**Product.rating_changes(self.stars, 1))
     
 
 
 class CuponCodeGenaration(models.Model):
     name = models.CharField(max_length=50)
-    cupon_code = models.CharField(max_length=50)
+    cupon_code = models.CharField(max_length=50, unique=True)
     discoun_parcent = models.PositiveIntegerField()
     up_to = models.PositiveIntegerField(help_text="Limit of Discount Amaount")
+    is_active = models.BooleanField(default=True)
+    valid_from = models.DateTimeField(null=True, blank=True)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    max_redemptions = models.PositiveIntegerField(null=True, blank=True, help_text="Empty for no limit")
+    max_per_user = models.PositiveIntegerField(null=True, blank=True, help_text="Empty for no limit")
+    # Only ever changed with F() updates, see products/coupons.py.
+    times_redeemed = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.name
 
+
+class CouponRedemption(models.Model):
+    coupon = models.ForeignKey(CuponCodeGenaration, on_delete=models.CASCADE, related_name="redemptions")
+    user = models.ForeignKey("accounts.CustomUser", on_delete=models.CASCADE)
+    order = models.ForeignKey("PlacedOder", on_delete=models.SET_NULL, null=True, blank=True)
+    discount = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["coupon", "user"], name="coupon_redemption_user_idx")]
+
+    def __str__(self):
+        return f"{self.coupon.cupon_code} by {self.user}"
+
 class CustomerAddress(models.Model):
     user = models.ForeignKey("accounts.CustomUser", on_delete=models.CASCADE)
     state = models.CharField(max_length=60)
@@ -174,24 +360,39 @@ class CustomerAddress(models.Model):
         return f"{self.street_address}, {self.zip_code}, {self.city}, {self.state}"
 
 
+class CartHeader(models.Model):
+    """
+    What applies to the user's cart as a whole: the shipping address and
+    the coupon. One row per user; the Cart lines point at it.
+    """
+    user = models.OneToOneField("accounts.CustomUser", on_delete=models.CASCADE, related_name="cart_header")
+    shipping_address = models.ForeignKey(CustomerAddress, on_delete=models.SET_NULL, null=True, blank=True)
+    cupon_code = models.ForeignKey(CuponCodeGenaration, on_delete=models.SET_NULL, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cart of {self.user}"
+
+
 class Cart(models.Model):
     user = models.ForeignKey(
         "accounts.CustomUser",
         on_delete=models.CASCADE,
         related_name="customer_with_product_in_cart",
     )
+    header = models.ForeignKey(CartHeader, on_delete=models.CASCADE, related_name="lines")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
-    shipping_address = models.ForeignKey(CustomerAddress, on_delete=models.CASCADE, null=True, blank=True)
-    cupon_applaied = models.BooleanField(default=False)
-    cupon_code = models.ForeignKey(
-        CuponCodeGenaration,
-        on_delete=models.CASCADE,
-        null=True,
-        blank=True,
-        default=None,
-    )
-    last_updated = models.DateTimeField(auto_now_add=True)
+    # Bumped by every change to the line, see products/cart.py.
+    last_updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ProductLineQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One line per product; guest carts are merged in with an upsert on it.
+            models.UniqueConstraint(fields=["user", "product"], name="cart_user_product_unique"),
+        ]
 
     @property
     def total_product_price(self):
@@ -201,20 +402,9 @@ class Cart(models.Model):
 
     @classmethod
     def subtotal_product_price(cls, user):
-        carts = Cart.objects.filter(user=user).select_related("cupon_code", "product")
-        subtotal_price = Decimal("0.00")
-        if carts:
-            subtotal_price = sum(Decimal(cart.total_product_price) for cart in carts)
-            cart_item = carts[0]
-            if cart_item.cupon_applaied and cart_item.cupon_code:
-                discount_amount = (
-                    subtotal_price * Decimal(cart_item.cupon_code.discoun_parcent) / Decimal("100")
-                )
-                discount_cap = Decimal(cart_item.cupon_code.up_to)
-                discount_amount = min(discount_amount, discount_cap)
-                subtotal_price -= discount_amount
-
-        return subtotal_price.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        # The totals live in products/cart.py now; views use cart.snapshot().
+        from .cart import snapshot
+        return snapshot(user, fresh=True).subtotal
 
     def __str__(self):
         return self.product.title
@@ -222,6 +412,16 @@ class Cart(models.Model):
 
 
 
+# No 0/O or 1/I, so numbers read out over the phone come back right.
+ORDER_NUMBER_CHARS = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+
+
+def new_order_number():
+    # Picked before the INSERT, so placing an order is a single write:
+    # "OID" + date + 6 random characters.
+    return f"OID{timezone.now():%y%m%d}{get_random_string(6, ORDER_NUMBER_CHARS)}"
+
+
 class PlacedOder(models.Model):
     STATUS = [
         ("Oder Recived", "Oder Recived"),
@@ -238,61 +438,25 @@ class PlacedOder(models.Model):
     status = models.CharField(max_length=50, choices=STATUS, default="Oder Recived")
     paid = models.BooleanField(default=False)
     placed_date = models.DateTimeField(auto_now_add=True)
-    order_number = models.CharField(max_length=12, blank=True, null=True)
+    order_number = models.CharField(max_length=20, unique=True, blank=True, null=True)
 
     @property
     def oder_id(self):
-        return f"OID{str(self.id).zfill(6)}"
+        # Orders placed before numbers were random were numbered by id.
+        return self.order_number or f"OID{str(self.id).zfill(6)}"
 
     def save(self, *args, **kwargs):
-        if not self.pk:
-            super(PlacedOder, self).save(*args, **kwargs)
-            self.order_number = self.oder_id
-            super(PlacedOder, self).save(update_fields=["order_number"])
-        else:
-            if not self.order_number:
-                self.order_number = self.oder_id
-            super(PlacedOder, self).save(*args, **kwargs)
-
-    @classmethod
-    def placed_oders_by_user(cls, user):
-        oders = PlacedOder.objects.filter(user=user)
-        placed_oder_items_dict = {}
-
-        for oder in oders:
-            placed_oder_list = []
-
-            placed_oder_details = {}
-            placed_oder_details["sub_total_price"] = oder.sub_total_price
-            placed_oder_details["status"] = oder.status
-            placed_oder_details["placed_date"] = oder.placed_date
-            placed_oder_details["paid"] = oder.paid
-            placed_oder_list.append(placed_oder_details)
-
-            oder_items = PlacedeOderItem.objects.filter(placed_oder=oder)
-
-            for item in oder_items:
-                oder_items_list = []
-                # print(item.product.title)
-                # Checking if product image exists before accessing it
-                product_image = item.product.productimage_set.first()
-                if product_image:
-                    image = product_image.image
-                    oder_items_list.append(image)
-                else:
-                    # Append None or any default image if no image is found
-                    oder_items_list.append('https://placehold.co/200x200')
-                title = item.product.title
-                quantity = item.quantity
-                total_price = item.total_price
-                oder_items_list.append(title)
-                oder_items_list.append(quantity)
-                oder_items_list.append(total_price)
-                placed_oder_list.append(oder_items_list)
-
-            placed_oder_items_dict[oder.oder_id] = placed_oder_list
-        return placed_oder_items_dict
-        # return 'fg'
+        if self.order_number:
+            return super(PlacedOder, self).save(*args, **kwargs)
+        for attempt in range(3):
+            self.order_number = new_order_number()
+            try:
+                with transaction.atomic():
+                    return super(PlacedOder, self).save(*args, **kwargs)
+            except IntegrityError:
+                # Most likely another order drew the same number.
+                if attempt == 2:
+                    raise
 
     def __str__(self):
         return self.order_number
@@ -306,6 +470,8 @@ class PlacedeOderItem(models.Model):
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)], default=1)
     total_price = models.FloatField(blank=True, null=True)
 
+    objects = ProductLineQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         self.total_price = float(self.quantity * self.product.discounted_price)
         super(PlacedeOderItem, self).save(*args, **kwargs)
@@ -321,7 +487,7 @@ class CompletedOder(models.Model):
     status = models.CharField(max_length=20)
     paid = models.BooleanField(default=False)
     complete_date = models.DateTimeField(auto_now_add=True)
-    oder_number = models.CharField(max_length=12)
+    oder_number = models.CharField(max_length=20)
 
     def __str__(self):
         return self.oder_number
@@ -335,5 +501,133 @@ class CompletedOderItems(models.Model):
     quantity = models.PositiveIntegerField()
     total_price = models.FloatField()
 
+    objects = ProductLineQuerySet.as_manager()
+
     def __str__(self):
         return self.product.title[:20] + str(self.product.id)
+
+
+class StockReservation(models.Model):
+    """
+    Units of a product held for a customer at checkout until expires_at
+    (see products/stock.py).
+    """
+    user = models.ForeignKey("accounts.CustomUser", on_delete=models.CASCADE, related_name="stock_reservations")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "product"], name="stock_reservation_user_product_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for {self.user_id} until {self.expires_at}"
+
+
+class ProductStockSlot(models.Model):
+    """
+    One share of a sharded product's stock. Orders take from a random slot
+    so concurrent buyers of a hot product don't queue on a single row.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_slot_rows")
+    slot = models.PositiveSmallIntegerField()
+    stoc = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "slot"], name="product_stock_slot_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} slot {self.slot}: {self.stoc}"
+
+
+class ProductDailyView(models.Model):
+    """
+    Product page views bucketed per day, one of the trending signals
+    (see products/trending.py).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_views")
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "day"], name="product_daily_view_unique"),
+        ]
+        indexes = [models.Index(fields=["day"], name="product_daily_view_day_idx")]
+
+    def __str__(self):
+        return f"{self.product_id} {self.day}: {self.views}"
+
+
+class TrendingProduct(models.Model):
+    """
+    Precomputed top-N trending products per scope, written by
+    `python manage.py compute_trending`.
+    """
+    GLOBAL = "global"
+    INDUSTRY = "industry"
+    CATEGORY = "category"
+    SCOPES = [(GLOBAL, "Global"), (INDUSTRY, "Industry"), (CATEGORY, "Category")]
+
+    scope = models.CharField(max_length=10, choices=SCOPES)
+    # Industry or category id, 0 for the global list.
+    scope_id = models.PositiveIntegerField(default=0)
+    rank = models.PositiveSmallIntegerField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "scope_id", "rank"], name="trending_product_rank_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.scope_id} #{self.rank} {self.product_id}"
+
+
+class ProductRecommendation(models.Model):
+    """
+    Top-K neighbours of a product, written by the offline recommendation
+    jobs (see products/recommendations.py).
+    """
+    BOUGHT_TOGETHER = "bought_together"
+    SIMILAR = "similar"
+    KINDS = [(BOUGHT_TOGETHER, "Frequently bought together"), (SIMILAR, "Similar products")]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=20, choices=KINDS)
+    rank = models.PositiveSmallIntegerField()
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="recommended_in")
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "kind", "rank"], name="product_recommendation_rank_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.kind} #{self.rank}: {self.recommended_id}"
+
+
+class ProductContentVector(models.Model):
+    """
+    Hashed term counts of a product's title, tags, model and specs, the
+    input of the "similar products" index (see products/similarity.py).
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="+")
+    category_id = models.PositiveIntegerField(db_index=True)
+    # int32 term hashes and float32 counts, as raw little-endian arrays.
+    terms = models.BinaryField()
+    counts = models.BinaryField()
+    # Saved since its neighbours were last computed; see similarity.refresh_pending().
+    pending = models.BooleanField(default=False, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id} ({len(self.terms) // 4} terms)"
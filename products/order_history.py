@@ -0,0 +1,92 @@
+"""
+Order history for the customer dashboard.
+
+placed_orders() and completed_orders() return one page of a user's
+orders, newest first, as OrderRecord objects. A page costs three queries
+however many orders and lines it has: the count, the orders with their
+shipping address, and all their lines with product title and first image
+(prefetched through ProductLineQuerySet.with_product_cards).
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
+
+from .models import (PLACEHOLDER_IMAGE, CompletedOder, CompletedOderItems, CustomerAddress, PlacedeOderItem,
+                     PlacedOder)
+
+ORDERS_PER_PAGE = 10
+
+
+@dataclass(frozen=True)
+class OrderLine:
+    product_id: int
+    title: str
+    image: str
+    image_renditions: dict
+    quantity: int
+    total_price: float
+
+
+@dataclass(frozen=True)
+class OrderRecord:
+    id: int
+    number: str
+    date: datetime
+    status: str
+    paid: bool
+    sub_total_price: float
+    shipping_address: CustomerAddress
+    lines: tuple
+
+    @property
+    def item_count(self):
+        return sum(line.quantity for line in self.lines)
+
+
+def _lines(items):
+    return tuple(
+        OrderLine(
+            product_id=item.product_id, title=item.product.title,
+            image=item.product_image or PLACEHOLDER_IMAGE, image_renditions=item.product_image_renditions or {},
+            quantity=item.quantity, total_price=item.total_price or 0,
+        )
+        for item in items
+    )
+
+
+def _page(queryset, page_number, per_page, to_record):
+    page = Paginator(queryset, per_page).get_page(page_number)
+    page.object_list = [to_record(order) for order in page.object_list]
+    return page
+
+
+def placed_orders(user, page_number=None, per_page=ORDERS_PER_PAGE):
+    orders = (
+        PlacedOder.objects.filter(user=user)
+        .select_related("shipping_address")
+        .prefetch_related(Prefetch("order_items", to_attr="lines",
+                                   queryset=PlacedeOderItem.objects.with_product_cards().order_by("id")))
+        .order_by("-placed_date", "-id")
+    )
+    return _page(orders, page_number, per_page, lambda order: OrderRecord(
+        id=order.id, number=order.oder_id, date=order.placed_date, status=order.status, paid=order.paid,
+        sub_total_price=order.sub_total_price or 0, shipping_address=order.shipping_address,
+        lines=_lines(order.lines),
+    ))
+
+
+def completed_orders(user, page_number=None, per_page=ORDERS_PER_PAGE):
+    orders = (
+        CompletedOder.objects.filter(user=user)
+        .select_related("shipping_address")
+        .prefetch_related(Prefetch("delivered_items", to_attr="lines",
+                                   queryset=CompletedOderItems.objects.with_product_cards().order_by("id")))
+        .order_by("-complete_date", "-id")
+    )
+    return _page(orders, page_number, per_page, lambda order: OrderRecord(
+        id=order.id, number=order.oder_number, date=order.complete_date, status=order.status, paid=order.paid,
+        sub_total_price=order.sub_total_price, shipping_address=order.shipping_address,
+        lines=_lines(order.lines),
+    ))
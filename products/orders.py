@@ -0,0 +1,102 @@
+"""
+Order placement.
+
+create_order_from_cart() turns a cart into a PlacedOder with a fixed
+number of statements, whatever the number of lines:
+
+    lock the cart lines                  SELECT ... FOR UPDATE
+    lock the user's stock reservations   SELECT ... FOR UPDATE
+    lock the products, in id order       SELECT ... FOR UPDATE
+    read the cart                        cart.build_snapshot
+    take the stock, release the holds    one UPDATE with CASE, one DELETE
+    take sharded stock, if any           three statements per such line
+    insert the order                     number drawn beforehand
+    redeem the coupon, if any            see coupons.redeem
+    insert the items                     bulk_create
+    empty the cart                       one DELETE, one UPDATE of the header
+
+Products are always locked in primary key order, so two orders sharing
+products wait on each other instead of deadlocking. The stock UPDATE is
+also guarded by free stock >= quantity, and it must touch every product.
+That catches a shortfall even where SELECT ... FOR UPDATE is a no-op
+(SQLite). Units the buyer reserved at checkout (products/stock.py) count
+as theirs.
+
+Sharded flash-sale products (products/stock.py) are neither locked nor
+updated here. They sell from their stock slots instead, so buyers of a
+hot product don't all wait on its row.
+"""
+from django.db import transaction
+
+from . import cart, coupons, facets
+from .models import Cart, CartHeader, PlacedeOderItem, PlacedOder, Product, StockReservation
+from .stock import slot_total, take_from_slots, take_stock
+
+
+def create_order_from_cart(user):
+    """
+    Create a placed order from the user's cart in an atomic and concurrency-safe way.
+    Raises ValueError with a user-friendly message on failure.
+    """
+    with transaction.atomic():
+        # Locking the lines first serialises two checkouts of the same cart.
+        product_ids = list(Cart.objects.select_for_update().filter(user=user).values_list("product_id", flat=True))
+        if not product_ids:
+            raise ValueError("Your cart is empty.")
+        held = dict(StockReservation.objects.select_for_update().filter(user=user)
+                    .values_list("product_id", "quantity"))
+        products = {
+            row[0]: row for row in
+            Product.objects.select_for_update().filter(id__in=set(product_ids) | set(held), stock_slots=0)
+            .order_by("id").values_list("id", "categories_id", "stoc", "reserved")
+        }
+
+        snapshot = cart.build_snapshot(user)
+        if not snapshot.shipping_address_id:
+            raise ValueError("Please select a shipping address before placing an order.")
+        wanted = {}
+        for line in snapshot:
+            if line.out_of_stock:
+                raise ValueError(f"{line.title} is out of stock.")
+            if line.product_id not in products:
+                continue
+            _, _, stoc, reserved = products[line.product_id]
+            if stoc - reserved + held.get(line.product_id, 0) < line.quantity:
+                raise ValueError(f"{line.title} is out of stock.")
+            wanted[line.product_id] = line.quantity
+        held = {product_id: quantity for product_id, quantity in held.items() if product_id in products}
+        if (wanted or held) and not take_stock(wanted, held):
+            raise ValueError("Some products in your cart just sold out. Please review your cart.")
+        for line in snapshot:
+            if line.product_id in products:
+                continue
+            short = take_from_slots(line.product_id, line.quantity)
+            if short:
+                if slot_total(line.product_id, cached=False) < short:
+                    raise ValueError(f"{line.title} is out of stock.")
+                raise ValueError(f"{line.title} is selling fast right now. Please try again.")
+        if held:
+            StockReservation.objects.filter(user=user).delete()
+        categories = {row[1] for row in products.values()}
+
+        order = PlacedOder.objects.create(
+            user=user,
+            shipping_address_id=snapshot.shipping_address_id,
+            sub_total_price=float(snapshot.subtotal),
+            paid=True,
+        )
+        if snapshot.coupon:
+            coupons.redeem(snapshot.coupon, user, order, snapshot.discount)
+        PlacedeOderItem.objects.bulk_create([
+            PlacedeOderItem(placed_oder=order, product_id=line.product_id, quantity=line.quantity,
+                            total_price=float(line.total))
+            for line in snapshot
+        ])
+
+        Cart.objects.filter(user=user).delete()
+        # The address stays for next time; the coupon was used up.
+        CartHeader.objects.filter(user=user).update(cupon_code=None)
+        cart.bump_version(user)
+        # Stock levels feed the in-stock facet counts.
+        transaction.on_commit(lambda: facets.invalidate(categories))
+        return order
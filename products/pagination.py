@@ -0,0 +1,122 @@
+"""
+Keyset (cursor) pagination for storefront product listings.
+
+Pages are addressed by the sort key of the last row shown instead of an
+OFFSET, so page N costs one index range scan just like page 1. The cursor is
+an opaque url-safe token; a malformed cursor simply restarts the listing.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+
+
+NEWEST = ("-created_at", "-id")
+TOP_RATED = ("-rating_avg", "-rating_count", "-id")
+PRICE_LOW_HIGH = ("effective_price", "id")
+PRICE_HIGH_LOW = ("-effective_price", "-id")
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, load_more_url=""):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.load_more_url = load_more_url
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering=NEWEST, per_page=24):
+        if ordering[-1].lstrip("-") not in ("id", "pk"):
+            # The last key must be unique or rows sharing a value get skipped.
+            ordering = tuple(ordering) + ("-id",)
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.model = queryset.model
+
+    def _field(self, name):
+        return self.model._meta.pk if name == "pk" else self.model._meta.get_field(name)
+
+    def encode_cursor(self, obj):
+        values = []
+        for key in self.ordering:
+            name = key.lstrip("-")
+            value = getattr(obj, name)
+            values.append(self._field(name).value_to_string(obj) if value is not None else None)
+        raw = json.dumps(values, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                return None
+            return [
+                self._field(key.lstrip("-")).to_python(value)
+                for key, value in zip(self.ordering, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    def _after(self, values):
+        """
+        Rows strictly after `values` in self.ordering, expanded into the
+        (a < x) OR (a = x AND b < y) ... form every backend can index.
+        """
+        condition = Q()
+        equal = {}
+        for key, value in zip(self.ordering, values):
+            name = key.lstrip("-")
+            lookup = "lt" if key.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is not None:
+            queryset = queryset.filter(self._after(values))
+        rows = list(queryset[: self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[: self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor)
+
+
+def keyset_listing(request, queryset, ordering=NEWEST, per_page=24):
+    page = KeysetPaginator(queryset, ordering, per_page).page(request.GET.get("cursor"))
+    query = request.GET.copy()
+    query.pop("cursor", None)
+    query.pop("format", None)
+    query["format"] = "json"
+    page.load_more_url = f"{request.path}?{query.urlencode()}"
+    return page
+
+
+def wants_fragment(request):
+    return request.GET.get("format") == "json"
+
+
+def product_cards_fragment(request, page):
+    """
+    JSON payload for the "load more" button: the next batch of rendered
+    product cards and the cursor that follows them.
+    """
+    html = render_to_string("products/product-cards.html", {"products": page.object_list}, request=request)
+    return JsonResponse({"html": html, "next_cursor": page.next_cursor, "has_next": page.has_next})
@@ -0,0 +1,202 @@
+"""
+"Frequently bought together" recommendations.
+
+`python manage.py compute_recommendations` treats every placed and every
+completed order as a basket. It walks the order lines in batches of order
+ids and counts how often each pair of products shares a basket. The counts
+form a sparse item-item co-occurrence matrix, kept as sorted
+(pair key, count) arrays. Pairs are scored with cosine similarity or lift,
+and the top-K neighbours of every product are written to
+ProductRecommendation.
+
+Memory is bounded by the number of distinct co-occurring pairs, not by
+the number of order lines. Each batch is reduced to unique pairs straight
+away, and the reduced batches are merged whenever they pile up.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Max, Min
+
+from .models import CompletedOderItems, PlacedeOderItem, Product, ProductRecommendation
+from .trending import top_n_per_group
+
+
+ORDER_BATCH = 20000
+TOP_K = 12
+MIN_SUPPORT = 2
+# Baskets with more distinct products than this are bulk buys; they add
+# O(n^2) pairs of mostly noise, so they don't count towards pairs.
+MAX_BASKET = 50
+# Merge pending batches once they hold this many pair entries.
+MERGE_THRESHOLD = 5_000_000
+WRITE_BATCH = 2000
+
+BASKET_SOURCES = (
+    (PlacedeOderItem, "placed_oder_id"),
+    (CompletedOderItems, "completed_oder_id"),
+)
+
+
+def basket_batches(model, order_field, batch_size=ORDER_BATCH):
+    """
+    Yield (order_ids, product_ids) arrays, sorted by order, for consecutive
+    ranges of `batch_size` order ids.
+    """
+    bounds = model.objects.aggregate(low=Min(order_field), high=Max(order_field))
+    if bounds["low"] is None:
+        return
+    for start in range(bounds["low"], bounds["high"] + 1, batch_size):
+        rows = list(
+            model.objects.filter(**{f"{order_field}__gte": start, f"{order_field}__lt": start + batch_size})
+            .values_list(order_field, "product_id")
+        )
+        if rows:
+            lines = np.array(rows, dtype=np.int64)
+            yield lines[:, 0], lines[:, 1]
+
+
+def basket_pairs(orders, products, max_basket=MAX_BASKET):
+    """
+    Distinct (basket, product) lines -> item ids present per basket and
+    every unordered product pair sharing a basket, as (low, high) arrays.
+    """
+    lines = np.unique(np.stack([orders, products], axis=1), axis=0)
+    orders, products = lines[:, 0], lines[:, 1]
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(orders)])
+    ends = np.repeat(starts + sizes, sizes)
+
+    # Element i pairs with every later element of its basket.
+    followers = ends - np.arange(len(orders)) - 1
+    followers[np.repeat(sizes > max_basket, sizes)] = 0
+    total = int(followers.sum())
+    first = np.repeat(np.arange(len(orders)), followers)
+    offsets = np.arange(total) - np.repeat(np.cumsum(followers) - followers, followers)
+    second = first + 1 + offsets
+    return products, len(starts), products[first], products[second]
+
+
+class PairCounter:
+    """
+    Sparse symmetric co-occurrence counts keyed by low * stride + high.
+    """
+
+    def __init__(self, stride):
+        self.stride = stride
+        self.keys = np.empty(0, np.int64)
+        self.counts = np.empty(0, np.int64)
+        self.pending = []
+        self.pending_size = 0
+
+    def add(self, low, high):
+        keys, counts = np.unique(low * self.stride + high, return_counts=True)
+        self.pending.append((keys, counts))
+        self.pending_size += len(keys)
+        if self.pending_size >= MERGE_THRESHOLD:
+            self.merge()
+
+    def merge(self):
+        if not self.pending:
+            return
+        keys = np.concatenate([self.keys] + [keys for keys, _ in self.pending])
+        counts = np.concatenate([self.counts] + [counts for _, counts in self.pending])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+        self.pending = []
+        self.pending_size = 0
+
+    def pairs(self):
+        self.merge()
+        return self.keys // self.stride, self.keys % self.stride, self.counts
+
+
+def cooccurrence(batch_size=ORDER_BATCH):
+    """
+    Returns (low, high, together, item_baskets, basket_count): the pair
+    arrays with their co-occurrence counts, the number of baskets holding
+    each product id, and the number of baskets.
+    """
+    stride = (Product.objects.aggregate(high=Max("id"))["high"] or 0) + 1
+    counter = PairCounter(stride)
+    item_baskets = np.zeros(stride, np.int64)
+    basket_count = 0
+    for model, order_field in BASKET_SOURCES:
+        for orders, products in basket_batches(model, order_field, batch_size):
+            # Products created since the run started fall outside the stride.
+            recent = products < stride
+            items, baskets, low, high = basket_pairs(orders[recent], products[recent])
+            item_baskets += np.bincount(items, minlength=stride)
+            basket_count += baskets
+            if len(low):
+                counter.add(low, high)
+    low, high, together = counter.pairs()
+    return low, high, together, item_baskets, basket_count
+
+
+def score_pairs(low, high, together, item_baskets, basket_count, metric="cosine"):
+    expected = item_baskets[low].astype(np.float64) * item_baskets[high]
+    if metric == "lift":
+        return together * basket_count / expected
+    return together / np.sqrt(expected)
+
+
+def compute_neighbours(top_k=TOP_K, min_support=MIN_SUPPORT, metric="cosine", batch_size=ORDER_BATCH):
+    """
+    (product, neighbour, score) arrays, at most top_k neighbours per product.
+    """
+    low, high, together, item_baskets, basket_count = cooccurrence(batch_size)
+    keep = together >= min_support
+    low, high, together = low[keep], high[keep], together[keep]
+    scores = score_pairs(low, high, together, item_baskets, basket_count, metric)
+    # The matrix is symmetric: every pair recommends both ways.
+    source = np.concatenate([low, high])
+    target = np.concatenate([high, low])
+    scores = np.concatenate([scores, scores])
+    picked, _ = top_n_per_group(source, scores, top_k)
+    return source[picked], target[picked], scores[picked]
+
+
+def _existing_ids(ids, chunk=5000):
+    # Products deleted while the job ran would fail the foreign key.
+    existing = set()
+    for start in range(0, len(ids), chunk):
+        existing.update(Product.objects.filter(id__in=ids[start:start + chunk]).values_list("id", flat=True))
+    return existing
+
+
+def store_neighbours(kind, sources, targets, scores):
+    """
+    Replace every recommendation of `kind`. The arrays are grouped by source
+    product, best first, as top_n_per_group returns them.
+    """
+    starts = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]]) if len(sources) else np.empty(0, np.int64)
+    ranks = np.arange(len(sources)) - np.repeat(starts, np.diff(np.r_[starts, len(sources)]))
+    existing = _existing_ids(np.unique(np.concatenate([sources, targets])).tolist())
+    with transaction.atomic():
+        ProductRecommendation.objects.filter(kind=kind).delete()
+        for start in range(0, len(sources), WRITE_BATCH):
+            ProductRecommendation.objects.bulk_create([
+                ProductRecommendation(product_id=source, kind=kind, rank=rank, recommended_id=target, score=score)
+                for source, target, rank, score in zip(
+                    sources[start:start + WRITE_BATCH].tolist(), targets[start:start + WRITE_BATCH].tolist(),
+                    ranks[start:start + WRITE_BATCH].tolist(), scores[start:start + WRITE_BATCH].tolist())
+                if source in existing and target in existing
+            ])
+    return len(sources)
+
+
+def recommended_products(product, kinds=(ProductRecommendation.BOUGHT_TOGETHER, ProductRecommendation.SIMILAR)):
+    """
+    {kind: [product cards]} of the stored neighbours, best first, in one
+    query over the (product, kind, rank) index.
+    """
+    result = {kind: [] for kind in kinds}
+    queryset = (
+        Product.objects.cards()
+        .filter(recommended_in__product=product, recommended_in__kind__in=kinds)
+        .annotate(recommendation_kind=F("recommended_in__kind"))
+        .order_by("recommended_in__rank")
+    )
+    for recommended in queryset:
+        result[recommended.recommendation_kind].append(recommended)
+    return result
@@ -0,0 +1,328 @@
+"""
+Full-text product search.
+
+SQLite databases get an FTS5 virtual table keyed by the product id, Postgres
+databases get a side table holding a weighted tsvector behind a GIN index.
+Any other backend falls back to an icontains scan over the same fields.
+The index is kept in sync by the signals in products/signals.py and can be
+rebuilt with `python manage.py rebuild_search_index`.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import strip_tags
+
+
+FTS_TABLE = "products_product_fts"
+TSVECTOR_TABLE = "products_product_search"
+
+# Relative weight of each indexed column, most important first.
+FIELD_WEIGHTS = (
+    ("title", 10.0),
+    ("tag", 5.0),
+    ("modle", 4.0),
+    ("taxonomy", 2.0),
+    ("description", 1.0),
+)
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(query):
+    return _TERM_RE.findall((query or "").lower())[:12]
+
+
+def build_document(title, tag, modle, description, category_name, industry_name):
+    """
+    Flatten one product into the plain-text columns stored in the index.
+    """
+    return {
+        "title": title or "",
+        "tag": (tag or "").replace(",", " "),
+        "modle": modle or "",
+        "taxonomy": f"{category_name or ''} {industry_name or ''}".strip(),
+        "description": " ".join(strip_tags(description or "").split()),
+    }
+
+
+def product_rows(queryset):
+    """
+    Yield (product_id, industry_id, document) for every product in queryset.
+    """
+    queryset = queryset.values_list(
+        "id", "title", "tag", "modle", "description",
+        "categories__name", "categories__industry_id", "categories__industry__name",
+    )
+    for (product_id, title, tag, modle, description,
+         category_name, industry_id, industry_name) in queryset.iterator(chunk_size=2000):
+        document = build_document(title, tag, modle, description, category_name, industry_name)
+        yield product_id, industry_id, document
+
+
+class IcontainsSearchBackend:
+    """
+    Fallback used when the database has no full-text support. It keeps no
+    index, so results are ordered by recency rather than relevance.
+    """
+    vendor = None
+
+    def install(self, cursor):
+        pass
+
+    def uninstall(self, cursor):
+        pass
+
+    def upsert(self, cursor, rows):
+        pass
+
+    def delete(self, cursor, product_ids):
+        pass
+
+    def clear(self, cursor):
+        pass
+
+    @staticmethod
+    def filter_queryset(queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term)
+                | Q(tag__icontains=term)
+                | Q(modle__icontains=term)
+                | Q(description__icontains=term)
+                | Q(categories__name__icontains=term)
+                | Q(categories__industry__name__icontains=term)
+            )
+        return queryset
+
+    def _queryset(self, terms, industry_id):
+        from .models import Product
+
+        queryset = Product.objects.all()
+        if industry_id:
+            queryset = queryset.filter(categories__industry_id=industry_id)
+        return self.filter_queryset(queryset, terms)
+
+    def count(self, cursor, terms, industry_id=None):
+        return self._queryset(terms, industry_id).count()
+
+    def ranked_ids(self, cursor, terms, industry_id=None, limit=20, offset=0):
+        queryset = self._queryset(terms, industry_id).order_by("-created_at", "-id")
+        return list(queryset.values_list("id", flat=True)[offset:offset + limit])
+
+
+class SQLiteSearchBackend(IcontainsSearchBackend):
+    vendor = "sqlite"
+
+    def install(self, cursor):
+        columns = ", ".join(name for name, _ in FIELD_WEIGHTS)
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{columns}, industry_id UNINDEXED, "
+            f"tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    def upsert(self, cursor, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        self.delete(cursor, [product_id for product_id, _, _ in rows])
+        columns = [name for name, _ in FIELD_WEIGHTS]
+        placeholders = ", ".join(["%s"] * (len(columns) + 2))
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(columns)}, industry_id) "
+            f"VALUES ({placeholders})",
+            [
+                (product_id, *(document[name] for name in columns), industry_id)
+                for product_id, industry_id, document in rows
+            ],
+        )
+
+    def delete(self, cursor, product_ids):
+        product_ids = list(product_ids)
+        for start in range(0, len(product_ids), 500):
+            chunk = product_ids[start:start + 500]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    @staticmethod
+    def _match(terms):
+        # Every term must match as a prefix, so "sams gam" finds "Samsung gaming".
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def _where(self, terms, industry_id):
+        sql = f"{FTS_TABLE} MATCH %s"
+        params = [self._match(terms)]
+        if industry_id:
+            sql += " AND industry_id = %s"
+            params.append(industry_id)
+        return sql, params
+
+    def count(self, cursor, terms, industry_id=None):
+        where, params = self._where(terms, industry_id)
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {where}", params)
+        return cursor.fetchone()[0]
+
+    def ranked_ids(self, cursor, terms, industry_id=None, limit=20, offset=0):
+        where, params = self._where(terms, industry_id)
+        weights = ", ".join(str(weight) for _, weight in FIELD_WEIGHTS)
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {where} "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid DESC LIMIT %s OFFSET %s",
+            params + [limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(IcontainsSearchBackend):
+    vendor = "postgresql"
+    # Unstemmed tokens, so prefix matching behaves the same as on SQLite.
+    config = "simple"
+    # tsvector only knows four weight classes.
+    column_weights = {"title": "A", "tag": "A", "modle": "B", "taxonomy": "C", "description": "D"}
+
+    def install(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TSVECTOR_TABLE} ("
+            f"product_id bigint PRIMARY KEY REFERENCES products_product (id) "
+            f"ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            f"industry_id bigint NULL, "
+            f"document tsvector NOT NULL)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TSVECTOR_TABLE}_document_gin "
+            f"ON {TSVECTOR_TABLE} USING gin (document)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TSVECTOR_TABLE}_industry "
+            f"ON {TSVECTOR_TABLE} (industry_id)"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {TSVECTOR_TABLE}")
+
+    def upsert(self, cursor, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        vector = " || ".join(
+            f"setweight(to_tsvector('{self.config}', %s), '{self.column_weights[name]}')"
+            for name, _ in FIELD_WEIGHTS
+        )
+        cursor.executemany(
+            f"INSERT INTO {TSVECTOR_TABLE} (product_id, industry_id, document) "
+            f"VALUES (%s, %s, {vector}) "
+            f"ON CONFLICT (product_id) DO UPDATE "
+            f"SET industry_id = EXCLUDED.industry_id, document = EXCLUDED.document",
+            [
+                (product_id, industry_id, *(document[name] for name, _ in FIELD_WEIGHTS))
+                for product_id, industry_id, document in rows
+            ],
+        )
+
+    def delete(self, cursor, product_ids):
+        product_ids = list(product_ids)
+        if product_ids:
+            cursor.execute(f"DELETE FROM {TSVECTOR_TABLE} WHERE product_id = ANY(%s)", [product_ids])
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {TSVECTOR_TABLE}")
+
+    def _tsquery(self, terms):
+        return " & ".join(f"{term}:*" for term in terms)
+
+    def _where(self, terms, industry_id):
+        sql = f"document @@ to_tsquery('{self.config}', %s)"
+        params = [self._tsquery(terms)]
+        if industry_id:
+            sql += " AND industry_id = %s"
+            params.append(industry_id)
+        return sql, params
+
+    def count(self, cursor, terms, industry_id=None):
+        where, params = self._where(terms, industry_id)
+        cursor.execute(f"SELECT COUNT(*) FROM {TSVECTOR_TABLE} WHERE {where}", params)
+        return cursor.fetchone()[0]
+
+    def ranked_ids(self, cursor, terms, industry_id=None, limit=20, offset=0):
+        where, params = self._where(terms, industry_id)
+        cursor.execute(
+            f"SELECT product_id FROM {TSVECTOR_TABLE} WHERE {where} "
+            f"ORDER BY ts_rank_cd(document, to_tsquery('{self.config}', %s)) DESC, product_id DESC "
+            f"LIMIT %s OFFSET %s",
+            params + [self._tsquery(terms), limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+_BACKENDS = {
+    SQLiteSearchBackend.vendor: SQLiteSearchBackend,
+    PostgresSearchBackend.vendor: PostgresSearchBackend,
+}
+
+
+def get_backend(conn=None):
+    conn = conn or connection
+    return _BACKENDS.get(conn.vendor, IcontainsSearchBackend)()
+
+
+def index_products(queryset):
+    backend = get_backend()
+    with connection.cursor() as cursor:
+        batch = []
+        for row in product_rows(queryset):
+            batch.append(row)
+            if len(batch) >= 1000:
+                backend.upsert(cursor, batch)
+                batch = []
+        backend.upsert(cursor, batch)
+
+
+def remove_products(product_ids):
+    with connection.cursor() as cursor:
+        get_backend().delete(cursor, product_ids)
+
+
+class SearchResults:
+    """
+    Lazily evaluated, relevance-ranked product search that Django's Paginator
+    can page through: count() and slicing each run a single index query.
+    """
+
+    def __init__(self, query, industry_id=None):
+        self.terms = search_terms(query)
+        self.industry_id = industry_id
+        self.backend = get_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if not self.terms:
+                self._count = 0
+            else:
+                with connection.cursor() as cursor:
+                    self._count = self.backend.count(cursor, self.terms, self.industry_id)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        from .models import Product
+
+        offset = index.start or 0
+        limit = (index.stop if index.stop is not None else self.count()) - offset
+        if not self.terms or limit <= 0:
+            return []
+        with connection.cursor() as cursor:
+            ids = self.backend.ranked_ids(cursor, self.terms, self.industry_id, limit, offset)
+        products = Product.objects.cards().in_bulk(ids)
+        return [products[product_id] for product_id in ids if product_id in products]
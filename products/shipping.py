@@ -0,0 +1,89 @@
+"""
+Shipping placed orders.
+
+ship_orders() moves a selection of PlacedOder rows, with their items,
+over to CompletedOder/CompletedOderItems in one transaction. It works
+in batches of BATCH_SIZE orders, and each batch is a fixed number of
+statements:
+
+    lock the orders                SELECT ... FOR UPDATE
+    read their items               one SELECT
+    archive the orders             bulk_create
+    archive the items              bulk_create
+    drop the placed rows           DELETE, cascading to the items
+
+Each batch's timing is logged to this module's logger.
+"""
+import logging
+import time
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from .models import CompletedOder, CompletedOderItems, PlacedeOderItem, PlacedOder
+
+BATCH_SIZE = 500
+SHIPPED = "Oder Shipped"
+
+logger = logging.getLogger(__name__)
+
+
+def _archive(orders):
+    completed = [
+        CompletedOder(user_id=user_id, shipping_address_id=address_id, sub_total_price=sub_total_price,
+                      paid=paid, status=SHIPPED, oder_number=number)
+        for _, user_id, address_id, sub_total_price, paid, number in orders
+    ]
+    if connection.features.can_return_rows_from_bulk_insert:
+        CompletedOder.objects.bulk_create(completed)
+    else:
+        # MySQL doesn't hand back the new ids, and the items need them.
+        for order in completed:
+            order.save()
+    return completed
+
+
+def ship_orders(order_ids, batch_size=BATCH_SIZE):
+    """
+    Archive the placed orders with these ids as shipped. Ids that are gone
+    already (shipped by someone else) are skipped. Returns the number of
+    orders shipped.
+    """
+    order_ids = sorted(set(order_ids))
+    shipped = 0
+    with transaction.atomic():
+        for start in range(0, len(order_ids), batch_size):
+            started = time.perf_counter()
+            batch = order_ids[start:start + batch_size]
+            orders = list(
+                PlacedOder.objects.select_for_update().filter(id__in=batch).order_by("id")
+                .values_list("id", "user_id", "shipping_address_id", "sub_total_price", "paid", "order_number")
+            )
+            if not orders:
+                continue
+            ids = [order[0] for order in orders]
+            items = defaultdict(list)
+            for order_id, product_id, quantity, total_price in (
+                    PlacedeOderItem.objects.filter(placed_oder_id__in=ids).order_by("id")
+                    .values_list("placed_oder_id", "product_id", "quantity", "total_price")):
+                items[order_id].append((product_id, quantity, total_price or 0))
+
+            completed = _archive([
+                (order_id, user_id, address_id,
+                 # Orders entered by hand may not have a subtotal yet.
+                 sub_total_price if sub_total_price is not None else sum(line[2] for line in items[order_id]),
+                 paid, number or f"OID{str(order_id).zfill(6)}")
+                for order_id, user_id, address_id, sub_total_price, paid, number in orders
+            ])
+            CompletedOderItems.objects.bulk_create([
+                CompletedOderItems(completed_oder=archived, product_id=product_id, quantity=quantity,
+                                   total_price=total_price)
+                for order_id, archived in zip(ids, completed)
+                for product_id, quantity, total_price in items[order_id]
+            ])
+            PlacedOder.objects.filter(id__in=ids).delete()
+
+            shipped += len(ids)
+            logger.info("Shipped %d orders (%d items) in %.1f ms", len(ids),
+                        sum(len(lines) for lines in items.values()), (time.perf_counter() - started) * 1000)
+    return shipped
@@ -1,5 +1,8 @@
-from .models import PlacedOder, CompletedOder, CompletedOderItems, PlacedeOderItem
-from django.db.models.signals import pre_save, post_save
+from .models import (PlacedOder, CompletedOder, CompletedOderItems, PlacedeOderItem,
+                     Product, Categories, SubCategories, Industry, ProductStarRatingAndReview,
+                     ProductAditionalInformation, CuponCodeGenaration)
+from . import coupons, facets, images, search, similarity, taxonomy
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.shortcuts import redirect
 
@@ -40,4 +43,116 @@ from django.shortcuts import redirect
 #             sub_total_price += item.total_price
 #         instance.sub_total_price = sub_total_price
         
-        
\ No newline at end of file
+        
+
+# ---- Search index sync ----
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Categories)
+def reindex_category_products(sender, instance, created, raw=False, **kwargs):
+    # Category and industry names are part of every product's document.
+    if not created and not raw:
+        search.index_products(Product.objects.filter(categories=instance))
+
+
+@receiver(post_save, sender=Industry)
+def reindex_industry_products(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_products(Product.objects.filter(categories__industry=instance))
+
+
+# ---- Rating aggregates ----
+
+@receiver(post_delete, sender=ProductStarRatingAndReview)
+def remove_review_from_product_rating(sender, instance, **kwargs):
+    # Runs inside the deletion's transaction, also for queryset and cascade deletes.
+    Product.objects.filter(pk=instance.product_id).update(**Product.rating_changes(instance.stars, -1))
+
+
+# ---- Mega-menu taxonomy cache ----
+
+@receiver(post_save, sender=Industry)
+@receiver(post_delete, sender=Industry)
+@receiver(post_save, sender=Categories)
+@receiver(post_delete, sender=Categories)
+@receiver(post_save, sender=SubCategories)
+@receiver(post_delete, sender=SubCategories)
+def invalidate_taxonomy_tree(sender, **kwargs):
+    taxonomy.bump_version()
+
+
+# ---- Category facet counts ----
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, raw=False, **kwargs):
+    # A product moved to another category changes the counts of both.
+    if instance.pk and not raw:
+        instance._previous_categories_id = (
+            Product.objects.filter(pk=instance.pk).values_list("categories_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def invalidate_product_facets(sender, instance, **kwargs):
+    facets.invalidate([instance.categories_id, getattr(instance, "_previous_categories_id", None)])
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_deleted_product_facets(sender, instance, **kwargs):
+    facets.invalidate([instance.categories_id])
+
+
+@receiver(post_save, sender=ProductStarRatingAndReview)
+@receiver(post_delete, sender=ProductStarRatingAndReview)
+def invalidate_review_facets(sender, instance, **kwargs):
+    # The rating facet counts average ratings.
+    facets.invalidate(Product.objects.filter(pk=instance.product_id).values_list("categories_id", flat=True))
+
+
+# ---- Similar products ----
+
+@receiver(post_save, sender=Product)
+def refresh_similar_products(sender, instance, raw=False, **kwargs):
+    if not raw:
+        similarity.schedule_update(instance.pk)
+
+
+@receiver(post_save, sender=ProductAditionalInformation)
+@receiver(post_delete, sender=ProductAditionalInformation)
+def refresh_similar_products_for_specs(sender, instance, raw=False, **kwargs):
+    if not raw:
+        similarity.schedule_update(instance.product_id)
+
+
+# ---- Coupon cache ----
+
+@receiver(pre_save, sender=CuponCodeGenaration)
+def remember_coupon_code(sender, instance, raw=False, **kwargs):
+    # A renamed code must stop working under the old name too.
+    if instance.pk and not raw:
+        instance._previous_cupon_code = (
+            CuponCodeGenaration.objects.filter(pk=instance.pk).values_list("cupon_code", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=CuponCodeGenaration)
+@receiver(post_delete, sender=CuponCodeGenaration)
+def invalidate_coupon(sender, instance, **kwargs):
+    coupons.invalidate([instance.cupon_code, getattr(instance, "_previous_cupon_code", None)])
+
+
+# ---- Image renditions ----
+
+for _model in images.registered_models():
+    post_save.connect(images.mark_changed, sender=_model, dispatch_uid=f"renditions:{_model._meta.label}")
@@ -0,0 +1,312 @@
+"""
+Content-based "similar products".
+
+Every product is turned into hashed term counts: title words (counted
+twice), whole tags and their words, the model and each spec as
+"name=value" plus its words. The counts are stored in ProductContentVector.
+Within a category the counts are weighted with TF-IDF (sublinear tf, idf
+from that category's document frequencies) and L2 normalised. Nearest
+neighbours by cosine are precomputed per category into ProductRecommendation
+with kind="similar". The category itself is not a term, since every
+candidate shares it.
+
+Saving a product (or its specs) only recomputes its vector once the
+transaction commits, and flags it pending. `python manage.py
+rebuild_similar_products --pending` (every few minutes) then finds the
+neighbours of the pending products, loading each category's matrix once
+per run however many of its products changed, and offers every one of
+them to the lists of its closest neighbours. Without --pending the
+command rebuilds everything, e.g. nightly, which also picks up idf drift
+and products that moved category.
+"""
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Product, ProductAditionalInformation, ProductContentVector, ProductRecommendation
+
+
+HASH_BITS = 20
+TOP_K = 12
+BLOCK_ROWS = 256
+# Rows are scored in blocks of at most BLOCK_ROWS, and smaller in big
+# categories: a block's dense scores plus the postings it walks stay under
+# this many cells (8 bytes each, a few arrays of it at a time).
+MAX_BLOCK_CELLS = 2_000_000
+# Terms found in more than this share of a category say nothing about
+# similarity; they are dropped once a category has MIN_DOCS_FOR_PRUNING products.
+MAX_DF = 0.5
+MIN_DOCS_FOR_PRUNING = 20
+# How many of a saved product's closest neighbours get it offered to their lists.
+BACKFILL_CANDIDATES = 50
+
+SIMILAR = ProductRecommendation.SIMILAR
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _hash(token):
+    return zlib.crc32(token.encode()) & ((1 << HASH_BITS) - 1)
+
+
+def product_terms(title, tag, modle, specs):
+    """
+    (terms, counts) arrays for one product; specs is [(name, details)].
+    """
+    tokens = Counter()
+    for word in _WORD_RE.findall((title or "").lower()):
+        tokens[f"w:{word}"] += 2
+    for phrase in (tag or "").lower().split(","):
+        phrase = " ".join(phrase.split())
+        if phrase:
+            tokens[f"t:{phrase}"] += 1
+            tokens.update(f"w:{word}" for word in _WORD_RE.findall(phrase))
+    if modle and modle.strip():
+        tokens[f"m:{modle.strip().lower()}"] += 1
+    for name, details in specs:
+        name, details = name.strip().lower(), details.strip().lower()
+        tokens[f"s:{name}={details}"] += 1
+        tokens.update(f"w:{word}" for word in _WORD_RE.findall(details))
+
+    hashed = Counter()
+    for token, count in tokens.items():
+        hashed[_hash(token)] += count
+    terms = np.fromiter(hashed.keys(), dtype=np.int32, count=len(hashed))
+    counts = np.fromiter(hashed.values(), dtype=np.float32, count=len(hashed))
+    order = np.argsort(terms)
+    return terms[order], counts[order]
+
+
+def index_products(product_ids, chunk=1000, pending=False):
+    """
+    Recompute and store the content vectors of the given products;
+    pending=True also queues them for refresh_pending().
+    """
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), chunk):
+        ids = product_ids[start:start + chunk]
+        specs = {}
+        for product_id, name, details in ProductAditionalInformation.objects.filter(
+                product_id__in=ids).order_by("id").values_list("product_id", "specification", "details"):
+            specs.setdefault(product_id, []).append((name, details))
+        vectors = []
+        for product_id, category_id, title, tag, modle in Product.objects.filter(id__in=ids).values_list(
+                "id", "categories_id", "title", "tag", "modle"):
+            terms, counts = product_terms(title, tag, modle, specs.get(product_id, []))
+            vectors.append(ProductContentVector(
+                product_id=product_id, category_id=category_id,
+                terms=terms.astype("<i4").tobytes(), counts=counts.astype("<f4").tobytes(),
+                pending=pending,
+            ))
+        ProductContentVector.objects.bulk_create(
+            vectors, update_conflicts=True, unique_fields=["product"],
+            update_fields=["category_id", "terms", "counts", "updated_at"] + (["pending"] if pending else []),
+        )
+
+
+class CategoryMatrix:
+    """
+    TF-IDF weighted, L2 normalised vectors of one category, with the
+    entries also sorted by term so a query only touches the postings of
+    its own terms.
+    """
+
+    def __init__(self, category_id):
+        self.category_id = category_id
+        rows = list(ProductContentVector.objects.filter(category_id=category_id)
+                    .order_by("product_id").values_list("product_id", "terms", "counts"))
+        self.ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        self.position = {product_id: index for index, product_id in enumerate(self.ids.tolist())}
+        n = len(rows)
+        terms = [np.frombuffer(bytes(row[1]), dtype="<i4") for row in rows]
+        counts = [np.frombuffer(bytes(row[2]), dtype="<f4") for row in rows]
+        sizes = np.fromiter((len(t) for t in terms), dtype=np.int64, count=n)
+        entry_rows = np.repeat(np.arange(n), sizes)
+        entry_terms = np.concatenate(terms) if n else np.empty(0, np.int32)
+        entry_counts = np.concatenate(counts).astype(np.float64) if n else np.empty(0)
+
+        vocabulary, inverse, df = np.unique(entry_terms, return_inverse=True, return_counts=True)
+        idf = np.log((1 + n) / (1 + df)) + 1
+        weights = (1 + np.log(np.maximum(entry_counts, 1))) * idf[inverse]
+        if n >= MIN_DOCS_FOR_PRUNING:
+            keep = df[inverse] <= MAX_DF * n
+            entry_rows, entry_terms, weights, inverse = entry_rows[keep], entry_terms[keep], weights[keep], inverse[keep]
+        norms = np.sqrt(np.bincount(entry_rows, weights=weights ** 2, minlength=n))
+        weights = weights / np.where(norms > 0, norms, 1)[entry_rows]
+
+        self.n = n
+        self.rows, self.term_index, self.weights = entry_rows, inverse, weights
+        # Postings: entries ordered by term, with each term's [start, end).
+        order = np.argsort(inverse, kind="stable")
+        self.posting_rows = entry_rows[order]
+        self.posting_weights = weights[order]
+        self.posting_start = np.searchsorted(inverse[order], np.arange(len(vocabulary)))
+        self.posting_end = np.searchsorted(inverse[order], np.arange(len(vocabulary)), side="right")
+        # Entries grouped by row, for picking out a block of query rows.
+        self.row_start = np.searchsorted(entry_rows, np.arange(n))
+        self.row_end = np.searchsorted(entry_rows, np.arange(n), side="right")
+        # Postings a row's query walks, for sizing blocks.
+        posting_lengths = (self.posting_end - self.posting_start)[inverse]
+        self.row_postings = np.bincount(entry_rows, weights=posting_lengths, minlength=n).astype(np.int64)
+
+    def blocks(self, rows):
+        """
+        Split rows into blocks for scores(), each within BLOCK_ROWS rows and
+        MAX_BLOCK_CELLS cells.
+        """
+        block, cells = [], 0
+        for row in rows:
+            cost = self.n + int(self.row_postings[row])
+            if block and (len(block) >= BLOCK_ROWS or cells + cost > MAX_BLOCK_CELLS):
+                yield block
+                block, cells = [], 0
+            block.append(row)
+            cells += cost
+        if block:
+            yield block
+
+    def scores(self, block):
+        """
+        Cosine similarity of each row in `block` against every row:
+        a len(block) x n array. Use blocks() to keep it to a bounded size.
+        """
+        block = np.asarray(block, dtype=np.int64)
+        sizes = self.row_end[block] - self.row_start[block]
+        entries = np.repeat(self.row_start[block], sizes) + _ranges(sizes)
+        query = np.repeat(np.arange(len(block)), sizes)
+        terms, weights = self.term_index[entries], self.weights[entries]
+
+        lengths = self.posting_end[terms] - self.posting_start[terms]
+        postings = np.repeat(self.posting_start[terms], lengths) + _ranges(lengths)
+        cells = np.repeat(query, lengths) * self.n + self.posting_rows[postings]
+        products = np.repeat(weights, lengths) * self.posting_weights[postings]
+        return np.bincount(cells, weights=products, minlength=len(block) * self.n).reshape(len(block), self.n)
+
+    def neighbours(self, block, top_k=TOP_K, scores=None):
+        """
+        [(product_id, [(neighbour_id, score), ...])] for the rows in block.
+        scores, if given, are self.scores(block) with the diagonal zeroed.
+        """
+        k = min(top_k, self.n - 1)
+        if k <= 0:
+            return [(int(self.ids[row]), []) for row in block]
+        if scores is None:
+            scores = self.scores(block)
+            scores[np.arange(len(block)), block] = 0
+        result = []
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for offset, row in enumerate(block):
+            picked = best[offset][np.argsort(-scores[offset, best[offset]], kind="stable")]
+            result.append((int(self.ids[row]), [
+                (int(self.ids[column]), float(scores[offset, column]))
+                for column in picked.tolist() if scores[offset, column] > 0
+            ]))
+        return result
+
+
+def _ranges(sizes):
+    # Concatenated arange(size) for every size.
+    return np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+
+def _write(lists):
+    """
+    Replace the similar-product rows of every product in lists.
+    """
+    product_ids = [product_id for product_id, _ in lists]
+    for start in range(0, len(product_ids), 500):
+        ProductRecommendation.objects.filter(kind=SIMILAR, product_id__in=product_ids[start:start + 500]).delete()
+    ProductRecommendation.objects.bulk_create([
+        ProductRecommendation(product_id=product_id, kind=SIMILAR, rank=rank, recommended_id=neighbour, score=score)
+        for product_id, ranked in lists
+        for rank, (neighbour, score) in enumerate(ranked)
+    ], batch_size=2000)
+
+
+def rebuild_category(category_id, top_k=TOP_K):
+    started = timezone.now()
+    matrix = CategoryMatrix(category_id)
+    with transaction.atomic():
+        ProductRecommendation.objects.filter(kind=SIMILAR, product__categories_id=category_id).delete()
+        for block in matrix.blocks(range(matrix.n)):
+            _write(matrix.neighbours(block, top_k))
+        ProductContentVector.objects.filter(category_id=category_id, pending=True,
+                                            updated_at__lte=started).update(pending=False)
+    return matrix.n
+
+
+def _update_rows(matrix, block, top_k):
+    """
+    Recompute the lists of the products in block and offer each of them to
+    the lists of its closest neighbours.
+    """
+    scores = matrix.scores(block)
+    scores[np.arange(len(block)), block] = 0
+    lists = dict(matrix.neighbours(block, top_k, scores))
+
+    offers = defaultdict(list)
+    for offset, row in enumerate(block):
+        product_id = int(matrix.ids[row])
+        for column in np.argsort(-scores[offset], kind="stable")[:BACKFILL_CANDIDATES].tolist():
+            if scores[offset, column] > 0 and int(matrix.ids[column]) not in lists:
+                offers[int(matrix.ids[column])].append((product_id, float(scores[offset, column])))
+    current = defaultdict(list)
+    for owner, neighbour, score in (ProductRecommendation.objects.filter(kind=SIMILAR, product_id__in=list(offers))
+                                    .order_by("rank").values_list("product_id", "recommended_id", "score")):
+        current[owner].append((neighbour, score))
+
+    changed = list(lists.items())
+    for owner, offered in offers.items():
+        offered_ids = {product_id for product_id, _ in offered}
+        existing = [(neighbour, old) for neighbour, old in current[owner] if neighbour not in offered_ids]
+        merged = sorted(existing + offered, key=lambda item: -item[1])[:top_k]
+        if merged != current[owner]:
+            changed.append((owner, merged))
+    with transaction.atomic():
+        _write(changed)
+
+
+def refresh_pending(top_k=TOP_K):
+    """
+    Find the neighbours of every product saved since the last run. Returns
+    how many products were refreshed.
+    """
+    started = timezone.now()
+    pending = defaultdict(list)
+    for product_id, category_id in ProductContentVector.objects.filter(pending=True).values_list(
+            "product_id", "category_id"):
+        pending[category_id].append(product_id)
+    refreshed = 0
+    for category_id, product_ids in pending.items():
+        matrix = CategoryMatrix(category_id)
+        rows = sorted(matrix.position[product_id] for product_id in product_ids)
+        for block in matrix.blocks(rows):
+            _update_rows(matrix, block, top_k)
+        # Products saved again meanwhile stay pending for the next run.
+        ProductContentVector.objects.filter(product_id__in=product_ids, updated_at__lte=started).update(pending=False)
+        refreshed += len(rows)
+    return refreshed
+
+
+# Saves of a product and its spec rows in one transaction collapse into a
+# single re-index after commit.
+_pending = threading.local()
+
+
+def schedule_update(product_id):
+    pending = getattr(_pending, "ids", None)
+    if pending is None:
+        pending = _pending.ids = set()
+    pending.add(product_id)
+
+    def run():
+        if product_id in pending:
+            pending.discard(product_id)
+            index_products([product_id], pending=True)
+
+    transaction.on_commit(run)
@@ -0,0 +1,103 @@
+"""
+Unique slug allocation.
+
+Collisions are resolved with one prefix query per base slug instead of
+probing `slug-1`, `slug-2`, ... with an exists() query each. The bulk
+variants allocate slugs for many unsaved objects at once, so rows going
+through bulk_create get the same `<base>-<n>` slugs that save() would give.
+"""
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.text import slugify
+
+
+# Room kept for the "-<n>" suffix when a slug has to be cut to fit the column.
+SUFFIX_RESERVE = 7
+# Bases per OR'ed prefix query, keeps the bind parameters well under SQLite's limit.
+PREFIX_BATCH = 200
+
+
+def slug_base(value, max_length=50, fallback="item"):
+    base = slugify(value or "") or fallback
+    if len(base) > max_length - SUFFIX_RESERVE:
+        base = base[:max_length - SUFFIX_RESERVE].rstrip("-") or fallback
+    return base
+
+
+def _prefix_q(field, base):
+    if connection.vendor == "sqlite":
+        # SQLite LIKE can't use the unique index. Slugs never contain a
+        # character sorting below "-", so this range holds exactly `base`
+        # and `base-...`.
+        return Q(**{f"{field}__gte": base, f"{field}__lt": f"{base}."})
+    return Q(**{field: base}) | Q(**{f"{field}__startswith": f"{base}-"})
+
+
+class SlugAllocator:
+    """
+    Hands out `base`, then the first free of `base-1`, `base-2`, ... given
+    the slugs already taken. Only that series counts: a taken `iphone-15`
+    (another product's own slug) doesn't push a new `iphone` to `iphone-16`.
+    """
+
+    def __init__(self, taken=()):
+        self.taken = set(taken)
+        # Per base, the number below which the series is known to be taken.
+        self.next = {}
+
+    def allocate(self, base):
+        slug = base
+        if slug in self.taken:
+            number = self.next.get(base, 1)
+            while f"{base}-{number}" in self.taken:
+                number += 1
+            slug = f"{base}-{number}"
+            self.next[base] = number + 1
+        self.taken.add(slug)
+        return slug
+
+
+def taken_slugs(queryset, bases, field="slug"):
+    """
+    Every slug in queryset equal to or prefixed by one of `bases`, in one
+    query per PREFIX_BATCH bases.
+    """
+    bases = sorted(set(bases))
+    taken = set()
+    for start in range(0, len(bases), PREFIX_BATCH):
+        condition = Q()
+        for base in bases[start:start + PREFIX_BATCH]:
+            condition |= _prefix_q(field, base)
+        taken.update(queryset.filter(condition).values_list(field, flat=True))
+    return taken
+
+
+def unique_slug(instance, value, field="slug"):
+    """
+    A free slug for `instance` built from `value`.
+    """
+    model = type(instance)
+    max_length = model._meta.get_field(field).max_length
+    base = slug_base(value, max_length, model._meta.model_name)
+    queryset = model._default_manager.all()
+    if instance.pk is not None:
+        queryset = queryset.exclude(pk=instance.pk)
+    return SlugAllocator(taken_slugs(queryset, [base], field)).allocate(base)
+
+
+def fill_slugs(objs, source, field="slug"):
+    """
+    Give every object in objs without a slug a unique one built from its
+    `source` attribute. Meant for rows about to go through bulk_create.
+    """
+    objs = [obj for obj in objs if not getattr(obj, field)]
+    if not objs:
+        return
+    model = type(objs[0])
+    max_length = model._meta.get_field(field).max_length
+    fallback = model._meta.model_name
+    bases = [slug_base(getattr(obj, source), max_length, fallback) for obj in objs]
+    allocator = SlugAllocator(taken_slugs(model._default_manager.all(), bases, field))
+    for obj, base in zip(objs, bases):
+        setattr(obj, field, allocator.allocate(base))
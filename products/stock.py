@@ -0,0 +1,311 @@
+"""
+Stock reservations.
+
+Opening the checkout or the payment page holds the cart's quantities for
+RESERVATION_MINUTES (reserve()). Product.reserved is the sum of the live
+holds on a product. Every change to the StockReservation rows updates it
+in the same transaction, so anyone's buyable stock is just
+stoc - reserved, with no aggregate query.
+
+Re-entering checkout with the same cart only extends the holds, a single
+UPDATE of the user's reservation rows. Product rows are locked only when
+a hold grows or shrinks, and only for that one conditional UPDATE. The
+payment path then mostly finds its stock already set aside.
+
+Placing the order turns the holds into the sale (take_stock): stoc and
+reserved go down together. `python manage.py release_expired_reservations`
+(every minute) releases holds that ran out, in batches. Until it runs, an
+expired hold still counts, and its owner can still use it.
+
+Flash-sale products can be sharded instead (set_slots()). Their stock is
+split over Product.stock_slots ProductStockSlot rows, and an order takes
+from a random slot, skipping slots another order has locked instead of
+queueing on one row (take_from_slots()). The slots always add up to the
+exact stock. The storefront shows that sum through a short-lived cache
+(slot_total()), and Product.stoc only catches up when
+`python manage.py stock_slots --rebalance` runs (every minute), which also
+evens the slots out again. Sharded products aren't reserved at checkout,
+since every hold would update the one Product row again.
+"""
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import facets
+from .models import Product, ProductStockSlot, StockReservation
+
+RESERVATION_MINUTES = 15
+SLOT_CACHE_TIMEOUT = 5
+SLOT_ROUNDS = 3
+
+
+def per_product(quantities, default=0):
+    """
+    CASE id WHEN <product> THEN <n> ... ELSE default END over products.
+
+    Written in the simple CASE form: Django's When(Q()) objects cost more
+    to build and compile than the statement takes to run once a cart has
+    a few dozen lines.
+    """
+    if not quantities:
+        return Value(default, output_field=IntegerField())
+    column = f"{connection.ops.quote_name(Product._meta.db_table)}.{connection.ops.quote_name('id')}"
+    whens = " ".join("WHEN %s THEN %s" for _ in quantities)
+    params = [value for item in quantities.items() for value in item] + [default]
+    return RawSQL(f"CASE {column} {whens} ELSE %s END", params, output_field=IntegerField())
+
+
+def take_stock(quantities, held=None):
+    """
+    Sell {product_id: quantity} out of stock and release the buyer's holds
+    {product_id: quantity} in one UPDATE. Returns False if any product was
+    short; the others are changed all the same, so the caller has to roll
+    back.
+    """
+    held = held or {}
+    wanted = per_product(quantities)
+    released = per_product(held)
+    ids = set(quantities) | set(held)
+    updated = (
+        Product.objects.filter(id__in=list(ids), stoc__gte=F("reserved") - released + wanted)
+        .update(
+            stoc=F("stoc") - wanted,
+            reserved=Greatest(F("reserved") - released, 0),
+            out_of_stoc=Case(When(Q(stoc__lte=wanted), then=Value(True)), default=F("out_of_stoc")),
+        )
+    )
+    return updated == len(ids)
+
+
+def _lock_products(product_ids):
+    # Always in id order, like order placement, so nobody deadlocks.
+    # Sharded products are left out: they aren't reserved.
+    return {
+        row[0]: row for row in
+        Product.objects.select_for_update().filter(id__in=list(product_ids), stock_slots=0).order_by("id")
+        .values_list("id", "title", "stoc", "reserved", "categories_id")
+    }
+
+
+def _invalidate_flipped(products, changes):
+    # Only a hold that takes free stock to zero, or frees the last of it,
+    # changes the in-stock facet counts.
+    flipped = [
+        category_id for product_id, (_, _, stoc, reserved, category_id) in products.items()
+        if product_id in changes and (stoc > reserved) != (stoc > max(reserved + changes[product_id], 0))
+    ]
+    if flipped:
+        transaction.on_commit(lambda: facets.invalidate(flipped))
+
+
+def reserve(user, quantities, minutes=RESERVATION_MINUTES):
+    """
+    Hold {product_id: quantity} for user for the next `minutes`, replacing
+    whatever they held before. Raises ValueError with a message for the
+    customer when there isn't enough free stock; nothing changes then.
+    """
+    expires_at = timezone.now() + timedelta(minutes=minutes)
+    with transaction.atomic():
+        held = dict(StockReservation.objects.select_for_update().filter(user=user)
+                    .values_list("product_id", "quantity"))
+        if held == quantities:
+            StockReservation.objects.filter(user=user).update(expires_at=expires_at)
+            return
+        changes = {
+            product_id: quantities.get(product_id, 0) - held.get(product_id, 0)
+            for product_id in set(quantities) | set(held)
+        }
+        changes = {product_id: change for product_id, change in changes.items() if change}
+        products = _lock_products(changes)
+        for product_id, change in changes.items():
+            if product_id not in products:
+                continue
+            _, title, stoc, reserved, _ = products[product_id]
+            if change > 0 and stoc - reserved < change:
+                free = max(stoc - reserved, 0) + held.get(product_id, 0)
+                raise ValueError(f"{title} is out of stock." if not free else f"Only {free} of {title} left.")
+        changes = {product_id: change for product_id, change in changes.items() if product_id in products}
+        if changes:
+            change = per_product(changes)
+            updated = (
+                Product.objects.filter(id__in=list(changes))
+                .filter(Q(stoc__gte=F("reserved") + change) | Q(id__in=[pid for pid, c in changes.items() if c < 0]))
+                .update(reserved=Greatest(F("reserved") + change, 0))
+            )
+            if updated != len(changes):
+                raise ValueError("Some products in your cart just sold out. Please review your cart.")
+            _invalidate_flipped(products, changes)
+
+        StockReservation.objects.filter(user=user).exclude(product_id__in=list(quantities)).delete()
+        StockReservation.objects.bulk_create([
+            StockReservation(user=user, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items() if product_id in products or product_id in held
+        ], update_conflicts=True, unique_fields=["user", "product"], update_fields=["quantity", "expires_at"])
+
+
+def reserve_cart(user, snapshot):
+    return reserve(user, {line.product_id: line.quantity for line in snapshot if not line.stock_slots})
+
+
+def release_expired(now=None, batch_size=500, pause=0.2):
+    """
+    Release holds that expired, oldest first, batch_size per transaction
+    with `pause` seconds between batches. Holds someone is checking out
+    with right now are locked and skipped. Yields the count per batch.
+    """
+    now = now or timezone.now()
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lt=now).order_by("expires_at")
+                .values_list("id", "product_id", "quantity")[:batch_size]
+            )
+            if not batch:
+                return
+            freed = defaultdict(int)
+            for _, product_id, quantity in batch:
+                freed[product_id] += quantity
+            products = _lock_products(freed)
+            _invalidate_flipped(products, {product_id: -quantity for product_id, quantity in freed.items()})
+            Product.objects.filter(id__in=list(freed)).update(reserved=Greatest(F("reserved") - per_product(freed), 0))
+            StockReservation.objects.filter(id__in=[row[0] for row in batch]).delete()
+        yield len(batch)
+        if len(batch) < batch_size:
+            return
+        time.sleep(pause)
+
+
+def recount():
+    """
+    Recompute every Product.reserved from the reservation rows, in case
+    they drifted (e.g. holds deleted with their user). Returns the number
+    of products that were off.
+    """
+    held = (StockReservation.objects.filter(product=OuterRef("pk")).values("product")
+            .annotate(total=Sum("quantity")).values("total"))
+    with transaction.atomic():
+        drifted = Product.objects.exclude(reserved=Coalesce(Subquery(held), 0))
+        categories = set(drifted.values_list("categories_id", flat=True))
+        updated = drifted.update(reserved=Coalesce(Subquery(held), 0))
+        transaction.on_commit(lambda: facets.invalidate(categories))
+    return updated
+
+
+# ---- Sharded stock ----
+
+def _spread(total, slots):
+    share, rest = divmod(total, slots)
+    return [share + (slot < rest) for slot in range(slots)]
+
+
+def slot_cache_key(product_id):
+    return f"products:stock-slots:{product_id}"
+
+
+def slot_total(product_id, cached=True):
+    """
+    Stock of a sharded product: the sum of its slots. The cached figure is
+    at most SLOT_CACHE_TIMEOUT seconds old; cached=False reads (and doesn't
+    cache) the current one.
+    """
+    if not cached:
+        return ProductStockSlot.objects.filter(product_id=product_id).aggregate(total=Sum("stoc"))["total"] or 0
+    total = cache.get(slot_cache_key(product_id))
+    if total is None:
+        total = slot_total(product_id, cached=False)
+        cache.set(slot_cache_key(product_id), total, SLOT_CACHE_TIMEOUT)
+    return total
+
+
+def set_slots(product_id, slots, total=None):
+    """
+    Split a product's stock evenly over `slots` rows, or put it back on
+    Product.stoc with slots=0. total sets a new stock level, otherwise the
+    current one is kept. The product's reservations are dropped. Returns
+    the stock level.
+    """
+    with transaction.atomic():
+        current_slots, stoc, category_id = (Product.objects.select_for_update().filter(id=product_id)
+                                            .values_list("stock_slots", "stoc", "categories_id").get())
+        shares = list(ProductStockSlot.objects.select_for_update().filter(product_id=product_id)
+                      .order_by("slot").values_list("stoc", flat=True))
+        if total is None:
+            total = sum(shares) if current_slots else stoc
+        ProductStockSlot.objects.filter(product_id=product_id).delete()
+        if slots:
+            ProductStockSlot.objects.bulk_create([
+                ProductStockSlot(product_id=product_id, slot=slot, stoc=share)
+                for slot, share in enumerate(_spread(total, slots))
+            ])
+        StockReservation.objects.filter(product_id=product_id).delete()
+        Product.objects.filter(id=product_id).update(stock_slots=slots, stoc=total, reserved=0, out_of_stoc=not total)
+        transaction.on_commit(lambda: cache.delete(slot_cache_key(product_id)))
+        transaction.on_commit(lambda: facets.invalidate([category_id]))
+    return total
+
+
+def take_from_slots(product_id, quantity, rounds=SLOT_ROUNDS):
+    """
+    Sell quantity of a sharded product, slot by slot in random order. A
+    slot another order has locked is skipped (SKIP LOCKED), not waited on;
+    slots still short after a round are tried again, up to `rounds` times.
+    Returns the number of units it couldn't get. Anything but 0 means the
+    caller has to roll back.
+    """
+    remaining = quantity
+    for attempt in range(rounds):
+        # Our own takes are visible here, so drained slots drop out.
+        candidates = list(ProductStockSlot.objects.filter(product_id=product_id, stoc__gt=0)
+                          .values_list("id", "stoc"))
+        if sum(stoc for _, stoc in candidates) < remaining:
+            break
+        random.shuffle(candidates)
+        for slot_id, _ in candidates:
+            stoc = (ProductStockSlot.objects.select_for_update(skip_locked=True)
+                    .filter(id=slot_id, stoc__gt=0).values_list("stoc", flat=True).first())
+            if not stoc:
+                continue
+            taken = min(stoc, remaining)
+            ProductStockSlot.objects.filter(id=slot_id).update(stoc=F("stoc") - taken)
+            remaining -= taken
+            if not remaining:
+                return 0
+        time.sleep(0.01 * (attempt + 1))
+    return remaining
+
+
+def rebalance(product_id):
+    """
+    Even out a sharded product's slots and sync Product.stoc (and
+    out_of_stoc) with their total. Waits for orders holding a slot; takes
+    every slot in slot order so it can't deadlock with another rebalance.
+    Returns the total, or None if the product isn't sharded.
+    """
+    with transaction.atomic():
+        rows = list(ProductStockSlot.objects.select_for_update().filter(product_id=product_id)
+                    .order_by("slot").values_list("slot", "stoc"))
+        if not rows:
+            return None
+        total = sum(stoc for _, stoc in rows)
+        shares = _spread(total, len(rows))
+        moved = {slot: share for (slot, stoc), share in zip(rows, shares) if stoc != share}
+        if moved:
+            ProductStockSlot.objects.filter(product_id=product_id, slot__in=list(moved)).update(
+                stoc=Case(*[When(slot=slot, then=Value(share)) for slot, share in moved.items()]),
+            )
+        stoc, category_id = Product.objects.filter(id=product_id).values_list("stoc", "categories_id").get()
+        if stoc != total:
+            Product.objects.filter(id=product_id).update(stoc=total, out_of_stoc=not total)
+            # Stock levels feed the in-stock facet counts.
+            transaction.on_commit(lambda: facets.invalidate([category_id]))
+        transaction.on_commit(lambda: cache.set(slot_cache_key(product_id), total, SLOT_CACHE_TIMEOUT))
+    return total
@@ -0,0 +1,70 @@
+"""
+Industry -> Categories -> SubCategories tree for the header mega-menu.
+
+The tree is built with a single LEFT JOIN query and cached as plain
+dicts/lists under a version key. Saving or deleting any of the three models
+bumps the version (see products/signals.py), so the next request rebuilds it.
+The tree also carries a timeout because the default LocMemCache is per
+process and a bump in one worker is not seen by the others.
+"""
+import time
+
+from django.core.cache import cache
+
+
+VERSION_KEY = "taxonomy:version"
+TREE_KEY = "taxonomy:tree:{version}"
+TREE_TIMEOUT = 60 * 10
+
+
+def get_version():
+    return cache.get_or_set(VERSION_KEY, time.time_ns, None)
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Never restart from a small number, older trees may still be cached.
+        cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def build_tree():
+    from .models import Industry
+
+    rows = Industry.objects.values_list(
+        "id", "name", "slug",
+        "categories__id", "categories__name", "categories__slug",
+        "categories__subcategories__id", "categories__subcategories__name", "categories__subcategories__slug",
+    ).order_by("id", "categories__id", "categories__subcategories__id")
+
+    tree = []
+    industries = {}
+    categories = {}
+    for (industry_id, industry_name, industry_slug,
+         category_id, category_name, category_slug,
+         sub_id, sub_name, sub_slug) in rows:
+        industry = industries.get(industry_id)
+        if industry is None:
+            industry = {"id": industry_id, "name": industry_name, "slug": industry_slug, "categories": []}
+            industries[industry_id] = industry
+            tree.append(industry)
+        if category_id is None:
+            continue
+        category = categories.get(category_id)
+        if category is None:
+            category = {"id": category_id, "name": category_name, "slug": category_slug, "subcategories": []}
+            categories[category_id] = category
+            industry["categories"].append(category)
+        if sub_id is not None:
+            category["subcategories"].append({"id": sub_id, "name": sub_name, "slug": sub_slug})
+    return tree
+
+
+def get_tree():
+    key = TREE_KEY.format(version=get_version())
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_tree()
+        cache.set(key, tree, TREE_TIMEOUT)
+    return tree
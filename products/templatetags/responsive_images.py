@@ -0,0 +1,65 @@
+"""
+Template tags rendering images from their rendition manifests (see
+products/images.py). Nothing here touches the image files themselves.
+
+    {% load responsive_images %}
+    {% responsive_image product.primary_image product.primary_image_renditions sizes="25vw" alt=product.title %}
+    <div data-background="{% rendition_url slide.image.url slide.image_renditions 1920 %}">
+"""
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from products.models import PLACEHOLDER_IMAGE
+
+register = template.Library()
+
+# Width of the <img src> fallback for browsers without srcset support.
+FALLBACK_WIDTH = 640
+
+
+def _srcset(variants):
+    return ", ".join(f"{default_storage.url(name)} {width}w" for width, _, name in variants)
+
+
+def _attrs(attrs):
+    return format_html_join("", ' {}="{}"', ((name.replace("_", "-"), value) for name, value in attrs.items()))
+
+
+@register.simple_tag
+def responsive_image(src, renditions=None, sizes="100vw", alt="", **attrs):
+    """
+    A <picture> with WebP and JPEG srcsets and the original's width and
+    height, or a plain lazy <img> while the renditions aren't built yet.
+    """
+    attrs.setdefault("loading", "lazy")
+    attrs.setdefault("decoding", "async")
+    renditions = renditions or {}
+    if not renditions.get("jpeg"):
+        return format_html('<img src="{}" alt="{}"{}>', src or PLACEHOLDER_IMAGE, alt, _attrs(attrs))
+
+    jpeg = renditions["jpeg"]
+    fallback = next((variant for variant in jpeg if variant[0] >= FALLBACK_WIDTH), jpeg[-1])
+    # Width and height only reserve the space; height:auto keeps the
+    # aspect ratio whatever width the stylesheet gives the image.
+    attrs["style"] = "height: auto; " + attrs.get("style", "")
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}"{}></picture>',
+        _srcset(renditions["webp"]), sizes,
+        default_storage.url(fallback[2]), _srcset(jpeg), sizes,
+        renditions["width"], renditions["height"], alt, _attrs(attrs),
+    )
+
+
+@register.simple_tag
+def rendition_url(src, renditions=None, width=FALLBACK_WIDTH, fmt="webp"):
+    """
+    URL of the smallest rendition at least `width` wide, for places that
+    take a single URL such as CSS backgrounds.
+    """
+    variants = (renditions or {}).get(fmt)
+    if not variants:
+        return src or PLACEHOLDER_IMAGE
+    variant = next((variant for variant in variants if variant[0] >= int(width)), variants[-1])
+    return default_storage.url(variant[2])
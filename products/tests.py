@@ -1,3 +1,424 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from Vendors.models import VendorStore
+
+from . import cart, coupons, facets, shipping, similarity, stock
+from .models import (Cart, CartHeader, Categories, CompletedOder, CouponRedemption, CuponCodeGenaration,
+                     CustomerAddress, Industry, PlacedeOderItem, PlacedOder, Product, ProductImage,
+                     ProductRecommendation, ProductStockSlot, StockReservation)
+from .orders import create_order_from_cart
+
+
+def make_user(email="customer@example.com", **fields):
+    return get_user_model().objects.create_user(email, "pw12345!", first_name="Test", last_name="User",
+                                                mobile=1700000000, **fields)
+
+
+def make_category(name="Phones"):
+    return Categories.objects.create(name=name, industry=Industry.objects.get_or_create(name="Electronics")[0])
+
+
+def make_store(user=None, name="Gadget Store"):
+    user = user or make_user(f"vendor-{VendorStore.objects.count()}@example.com", user_role="3")
+    return VendorStore.objects.create(user=user, name=name)
+
+
+def make_product(category, title="Phone", images=1, **fields):
+    fields.setdefault("regular_price", 100)
+    fields.setdefault("discounted_parcent", 10)
+    product = Product.objects.create(categories=category, title=title, description="-", modle="X1", tag="phone",
+                                     details_description="-", **fields)
+    for index in range(images):
+        ProductImage.objects.create(product=product, image=f"https://example.com/{product.pk}-{index}.jpg")
+    return product
+
+
+def make_address(user):
+    return CustomerAddress.objects.create(user=user, state="Dhaka", city="Dhaka", zip_code=1207,
+                                          street_address="1 Road", mobile=1700000000)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class StoreTestCase(TestCase):
+    def setUp(self):
+        # Ids repeat between tests, and the cache outlives the rolled-back rows.
+        cache.clear()
+
+
+class CartSnapshotTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.category = make_category()
+        header = cart.header_for(self.user)
+        for _ in range(3):
+            Cart.objects.create(user=self.user, header=header, product=make_product(self.category), quantity=2)
+        cart.bump_version(self.user)
+
+    def test_show_cart_reads_the_cart_once_per_change(self):
+        self.client.force_login(self.user)
+        self.client.get("/show-cart/")
+        # Only the session's user row; the snapshot comes from the cache.
+        with self.assertNumQueries(1):
+            response = self.client.get("/show-cart/")
+        self.assertEqual(len(response.context["carts"]), 3)
+
+        self.client.get(f"/add-to-cart/{make_product(self.category).pk}")
+        # The user row, then one query for the lines, whatever their number.
+        with self.assertNumQueries(2):
+            response = self.client.get("/show-cart/")
+        self.assertEqual(len(response.context["carts"]), 4)
+
+    def test_totals_apply_the_capped_coupon(self):
+        coupon = CuponCodeGenaration.objects.create(name="Ten", cupon_code="TEN", discoun_parcent=10, up_to=5)
+        cart.update_header(self.user, cupon_code=coupon)
+        snapshot = cart.snapshot(self.user)
+        self.assertEqual(snapshot.quantity, 6)
+        self.assertEqual(snapshot.items_total, Decimal("540.00"))
+        self.assertEqual(snapshot.discount, Decimal("5"))
+        self.assertEqual(snapshot.subtotal, Decimal("535.00"))
+        self.assertEqual(snapshot.coupon.code, "TEN")
+
+    def test_header_changes_keep_the_cart_from_going_stale(self):
+        long_ago = timezone.now() - timedelta(days=40)
+        Cart.objects.filter(user=self.user).update(last_updated=long_ago)
+        CartHeader.objects.filter(user=self.user).update(updated_at=long_ago)
+        cutoff = timezone.now() - timedelta(days=30)
+        self.assertEqual(cart.stale_lines(cutoff).count(), 3)
+        cart.update_header(self.user, shipping_address=make_address(self.user))
+        self.assertFalse(cart.stale_lines(cutoff).exists())
+
+
+class CouponRedeemTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.order = PlacedOder.objects.create(user=self.user, shipping_address=make_address(self.user))
+
+    def make_coupon(self, **fields):
+        row = CuponCodeGenaration.objects.create(name="Ten", cupon_code="TEN", discoun_parcent=10, up_to=50, **fields)
+        return cart.CartCoupon(id=row.id, code=row.cupon_code, percent=row.discoun_parcent, cap=Decimal(row.up_to))
+
+    def times_redeemed(self, coupon):
+        return CuponCodeGenaration.objects.values_list("times_redeemed", flat=True).get(id=coupon.id)
+
+    def test_redeem_takes_a_use_and_records_it(self):
+        coupon = self.make_coupon(max_redemptions=2)
+        redemption = coupons.redeem(coupon, self.user, self.order, Decimal("5.00"))
+        self.assertEqual(redemption.order, self.order)
+        self.assertEqual(redemption.discount, Decimal("5.00"))
+        self.assertEqual(self.times_redeemed(coupon), 1)
+
+    def test_redeem_refuses_a_used_up_coupon(self):
+        coupon = self.make_coupon(max_redemptions=1)
+        coupons.redeem(coupon, make_user("other@example.com"), None, Decimal("5.00"))
+        with self.assertRaisesMessage(coupons.CouponError, "no longer available"):
+            coupons.redeem(coupon, self.user, self.order, Decimal("5.00"))
+        self.assertEqual(self.times_redeemed(coupon), 1)
+
+    def test_redeem_refuses_an_expired_coupon(self):
+        coupon = self.make_coupon(valid_until=timezone.now() - timedelta(minutes=1))
+        with self.assertRaises(coupons.CouponError):
+            coupons.redeem(coupon, self.user, self.order, Decimal("5.00"))
+        self.assertFalse(CouponRedemption.objects.exists())
+
+    def test_redeem_enforces_the_per_user_limit(self):
+        coupon = self.make_coupon(max_per_user=1)
+        coupons.redeem(coupon, self.user, self.order, Decimal("5.00"))
+        with self.assertRaisesMessage(coupons.CouponError, "already used"):
+            coupons.redeem(coupon, self.user, None, Decimal("5.00"))
+
+    def test_check_refuses_unknown_codes_and_limits_guesses(self):
+        for _ in range(coupons.MAX_FAILED_ATTEMPTS):
+            with self.assertRaisesMessage(coupons.CouponError, "Invalid coupon code."):
+                coupons.check("NOPE", self.user)
+        self.make_coupon()
+        with self.assertRaisesMessage(coupons.CouponError, "Too many invalid coupon codes."):
+            coupons.check("TEN", self.user)
+
+
+class PlaceOrderTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.category = make_category()
+        self.address = make_address(self.user)
+        self.header = cart.header_for(self.user)
+        cart.update_header(self.user, shipping_address=self.address)
+
+    def add_lines(self, count, quantity=2, **fields):
+        products = [make_product(self.category, title=f"Phone {index}", **fields) for index in range(count)]
+        for product in products:
+            Cart.objects.create(user=self.user, header=self.header, product=product, quantity=quantity)
+        return products
+
+    def test_order_takes_stock_and_empties_the_cart(self):
+        products = self.add_lines(2, stoc=5)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            order = create_order_from_cart(self.user)
+        self.assertTrue(order.paid)
+        self.assertEqual(order.sub_total_price, 360.0)
+        self.assertEqual(sorted(order.order_items.values_list("product_id", "quantity")),
+                         [(product.pk, 2) for product in products])
+        self.assertEqual(list(Product.objects.filter(pk__in=[p.pk for p in products]).values_list("stoc", flat=True)),
+                         [3, 3])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        # The facet counts of the category are dropped.
+        self.assertEqual(len(callbacks), 1)
+
+    def test_statements_do_not_grow_with_lines(self):
+        self.add_lines(2)
+        with CaptureQueriesContext(connection) as two_lines:
+            create_order_from_cart(self.user)
+        self.add_lines(6)
+        with CaptureQueriesContext(connection) as six_lines:
+            create_order_from_cart(self.user)
+        self.assertEqual(len(two_lines), len(six_lines))
+
+    def test_short_stock_places_nothing(self):
+        plenty, short = self.add_lines(2, stoc=1)
+        Cart.objects.filter(product=plenty).update(quantity=1)
+        with self.assertRaisesMessage(ValueError, f"{short.title} is out of stock."):
+            create_order_from_cart(self.user)
+        self.assertFalse(PlacedOder.objects.exists())
+        self.assertEqual(Product.objects.get(pk=plenty.pk).stoc, 1)
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 2)
+
+    def test_empty_cart_and_missing_address_are_refused(self):
+        with self.assertRaisesMessage(ValueError, "Your cart is empty."):
+            create_order_from_cart(self.user)
+        self.add_lines(1)
+        cart.update_header(self.user, shipping_address=None)
+        with self.assertRaisesMessage(ValueError, "Please select a shipping address"):
+            create_order_from_cart(self.user)
+
+    def test_coupon_is_redeemed_with_the_order(self):
+        self.add_lines(1)
+        coupon = CuponCodeGenaration.objects.create(name="Ten", cupon_code="TEN", discoun_parcent=10, up_to=50)
+        cart.update_header(self.user, cupon_code=coupon)
+        order = create_order_from_cart(self.user)
+        self.assertEqual(order.sub_total_price, 162.0)
+        self.assertEqual(CouponRedemption.objects.get().order, order)
+        self.assertIsNone(CartHeader.objects.get(user=self.user).cupon_code)
+
+
+class StockReservationTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.product = make_product(make_category(), title="Phone", stoc=3)
+
+    def reserved(self):
+        return Product.objects.values_list("reserved", flat=True).get(pk=self.product.pk)
+
+    def test_reserve_holds_and_replaces_the_cart_quantities(self):
+        stock.reserve(self.user, {self.product.pk: 2})
+        self.assertEqual(self.reserved(), 2)
+        stock.reserve(self.user, {self.product.pk: 1})
+        self.assertEqual(self.reserved(), 1)
+        stock.reserve(self.user, {})
+        self.assertEqual(self.reserved(), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_same_cart_only_extends_the_hold(self):
+        stock.reserve(self.user, {self.product.pk: 2}, minutes=1)
+        # Read the holds, push their expiry; plus the savepoint around them.
+        with self.assertNumQueries(4):
+            stock.reserve(self.user, {self.product.pk: 2})
+        self.assertEqual(self.reserved(), 2)
+        self.assertGreater(StockReservation.objects.get().expires_at, timezone.now() + timedelta(minutes=10))
+
+    def test_reserve_refuses_stock_held_by_others(self):
+        stock.reserve(make_user("other@example.com"), {self.product.pk: 2})
+        with self.assertRaisesMessage(ValueError, "Only 1 of Phone left."):
+            stock.reserve(self.user, {self.product.pk: 2})
+        self.assertEqual(self.reserved(), 2)
+        self.assertFalse(StockReservation.objects.filter(user=self.user).exists())
+
+    def test_take_stock_sells_and_releases_the_buyers_hold(self):
+        stock.reserve(self.user, {self.product.pk: 2})
+        self.assertFalse(stock.take_stock({self.product.pk: 4}, {self.product.pk: 2}))
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.stoc, product.reserved), (3, 2))
+        self.assertTrue(stock.take_stock({self.product.pk: 3}, {self.product.pk: 2}))
+        product.refresh_from_db()
+        self.assertEqual((product.stoc, product.reserved, product.out_of_stoc), (0, 0, True))
+
+    def test_release_expired_frees_the_units(self):
+        stock.reserve(self.user, {self.product.pk: 2})
+        self.assertEqual(sum(stock.release_expired(now=timezone.now())), 0)
+        self.assertEqual(sum(stock.release_expired(now=timezone.now() + timedelta(hours=1))), 1)
+        self.assertEqual(self.reserved(), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_holds_change_the_in_stock_facet(self):
+        category = self.product.categories
+        self.assertEqual(facets.category_counts(category)["in_stock"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.reserve(self.user, {self.product.pk: 3})
+        self.assertEqual(facets.category_counts(category)["in_stock"], 0)
+
+    def test_only_the_holder_can_order_held_stock(self):
+        other = make_user("other@example.com")
+        for user in (self.user, other):
+            cart.update_header(user, shipping_address=make_address(user))
+            Cart.objects.create(user=user, header=cart.header_for(user), product=self.product, quantity=3)
+        stock.reserve_cart(self.user, cart.snapshot(self.user))
+        with self.assertRaisesMessage(ValueError, "Phone is out of stock."):
+            create_order_from_cart(other)
+        create_order_from_cart(self.user)
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.stoc, product.reserved), (0, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class StockSlotTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_product(make_category(), title="Phone", stoc=10)
+        stock.set_slots(self.product.pk, 3)
+
+    def slots(self):
+        return list(ProductStockSlot.objects.filter(product=self.product).order_by("slot")
+                    .values_list("stoc", flat=True))
+
+    def test_set_slots_spreads_the_stock(self):
+        self.assertEqual(self.slots(), [4, 3, 3])
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.stock_slots, product.stoc), (3, 10))
+        self.assertEqual(product.current_stock, 10)
+
+    def test_take_from_slots_drains_several_slots(self):
+        self.assertEqual(stock.take_from_slots(self.product.pk, 9), 0)
+        self.assertEqual(sum(self.slots()), 1)
+        self.assertEqual(stock.slot_total(self.product.pk, cached=False), 1)
+
+    def test_take_from_slots_returns_the_shortfall(self):
+        self.assertEqual(stock.take_from_slots(self.product.pk, 11, rounds=1), 11)
+        self.assertEqual(self.slots(), [4, 3, 3])
+
+    def test_rebalance_evens_the_slots_and_syncs_the_product(self):
+        stock.take_from_slots(self.product.pk, 5)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stoc, 10)
+        self.assertEqual(stock.rebalance(self.product.pk), 5)
+        self.assertEqual(self.slots(), [2, 2, 1])
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stoc, 5)
+
+    def test_unsharding_puts_the_stock_back(self):
+        stock.take_from_slots(self.product.pk, 4)
+        self.assertEqual(stock.set_slots(self.product.pk, 0), 6)
+        self.assertEqual(self.slots(), [])
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.stock_slots, product.stoc), (0, 6))
+
+    def test_orders_sell_from_the_slots(self):
+        user = make_user()
+        cart.update_header(user, shipping_address=make_address(user))
+        Cart.objects.create(user=user, header=cart.header_for(user), product=self.product, quantity=4)
+        # Sharded products aren't reserved at checkout.
+        stock.reserve_cart(user, cart.snapshot(user))
+        self.assertFalse(StockReservation.objects.exists())
+        create_order_from_cart(user)
+        self.assertEqual(sum(self.slots()), 6)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stoc, 10)
+
+    def test_in_stock_facet_follows_the_slots(self):
+        category = self.product.categories
+        stock.take_from_slots(self.product.pk, 10)
+        self.assertEqual(facets.category_counts(category)["in_stock"], 0)
+
+
+class ShipOrdersTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.address = make_address(self.user)
+        self.products = [make_product(make_category(), title=f"Phone {index}") for index in range(2)]
+
+    def place(self, sub_total_price=360.0):
+        order = PlacedOder.objects.create(user=self.user, shipping_address=self.address, paid=True,
+                                          sub_total_price=sub_total_price)
+        for product in self.products:
+            # Priced on save: 2 x 90.
+            PlacedeOderItem.objects.create(placed_oder=order, product=product, quantity=2)
+        return order
+
+    def test_orders_move_to_completed_with_their_items(self):
+        order = self.place()
+        with self.assertLogs("products.shipping", "INFO") as logs:
+            self.assertEqual(shipping.ship_orders([order.pk]), 1)
+        self.assertIn("Shipped 1 orders (2 items)", logs.output[0])
+        self.assertFalse(PlacedOder.objects.exists())
+        self.assertFalse(PlacedeOderItem.objects.exists())
+        completed = CompletedOder.objects.get()
+        self.assertEqual((completed.oder_number, completed.sub_total_price, completed.paid, completed.status),
+                         (order.order_number, 360.0, True, shipping.SHIPPED))
+        self.assertEqual(sorted(completed.delivered_items.values_list("product_id", "quantity", "total_price")),
+                         [(product.pk, 2, 180.0) for product in self.products])
+
+    def test_batches_cost_a_fixed_number_of_statements(self):
+        orders = [self.place() for _ in range(5)]
+        # Per batch: lock, read items, two inserts, a delete (and its
+        # cascade to the items); plus the transaction's savepoint.
+        with self.assertLogs("products.shipping", "INFO"), CaptureQueriesContext(connection) as one_batch:
+            shipping.ship_orders([order.pk for order in orders[:3]])
+        with self.assertLogs("products.shipping", "INFO"), CaptureQueriesContext(connection) as two_batches:
+            self.assertEqual(shipping.ship_orders([order.pk for order in orders[3:]], batch_size=1), 2)
+        self.assertEqual(len(two_batches) - len(one_batch), len(one_batch) - 2)
+        self.assertEqual(CompletedOder.objects.count(), 5)
+
+    def test_gone_orders_are_skipped(self):
+        order = self.place()
+        with self.assertLogs("products.shipping", "INFO"):
+            shipping.ship_orders([order.pk])
+        with self.assertNoLogs("products.shipping", "INFO"):
+            self.assertEqual(shipping.ship_orders([order.pk, order.pk + 1]), 0)
+        self.assertEqual(CompletedOder.objects.count(), 1)
+
+    def test_missing_subtotal_is_summed_from_the_items(self):
+        order = self.place(sub_total_price=None)
+        with self.assertLogs("products.shipping", "INFO"):
+            shipping.ship_orders([order.pk])
+        self.assertEqual(CompletedOder.objects.get().sub_total_price, 360.0)
+
+
+class SimilarProductsTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = make_category()
+        words = ["red", "blue", "green", "fast", "slim", "large"]
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(30):
+                make_product(self.category, title=f"{words[index % 6]} {words[index % 5]} phone {index % 4}")
+
+    def lists(self):
+        return list(ProductRecommendation.objects.filter(kind=similarity.SIMILAR)
+                    .order_by("product_id", "rank").values_list("product_id", "recommended_id"))
+
+    def test_small_blocks_give_the_same_lists(self):
+        similarity.rebuild_category(self.category.id)
+        expected = self.lists()
+        self.assertTrue(expected)
+        matrix = similarity.CategoryMatrix(self.category.id)
+        with mock.patch.object(similarity, "MAX_BLOCK_CELLS", 2 * matrix.n):
+            self.assertGreater(len(list(matrix.blocks(range(matrix.n)))), matrix.n // 2)
+            similarity.rebuild_category(self.category.id)
+        self.assertEqual(self.lists(), expected)
+
+    def test_blocks_stay_within_the_cell_budget(self):
+        matrix = similarity.CategoryMatrix(self.category.id)
+        with mock.patch.object(similarity, "MAX_BLOCK_CELLS", 5 * matrix.n):
+            blocks = list(matrix.blocks(range(matrix.n)))
+        self.assertEqual(sum(blocks, []), list(range(matrix.n)))
+        for block in blocks:
+            cells = sum(matrix.n + int(matrix.row_postings[row]) for row in block)
+            self.assertTrue(len(block) == 1 or cells <= 5 * matrix.n)
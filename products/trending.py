@@ -0,0 +1,248 @@
+"""
+Trending products.
+
+`python manage.py compute_trending` (run it every few minutes from cron)
+scores every product with activity in the last WINDOW_DAYS: purchases,
+cart adds and page views, each decayed exponentially by age. The scoring
+is vectorized with NumPy. It writes a top-N list for the whole shop, each
+industry and each category to the TrendingProduct table, and only rewrites
+lists whose ranking actually changed.
+
+Views read the lists through trending_ids(), which caches the ids per list;
+trending_products() turns them into product cards in one query.
+
+Product page views are only counted in the cache (record_view), so a page
+view never writes to the database. compute_trending moves the counts into
+ProductDailyView in bulk first (flush_views). That needs a cache shared by
+the web and cron processes (CACHE_URL), otherwise the views are lost.
+"""
+from datetime import datetime, time as dtime, timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (Cart, CompletedOderItems, PlacedeOderItem, Product, ProductDailyView,
+                     TrendingProduct)
+
+
+WINDOW_DAYS = 14
+HALF_LIFE_HOURS = 72
+TOP_N = 24
+CACHE_TIMEOUT = 300
+
+# Relative weight of one event of each kind.
+ORDER_WEIGHT = 5.0
+CART_WEIGHT = 2.0
+VIEW_WEIGHT = 0.2
+# View counts older than this that were never flushed are dropped.
+VIEW_COUNT_TIMEOUT = 2 * 24 * 3600
+VIEW_FLUSH_DAYS = 2
+
+
+def cache_key(scope, scope_id=0):
+    return f"products:trending:{scope}:{scope_id}"
+
+
+def trending_ids(scope=TrendingProduct.GLOBAL, scope_id=0):
+    key = cache_key(scope, scope_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(
+            TrendingProduct.objects.filter(scope=scope, scope_id=scope_id)
+            .order_by("rank").values_list("product_id", flat=True)
+        )
+        cache.set(key, ids, CACHE_TIMEOUT)
+    return ids
+
+
+def trending_products(scope=TrendingProduct.GLOBAL, scope_id=0):
+    ids = trending_ids(scope, scope_id)
+    if not ids:
+        return []
+    products = Product.objects.cards().in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def view_key(product_id, day):
+    return f"products:views:{day:%Y%m%d}:{product_id}"
+
+
+def record_view(product):
+    key = view_key(product.pk, timezone.localdate())
+    if cache.add(key, 1, VIEW_COUNT_TIMEOUT):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add and incr.
+        cache.set(key, 1, VIEW_COUNT_TIMEOUT)
+
+
+def flush_views(days=VIEW_FLUSH_DAYS, chunk=5000):
+    """
+    Add the view counts in the cache for the last `days` days to
+    ProductDailyView, one upsert per chunk of products. Returns the number
+    of views moved.
+    """
+    today = timezone.localdate()
+    product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+    flushed = 0
+    for day in (today - timedelta(days=offset) for offset in range(days)):
+        for start in range(0, len(product_ids), chunk):
+            keys = {view_key(product_id, day): product_id for product_id in product_ids[start:start + chunk]}
+            counts = {keys[key]: count for key, count in cache.get_many(list(keys)).items() if count}
+            if not counts:
+                continue
+            existing = dict(ProductDailyView.objects.filter(day=day, product_id__in=list(counts))
+                            .values_list("product_id", "views"))
+            ProductDailyView.objects.bulk_create([
+                ProductDailyView(product_id=product_id, day=day, views=existing.get(product_id, 0) + count)
+                for product_id, count in counts.items()
+            ], update_conflicts=True, unique_fields=["product", "day"], update_fields=["views"])
+            for product_id, count in counts.items():
+                # Views counted since get_many stay for the next flush.
+                try:
+                    cache.decr(view_key(product_id, day), count)
+                except ValueError:
+                    pass
+            flushed += sum(counts.values())
+    return flushed
+
+
+def _timestamps(values):
+    return np.fromiter((value.timestamp() for value in values), dtype=np.float64, count=len(values))
+
+
+def _source(rows, weight):
+    """
+    [(product_id, datetime, quantity)] -> arrays of ids, epoch seconds, weights.
+    """
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0)
+    product_ids, moments, quantities = zip(*rows)
+    return (
+        np.fromiter(product_ids, dtype=np.int64, count=len(rows)),
+        _timestamps(moments),
+        np.fromiter(quantities, dtype=np.float64, count=len(rows)) * weight,
+    )
+
+
+def load_events(since):
+    """
+    All trending signals since `since` as three parallel arrays.
+    """
+    # Shipped orders move from PlacedeOderItem to CompletedOderItems, so
+    # between them every purchase is counted once.
+    placed = PlacedeOderItem.objects.filter(placed_oder__placed_date__gte=since).values_list(
+        "product_id", "placed_oder__placed_date", "quantity")
+    completed = CompletedOderItems.objects.filter(completed_oder__complete_date__gte=since).values_list(
+        "product_id", "completed_oder__complete_date", "quantity")
+    carts = Cart.objects.filter(last_updated__gte=since).values_list("product_id", "last_updated", "quantity")
+
+    # Daily view buckets count as seen at noon.
+    tz = timezone.get_current_timezone()
+    views = [
+        (product_id, timezone.make_aware(datetime.combine(day, dtime(12)), tz), count)
+        for product_id, day, count in ProductDailyView.objects.filter(day__gte=since.date())
+        .values_list("product_id", "day", "views").iterator(chunk_size=5000)
+    ]
+
+    sources = [
+        _source(list(placed), ORDER_WEIGHT),
+        _source(list(completed), ORDER_WEIGHT),
+        _source(list(carts), CART_WEIGHT),
+        _source(views, VIEW_WEIGHT),
+    ]
+    return tuple(np.concatenate(column) for column in zip(*sources))
+
+
+def score_products(product_ids, timestamps, weights, now, half_life_hours=HALF_LIFE_HOURS):
+    """
+    Sum of exponentially decayed event weights per product. Returns the
+    distinct product ids (sorted) and their scores.
+    """
+    age_hours = np.maximum(now - timestamps, 0) / 3600.0
+    decayed = weights * np.exp2(-age_hours / half_life_hours)
+    ids, inverse = np.unique(product_ids, return_inverse=True)
+    return ids, np.bincount(inverse, weights=decayed, minlength=len(ids))
+
+
+def top_n_per_group(groups, scores, n):
+    """
+    Indexes of the n best scores within each group and their 0-based rank.
+    Ties keep the input order.
+    """
+    order = np.lexsort((-scores, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    rank = np.arange(len(order)) - np.repeat(starts, sizes)
+    keep = rank < n
+    return order[keep], rank[keep]
+
+
+def compute_rankings(now=None, window_days=WINDOW_DAYS, half_life_hours=HALF_LIFE_HOURS, top_n=TOP_N):
+    """
+    {(scope, scope_id): [(product_id, score), ...]} best first.
+    """
+    now = now or timezone.now()
+    product_ids, timestamps, weights = load_events(now - timedelta(days=window_days))
+    if not len(product_ids):
+        return {}
+    ids, scores = score_products(product_ids, timestamps, weights, now.timestamp(), half_life_hours)
+    # Highest id first among equal scores, so newer products win ties.
+    ids, scores = ids[::-1], scores[::-1]
+
+    taxonomy = {}
+    id_list = ids.tolist()
+    for start in range(0, len(id_list), 5000):
+        for product_id, category_id, industry_id in Product.objects.filter(
+                id__in=id_list[start:start + 5000]).values_list("id", "categories_id", "categories__industry_id"):
+            taxonomy[product_id] = (category_id, industry_id or 0)
+    # Products deleted since their events were loaded drop out.
+    known = np.fromiter((product_id in taxonomy for product_id in id_list), dtype=bool, count=len(ids))
+    ids, scores = ids[known], scores[known]
+    categories = np.fromiter((taxonomy[product_id][0] for product_id in ids.tolist()), dtype=np.int64, count=len(ids))
+    industries = np.fromiter((taxonomy[product_id][1] for product_id in ids.tolist()), dtype=np.int64, count=len(ids))
+
+    rankings = {}
+    for scope, groups in (
+        (TrendingProduct.GLOBAL, np.zeros(len(ids), dtype=np.int64)),
+        (TrendingProduct.INDUSTRY, industries),
+        (TrendingProduct.CATEGORY, categories),
+    ):
+        picked, _ = top_n_per_group(groups, scores, top_n)
+        for index in picked.tolist():
+            rankings.setdefault((scope, int(groups[index])), []).append((int(ids[index]), float(scores[index])))
+    return rankings
+
+
+def store_rankings(rankings, now=None):
+    """
+    Replace the lists whose product order changed, drop lists that no longer
+    have any activity. Returns the number of lists written.
+    """
+    now = now or timezone.now()
+    current = {}
+    for scope, scope_id, product_id in TrendingProduct.objects.order_by("rank").values_list(
+            "scope", "scope_id", "product_id"):
+        current.setdefault((scope, scope_id), []).append(product_id)
+
+    changed = [
+        key for key, ranked in rankings.items()
+        if current.get(key) != [product_id for product_id, _ in ranked]
+    ]
+    gone = [key for key in current if key not in rankings]
+    with transaction.atomic():
+        for scope, scope_id in changed + gone:
+            TrendingProduct.objects.filter(scope=scope, scope_id=scope_id).delete()
+        TrendingProduct.objects.bulk_create([
+            TrendingProduct(scope=scope, scope_id=scope_id, rank=rank, product_id=product_id,
+                            score=score, computed_at=now)
+            for scope, scope_id in changed
+            for rank, (product_id, score) in enumerate(rankings[(scope, scope_id)])
+        ], batch_size=1000)
+    cache.delete_many([cache_key(scope, scope_id) for scope, scope_id in changed + gone])
+    return len(changed)
@@ -2,9 +2,11 @@ from django.urls import path
 from . import views
 urlpatterns = [
     path('product-details/<slug:slug>', views.product_details, name='product_details'),
+    path('search/', views.search_products, name='search_products'),
     path('add-to-cart/<int:id>', views.add_to_cart, name='add_to_cart'),
     path('show-cart/', views.show_cart, name='show_cart'),
     path('increse-cart/', views.increase_cart, name='increase_cart'),
+    path('cart/update/', views.update_cart, name='update_cart'),
     path('checkout/', views.check_out, name='check_out'),
     path('placed-oder/', views.placed_oder, name='placed_oder'),
     path('cupon-apply/', views.cupon_apply, name='cupon_apply'),
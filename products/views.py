@@ -2,97 +2,106 @@ from django.shortcuts import render, redirect, HttpResponseRedirect
 from django.db.models import Q
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 from django.shortcuts import get_object_or_404
 from django.contrib import messages
-from django.db import transaction
-from .models import (Product, Industry, Cart, 
-                     CustomerAddress, PlacedOder, 
-                     PlacedeOderItem, CuponCodeGenaration, ProductStarRatingAndReview)
+from .models import (Product, Cart, 
+                     CustomerAddress, ProductStarRatingAndReview,
+                     ProductRecommendation, TrendingProduct)
 from . forms import CustomerAddressForm
+from .search import SearchResults
+from .recommendations import recommended_products
+from .orders import create_order_from_cart
+from . import cart, coupons, stock, taxonomy, trending
+from django.core.paginator import Paginator
 import json
 from accounts.models import CustomUser
 
 # Create your views here.
 
-def _get_cart_queryset_for_user(user):
-    return Cart.objects.select_related("product", "shipping_address").filter(user=user)
-
-
-def create_order_from_cart(user):
-    """
-    Create a placed order from the user's cart in an atomic and concurrency-safe way.
-    Raises ValueError with a user-friendly message on failure.
-    """
-    with transaction.atomic():
-        cart_items = _get_cart_queryset_for_user(user).select_for_update()
-        if not cart_items:
-            raise ValueError("Your cart is empty.")
-
-        # Ensure a shipping address exists.
-        shipping_address = cart_items.first().shipping_address
-        if not shipping_address:
-            raise ValueError("Please select a shipping address before placing an order.")
-
-        sub_total_price = Cart.subtotal_product_price(user=user)
-        order = PlacedOder.objects.create(
-            user=user,
-            shipping_address=shipping_address,
-            sub_total_price=float(sub_total_price),
-            paid=True,
-        )
-
-        for item in cart_items:
-            product = Product.objects.select_for_update().get(id=item.product_id)
-            if product.out_of_stoc or product.stoc < item.quantity:
-                raise ValueError(f"{product.title} is out of stock.")
-            product.stoc = product.stoc - item.quantity
-            product.out_of_stoc = product.stoc <= 0
-            product.save()
-
-            PlacedeOderItem.objects.create(
-                placed_oder=order,
-                product=item.product,
-                quantity=item.quantity,
-                total_price=float(item.total_product_price),
-            )
-            item.delete()
-
-        return order
-
-
 def product_details(request, slug):
     product = get_object_or_404(Product, slug=slug)
-    industry = Industry.objects.all()
-    product_reviews = ProductStarRatingAndReview.objects.filter(product=product)
-    context = {"product": product, "industry": industry,'product_reviews':product_reviews}
+    trending.record_view(product)
+    product_reviews = ProductStarRatingAndReview.objects.filter(product=product).select_related('user')
+    product_images = list(product.productimage_set.order_by('id'))
+    recommended = recommended_products(product)
+    context = {"product": product, 'product_reviews':product_reviews,
+               'product_images': product_images,
+               'bought_together': recommended[ProductRecommendation.BOUGHT_TOGETHER],
+               'similar_products': recommended[ProductRecommendation.SIMILAR]}
     return render(request, "products/product-details.html", context)
 
 
-@login_required(login_url="user_login")
+def search_products(request):
+    query = request.GET.get('q', '').strip()
+    industry_slug = request.GET.get('industry', '')
+    selected_industry = next((i for i in taxonomy.get_tree() if i["slug"] == industry_slug), None)
+
+    results = SearchResults(query, industry_id=selected_industry["id"] if selected_industry else None)
+    page_obj = Paginator(results, 24).get_page(request.GET.get('page'))
+    context = {
+        "query": query,
+        "selected_industry": selected_industry,
+        "page_obj": page_obj,
+        "products": page_obj.object_list,
+        # Precomputed per industry by `manage.py compute_trending`.
+        "trending_in_industry": (
+            trending.trending_products(TrendingProduct.INDUSTRY, selected_industry["id"])
+            if selected_industry and page_obj.number == 1 else []
+        ),
+    }
+    return render(request, "products/search-results.html", context)
+
+
 def add_to_cart(request, id):
     product = get_object_or_404(Product, id=id)
+    if not request.user.is_authenticated:
+        # Guests get a cookie cart, merged into their account at login.
+        items = dict(cart.guest_items(request))
+        items.setdefault(product.id, 1)
+        response = redirect('show_cart')
+        cart.save_guest_items(request, response, items)
+        return response
     if not Cart.objects.filter(user=request.user, product=product).exists():
-        Cart.objects.create(user=request.user, product=product)
+        Cart.objects.create(user=request.user, header=cart.header_for(request.user), product=product)
+        cart.bump_version(request.user)
     return redirect('show_cart')
 
 
-@login_required(login_url="user_login")
+@ensure_csrf_cookie
 def show_cart(request):
-    carts = Cart.objects.filter(user=request.user)
-    industry = Industry.objects.all()
-    sub_total = 0.00
-    if carts:
-        sub_total = Cart.subtotal_product_price(user=request.user)
+    snapshot = cart.for_request(request)
     context = {
-        "carts": carts,
-        "sub_total": format(sub_total, '.2f'),
-        'industry':industry
+        "carts": snapshot,
+        "sub_total": format(snapshot.subtotal, '.2f'),
         }
     return render(request, "products/cart.html", context)
 
 
-@login_required(login_url="user_login")
+def _cart_json(snapshot, line_id=None):
+    data = snapshot.as_json()
+    if line_id is not None:
+        line = snapshot.line(line_id)
+        data["product_quantity"] = line.quantity if line else 0
+        data["total_product_price"] = float(line.total) if line else 0
+    return data
+
+
+def _change_cart(request, operations, line_id=None):
+    try:
+        lines, adds = cart.parse_operations(operations)
+    except ValueError as exc:
+        return JsonResponse({"detail": str(exc)}, status=400)
+    if request.user.is_authenticated:
+        cart.apply_operations(request.user, lines, adds)
+        return JsonResponse(_cart_json(cart.snapshot(request.user), line_id))
+    items = cart.apply_guest_operations(cart.guest_items(request), lines, adds)
+    response = JsonResponse(_cart_json(cart.build_guest_snapshot(items), line_id))
+    cart.save_guest_items(request, response, items)
+    return response
+
+
 @csrf_exempt
 def increase_cart(request):
     if request.method != "POST":
@@ -105,41 +114,31 @@ def increase_cart(request):
     except (TypeError, ValueError, json.JSONDecodeError):
         return JsonResponse({"detail": "Invalid payload"}, status=400)
 
-    products_list = []
-    cart_item = get_object_or_404(Cart, id=cart_id, user=request.user)
-    carts_product = _get_cart_queryset_for_user(request.user)
-
-    if action == 1 and cart_item.quantity < 50:
-        cart_item.quantity += 1
-        cart_item.save()
-    elif action == 2 and cart_item.quantity > 1:
-        cart_item.quantity -= 1
-        cart_item.save()
-    elif action == 0:
-        cart_item.delete()
-    else:
+    operation = {
+        0: {"op": "remove", "id": cart_id},
+        1: {"op": "increment", "id": cart_id, "by": 1},
+        2: {"op": "increment", "id": cart_id, "by": -1},
+    }.get(action)
+    if operation is None:
         return JsonResponse({"detail": "Unsupported action"}, status=400)
+    if cart.for_request(request).line(cart_id) is None:
+        return JsonResponse({"detail": "Not found"}, status=404)
+    return _change_cart(request, [operation], cart_id)
 
-    for item in carts_product:
-        product_details_dict = {}
-        product_details_dict["id"] = item.product.id
-        image_obj = item.product.productimage_set.first()
-        product_details_dict["image"] = image_obj.image if image_obj else "https://placehold.co/200x200"
-        product_details_dict["title"] = item.product.title
-        product_details_dict["quantity"] = item.quantity
-        product_details_dict["regular_price"] = float(item.product.discounted_price)
-        product_details_dict["total_product_price"] = float(item.total_product_price)
-        products_list.append(product_details_dict)
-
-    sub_total = float(Cart.subtotal_product_price(user=request.user))
-    data = {
-        "product_quantity": cart_item.quantity if action != 0 else 0,
-        "total_product_price": float(cart_item.total_product_price) if action != 0 else 0,
-        "sub_total": sub_total,
-        "carts_product": products_list or ["no-product"],
-    }
-    return JsonResponse(data)
 
+@require_POST
+def update_cart(request):
+    """
+    Apply a batch of cart operations (see cart.parse_operations) in one
+    transaction and return the whole cart:
+
+        POST {"ops": [{"op": "increment", "id": 12, "by": 3}, {"op": "remove", "id": 14}]}
+    """
+    try:
+        operations = json.loads(request.body).get("ops")
+    except (AttributeError, ValueError):
+        return JsonResponse({"detail": "Invalid payload"}, status=400)
+    return _change_cart(request, operations)
 
 
 
@@ -259,14 +258,21 @@ def increase_cart(request):
 
 @login_required(login_url="user_login")
 def check_out(request):
-    user_cart = _get_cart_queryset_for_user(request.user)
-    if not user_cart:
+    snapshot = cart.snapshot(request.user)
+    if not snapshot:
         messages.info(request, 'You have no product in your Cart')
         return redirect('home')
+    try:
+        stock.reserve_cart(request.user, snapshot)
+    except ValueError as exc:
+        messages.error(request, str(exc))
+        return redirect('show_cart')
 
-    all_shipping_address = CustomerAddress.objects.filter(user=request.user)
-    first_cart_item = user_cart.first()
-    selected_shipping_address = first_cart_item.shipping_address or all_shipping_address.last()
+    all_shipping_address = list(CustomerAddress.objects.filter(user=request.user).order_by('id'))
+    selected_shipping_address = next(
+        (address for address in all_shipping_address if address.id == snapshot.shipping_address_id),
+        all_shipping_address[-1] if all_shipping_address else None,
+    )
 
     if request.method == 'POST':
         selected_shipping_address_id = request.POST.get('selected_address_id')
@@ -274,28 +280,20 @@ def check_out(request):
             selected_shipping_address = get_object_or_404(
                 CustomerAddress, id=selected_shipping_address_id, user=request.user
             )
-            for item in user_cart:
-                item.shipping_address = selected_shipping_address
-                item.save(update_fields=["shipping_address"])
+            cart.update_header(request.user, shipping_address=selected_shipping_address)
 
     # Removing Cupon Code
     if request.GET.get('remove_cupon'):
-        for item in user_cart:
-            item.cupon_applaied = False
-            item.cupon_code = None
-            item.save(update_fields=["cupon_applaied", "cupon_code"])
-
-    cupon = bool(user_cart and user_cart[0].cupon_applaied)
-    sub_total = Cart.subtotal_product_price(user=request.user)
-    industry = Industry.objects.all()
+        cart.update_header(request.user, cupon_code=None)
+
+    snapshot = cart.snapshot(request.user)
     address_form = CustomerAddressForm()
 
     context = {
         'address_form': address_form,
-        'cupon': cupon,
-        'carts': user_cart,
-        'sub_total': sub_total,
-        'industry': industry,
+        'cupon': snapshot.coupon is not None,
+        'carts': snapshot,
+        'sub_total': snapshot.subtotal,
         'all_shipping_address': all_shipping_address,
         'selected_shipping_address': selected_shipping_address
     }
@@ -306,7 +304,7 @@ def check_out(request):
 @login_required(login_url="user_login")
 def placed_oder(request):
     try:
-        order = create_order_from_cart(request.user)
+        create_order_from_cart(request.user)
     except ValueError as exc:
         messages.error(request, str(exc))
         return redirect('show_cart')
@@ -318,27 +316,22 @@ def placed_oder(request):
 @login_required(login_url="user_login")
 def cupon_apply(request):
     if request.method =='POST':
-        cupon_code = request.POST.get('cupon_code')
-        print(cupon_code)
-        cupon_obj = CuponCodeGenaration.objects.filter(cupon_code=cupon_code)
-        if cupon_obj.exists():
-            subtotal = Cart.subtotal_product_price(user=request.user)
-            user_carts = Cart.objects.filter(user=request.user)
-            if not user_carts:
-                messages.error(request, "No items found in cart to apply coupon.")
-                return redirect('show_cart')
-
-            less_amount_by_cupon = (subtotal * cupon_obj[0].discoun_parcent) / 100
-            if less_amount_by_cupon <= cupon_obj[0].up_to:
-                for item in user_carts:
-                    item.cupon_code = cupon_obj[0]
-                    item.cupon_applaied = True
-                    item.save(update_fields=["cupon_code", "cupon_applaied"])
-                messages.success(request, "Coupon applied successfully.")
-            else:
-                messages.error(request, "Coupon amount exceeds allowed discount limit.")
+        try:
+            coupon = coupons.check(request.POST.get('cupon_code'), request.user)
+        except coupons.CouponError as exc:
+            messages.error(request, str(exc))
+            return redirect('check_out')
+        snapshot = cart.snapshot(request.user)
+        if not snapshot:
+            messages.error(request, "No items found in cart to apply coupon.")
+            return redirect('show_cart')
+
+        less_amount_by_cupon = (snapshot.items_total * coupon.percent) / 100
+        if less_amount_by_cupon <= coupon.cap:
+            cart.update_header(request.user, cupon_code_id=coupon.id)
+            messages.success(request, "Coupon applied successfully.")
         else:
-            messages.error(request, "Invalid coupon code.")
+            messages.error(request, "Coupon amount exceeds allowed discount limit.")
     return redirect('check_out')
 
 
@@ -381,10 +374,7 @@ def save_shipping_address(request):
             temp_new_address = new_address.save(commit=False)
             temp_new_address.user = request.user
             temp_new_address.save()
-            user_cart = Cart.objects.filter(user=request.user)
-            for item in user_cart:
-                item.shipping_address = temp_new_address
-                item.save(update_fields=["shipping_address"])
+            cart.update_header(request.user, shipping_address=temp_new_address)
         else:
             messages.error(request, "Please correct the shipping address details.")
     return redirect('check_out')
\ No newline at end of file
@@ -1,23 +1,92 @@
 
 
+// Clicks are collected for a moment and sent to /cart/update/ as one
+// batch; the quantities on screen change straight away.
+var CART_DEBOUNCE_MS = 400
+var MAX_QUANTITY = 50
+var pendingCartOps = {}
+var cartTimer = null
+var cartRequestInFlight = false
+
+function getCookie(name) {
+    var match = document.cookie.match('(?:^|; )' + name + '=([^;]*)')
+    return match ? decodeURIComponent(match[1]) : null
+}
+
 function change_cart_quantity(cart_id,values) {
-    // console.log(typeof(cart_id))
-    // console.log(typeof(values))
+    cart_id = parseInt(cart_id)
+    values = parseInt(values)
+    var quantityElement = document.getElementById('product-quantity-'+cart_id)
+
+    if (values === 0) {
+        pendingCartOps[cart_id] = {"op": "remove", "id": cart_id}
+        if (quantityElement) {
+            quantityElement.closest('tr').style.opacity = 0.4
+        }
+    } else {
+        var by = values === 1 ? 1 : -1
+        var pending = pendingCartOps[cart_id]
+        if (pending && pending.op === 'remove') {
+            return
+        }
+        if (quantityElement) {
+            var quantity = parseInt(quantityElement.innerText)
+            if (quantity + by < 1 || quantity + by > MAX_QUANTITY) {
+                return
+            }
+            quantityElement.innerText = quantity + by
+        }
+        pendingCartOps[cart_id] = {"op": "increment", "id": cart_id, "by": (pending ? pending.by : 0) + by}
+    }
+
+    clearTimeout(cartTimer)
+    cartTimer = setTimeout(flush_cart_changes, CART_DEBOUNCE_MS)
+}
+
+function flush_cart_changes() {
+    if (cartRequestInFlight) {
+        // Sent when the current request comes back.
+        return
+    }
+    var ops = Object.values(pendingCartOps)
+    if (ops.length === 0) {
+        return
+    }
+    pendingCartOps = {}
+    cartRequestInFlight = true
 
     var xhr = new XMLHttpRequest()
 
     xhr.onload= function() {
-        var response = xhr.responseText
-         console.log(typeof(response['total_product_price']))
-         console.log(response['total_product_price'])
-         console.log(typeof(response['sub_total']))
-         response = JSON.parse(response)
+        cartRequestInFlight = false
+        if (Object.keys(pendingCartOps).length > 0) {
+            // More clicks came in meanwhile; the next response redraws.
+            flush_cart_changes()
+            return
+        }
+        if (xhr.status !== 200) {
+            window.location.reload()
+            return
+        }
+        render_cart(JSON.parse(xhr.responseText))
+    }
+    xhr.onerror = function() {
+        cartRequestInFlight = false
+        window.location.reload()
+    }
+
+    xhr.open(
+        'POST',
+        '/cart/update/'
+    )
+    xhr.setRequestHeader('Content-Type', 'application/json')
+    xhr.setRequestHeader('X-CSRFToken', getCookie('csrftoken'))
+    xhr.send(JSON.stringify({"ops": ops}))
+}
+
+function render_cart(response) {
          var jsonResponse = response['carts_product']
-        //  console.log(jsonResponse)
-        let formatteTortalProductPrice = response['total_product_price'].toFixed(2);
         let formattedSubTotal   = response['sub_total'].toFixed(2);
-         document.getElementById('product-quantity-'+cart_id).innerText = response['product_quantity']
-         document.getElementById('total_product_price-'+cart_id).innerText = '$'+ formatteTortalProductPrice
          document.getElementById('sub_total_price').innerText = '$'+ formattedSubTotal 
 
          // Get the table element to append product rows
@@ -138,22 +207,4 @@ function change_cart_quantity(cart_id,values) {
             });
 
         }
-
-
-    }
-
-    xhr.open(
-        'POST',
-        '/increse-cart/'
-    )
-
-    var data ={
-        "id":cart_id,
-        'values': values
-    }
-
-    xhr.send(JSON.stringify(data))
-
 }
-
-
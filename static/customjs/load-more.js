@@ -0,0 +1,27 @@
+
+// "Load More" for keyset-paginated product listings.
+// The server answers ?format=json&cursor=... with {html, next_cursor, has_next}.
+
+document.addEventListener('click', function(event) {
+    var button = event.target.closest('.load-more-btn')
+    if (!button || button.disabled) {
+        return
+    }
+    button.disabled = true
+
+    var url = button.dataset.url + '&cursor=' + encodeURIComponent(button.dataset.cursor)
+    fetch(url, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+        .then(function(response) { return response.json() })
+        .then(function(data) {
+            document.querySelector(button.dataset.target).insertAdjacentHTML('beforeend', data['html'])
+            if (data['has_next']) {
+                button.dataset.cursor = data['next_cursor']
+                button.disabled = false
+            } else {
+                button.remove()
+            }
+        })
+        .catch(function() {
+            button.disabled = false
+        })
+})